@@ -1,15 +1,100 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context, g
+from flask import has_app_context, has_request_context, before_render_template, template_rendered, send_file
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
+from sqlalchemy.pool import NullPool
+from datetime import datetime, date as date_type, timezone
 from datetime import timedelta
 from functools import wraps
+from markupsafe import Markup, escape
+from werkzeug.security import generate_password_hash, check_password_hash
+from array import array
+from collections import namedtuple, OrderedDict, deque
+from contextlib import contextmanager
+import click
+import csv
+import heapq
+import io
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import uuid
+from urllib.parse import quote
 
 app = Flask(__name__)
-# Configure SQLite database
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///attendance.db'
+# Configure SQLite database (DATABASE_URL points scripts and benchmarks at a scratch file)
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///attendance.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+
+def engine_options(uri):
+    """Connection pool settings for one worker process.
+
+    Every gunicorn/uWSGI worker holds its own pool, so DB_POOL_SIZE should
+    match the threads per worker; with SQLite extra connections only queue on
+    the single write lock. Server databases also get pre-ping and recycling so
+    connections dropped by the server are replaced transparently.
+    """
+    if uri.startswith("sqlite") and (":memory:" in uri or uri.rstrip("/") == "sqlite:"):
+        return {}
+    options = {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 5)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    }
+    if not uri.startswith("sqlite"):
+        options.update(pool_pre_ping=True, pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 1800)))
+    return options
+
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+# Applied to every new SQLite connection: WAL lets readers run alongside the
+# writer, NORMAL sync is durable under WAL except on power loss, and
+# busy_timeout makes writers wait for the lock instead of failing with
+# "database is locked". SQLITE_TUNING=0 keeps SQLite's defaults.
+app.config['SQLITE_PRAGMAS'] = {} if os.environ.get('SQLITE_TUNING', '1') == '0' else {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 16000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_MB', 128)) * 1024 * 1024,
+}
 app.secret_key = "attendance_secret_key"  
-db = SQLAlchemy(app)
+
+
+class ShardSession(FlaskSession):
+    """Sends school data to the current school's shard (g.shard, see SHARDS); logins and the school list stay on the main database."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = g.get("shard") if bind is None and has_app_context() else None
+        if shard is None or _directory_table(mapper, clause):
+            return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        return shards.get(shard).engine
+
+
+db = SQLAlchemy(app, session_options={"class_": ShardSession})
+
+
+@db.event.listens_for(db.Engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply app.config['SQLITE_PRAGMAS'] to each new SQLite connection."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
 
 # Role-based access control decorator
 def login_required(f):
@@ -36,27 +121,97 @@ def role_required(*roles):
     return decorator
 
 
+# Password hashing. The work factor is tunable for exam-time login bursts
+# (see benchmarks/bench_login_storm.py); stored hashes move to a new
+# PASSWORD_HASH on the user's next login. At most LOGIN_HASH_CONCURRENCY
+# hashes run at once, so a burst queues instead of exhausting memory
+# (scrypt:32768:8 needs 32 MiB per hash).
+PASSWORD_HASH = os.environ.get("PASSWORD_HASH", "scrypt:32768:8:1")
+_hash_slots = threading.BoundedSemaphore(int(os.environ.get("LOGIN_HASH_CONCURRENCY", os.cpu_count() or 2)))
+# Hashed once at startup: check_password burns it for unknown users, and its
+# method part is PASSWORD_HASH as werkzeug expands it ("scrypt" ->
+# "scrypt:32768:8:1", "pbkdf2:sha256" -> "pbkdf2:sha256:1000000").
+_dummy_hash = generate_password_hash(uuid.uuid4().hex, method=PASSWORD_HASH)
+_hash_method = _dummy_hash.split("$", 1)[0]
+
+
+def hash_password(password):
+    with _hash_slots:
+        return generate_password_hash(password, method=PASSWORD_HASH)
+
+
+def check_password(password_hash, password):
+    """Verify password against password_hash; None (unknown user) still pays for one hash."""
+    if password_hash is None:
+        # Same cost as a real check, so response time doesn't reveal which emails exist
+        password_hash = _dummy_hash
+    with _hash_slots:
+        return check_password_hash(password_hash, password or "")
+
+
+def needs_rehash(password_hash):
+    return password_hash.split("$", 1)[0] != _hash_method
+
+
 # Models
 class Student(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
 
+# Login accounts; Student accounts link to their Student row
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, index=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
+    role = db.Column(db.String(10), nullable=False)  # Student, Teacher or Admin
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=True, index=True)
+    # Shard holding the account's school; None is the main database. student_id is a row in that shard.
+    school = db.Column(db.String(64), db.ForeignKey('school.key'), nullable=True, index=True)
+
+# Schools with their own database file (see SHARDS); lives on the main database with User
+class School(db.Model):
+    key = db.Column(db.String(64), primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+# Subjects; shared by every worker through the database (see get_courses())
+class Course(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+
 class AttendanceRecord(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
-    date = db.Column(db.String(20), nullable=False)
-    course = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
     status = db.Column(db.String(1), nullable=False)  # 'P' or 'A'
     info = db.Column(db.String(100), nullable=True)
     student = db.relationship('Student', backref=db.backref('attendance_records', lazy=True))
+    course = db.relationship('Course')
+    __table_args__ = (
+        # One mark per student per session; leading (date, course) serves the daily views
+        db.Index('uq_attendance_date_course_student', 'date', 'course_id', 'student_id', unique=True),
+        # Course-wide range scans (records page, analytics)
+        db.Index('ix_attendance_course_date', 'course_id', 'date'),
+        # Per-student history and report pages
+        db.Index('ix_attendance_student_course_date', 'student_id', 'course_id', 'date'),
+        # Per-student history across all courses, paged newest first
+        db.Index('ix_attendance_student_date', 'student_id', 'date'),
+    )
 
 # Homework models
 class Homework(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.String(20), nullable=False)
-    course = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
     description = db.Column(db.String(255), nullable=True)
+    course = db.relationship('Course', lazy='joined')
     progresses = db.relationship('HomeworkProgress', backref='homework', lazy=True)
+    __table_args__ = (
+        # Homework listing, paged newest first with or without a subject filter
+        db.Index('ix_homework_date', 'date'),
+        db.Index('ix_homework_course_date', 'course_id', 'date'),
+    )
 
 class HomeworkProgress(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -65,6 +220,9 @@ class HomeworkProgress(db.Model):
     marks = db.Column(db.String(20), nullable=True)
     progress = db.Column(db.String(255), nullable=True)
     student = db.relationship('Student')
+    __table_args__ = (
+        db.Index('ix_homework_progress_homework_student', 'homework_id', 'student_id'),
+    )
 
 # Doubt/Question model
 class HomeworkDoubt(db.Model):
@@ -77,39 +235,494 @@ class HomeworkDoubt(db.Model):
     answered_at = db.Column(db.String(50), nullable=True)
     student = db.relationship('Student')
     homework = db.relationship('Homework')
+    __table_args__ = (
+        # Pending-doubts queue: answer IS NULL ORDER BY created_at
+        db.Index('ix_homework_doubt_answer_created', 'answer', 'created_at'),
+    )
+
+# Per-student, per-course monthly attendance counts, kept in step with
+# AttendanceRecord by save_attendance() so percentage widgets never scan records
+class AttendanceSummary(db.Model):
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    period = db.Column(db.String(7), primary_key=True)  # 'YYYY-MM'
+    present = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
 
-# ...existing code...
+# Per-(student, course) change counters behind the JSON API's ETag and
+# Last-Modified validators, bumped in the writer's transaction whenever marks,
+# homework progress or doubts change. student_id COURSE_WIDE (0) counts
+# changes that affect every student of the course, like setting homework.
+class RecordVersion(db.Model):
+    student_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)  # UTC, whole seconds
+    __table_args__ = (
+        db.Index('ix_record_version_course', 'course_id'),
+    )
 
-# Place this route after all model/class definitions and app initialization
+# Background work queued by requests and run by the job threads (see
+# enqueue_job()); the table doubles as the queue, so no broker is needed
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    params = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued, running, done, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)  # percent
+    message = db.Column(db.String(255), nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    created_by = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)  # UTC
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    __table_args__ = (
+        db.Index('ix_job_status_id', 'status', 'id'),
+    )
 
-@app.route("/report", methods=["GET"])
-@role_required('Teacher', 'Admin')
-def student_report():
-    students = Student.query.all()
-    selected_subject = request.args.get("subject")
-    selected_student = request.args.get("student")
-    records = []
-    if selected_subject and selected_student:
-        student = Student.query.filter_by(name=selected_student).first()
-        if student:
-            records = AttendanceRecord.query.filter_by(student_id=student.id, course=selected_subject).order_by(AttendanceRecord.date.desc()).all()
-    return render_template(
-        "report.html",
-        students=students,
-        courses=courses,
-        selected_subject=selected_subject,
-        selected_student=selected_student,
-        records=records
+# Recent live-board updates, so SSE streams in other worker processes (and
+# reconnecting browsers) can catch up; pruned after LIVE_BOARD_KEEP
+class AttendanceEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, nullable=False)
+    course_id = db.Column(db.Integer, nullable=False)
+    origin = db.Column(db.String(32), nullable=False)  # process that published it locally
+    payload = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)  # UTC
+
+# Early-warning figures per (student, subject), refreshed in batches by the
+# early_warning job; the page reads only this table
+class StudentRisk(db.Model):
+    student_id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, primary_key=True)
+    rolling_present = db.Column(db.Integer, nullable=False, default=0)  # over EARLY_WARNING_WINDOW
+    rolling_sessions = db.Column(db.Integer, nullable=False, default=0)
+    absence_streak = db.Column(db.Integer, nullable=False, default=0)
+    homework_missing = db.Column(db.Integer, nullable=False, default=0)
+    homework_ungraded = db.Column(db.Integer, nullable=False, default=0)
+    flagged = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, nullable=False)  # UTC
+    __table_args__ = (
+        db.Index('ix_student_risk_flagged_course', 'flagged', 'course_id'),
     )
 
-# Homework storage (still in-memory for now)
-courses = ["Software Engineering", "Maths", "Data Structure", "Hindhi", "Information Security", "Frontend Programming", "Mobile Application"]
+# Change counters for process-level caches; bumping a row in the writer's
+# transaction tells every worker to reload that cache on its next request
+class CacheVersion(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# Subjects seeded into the Course table on first start
+initial_courses = ["Software Engineering", "Maths", "Data Structure", "Hindhi", "Information Security", "Frontend Programming", "Mobile Application"]
 homework_records = {}
 
 
-# Create tables and add initial students if not exist
+# --- SHARDS ---
+#
+# Each school can have its own SQLite file, so schools stop queueing on one
+# write lock. User and School stay on the main database (the directory); a
+# login sets session["school"] from User.school and every query in that
+# request goes to the school's shard. Users without a school, and the CLI,
+# use the main database, which is itself a complete school.
+
+SHARDS_DIR = os.environ.get("SHARDS_DIR", os.path.join(app.instance_path, "shards"))
+SHARD_MAX_OPEN = int(os.environ.get("SHARD_MAX_OPEN", 32))  # engines (and per-school caches) kept per process
+SHARD_KEY = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+DIRECTORY_TABLES = {"user", "school"}
+
+
+def _directory_table(mapper, clause):
+    """Whether a statement targets a main-database-only table (User, School)."""
+    if mapper is not None:
+        table = db.inspect(mapper).local_table
+    else:
+        table = clause if isinstance(clause, db.Table) else getattr(clause, "table", None)
+    return getattr(table, "name", None) in DIRECTORY_TABLES
+
+
+def shard_url(key):
+    return "sqlite:///" + os.path.join(SHARDS_DIR, f"{key}.db")
+
+
+class Shard:
+    """An open school database: its engine (None for the main one) and this process's caches for it."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.state = {}
+
+
+class ShardRouter:
+    """Engines for the school shards, opened on first use; past max_open the least recently used is closed.
+
+    Closing a shard drops its caches too, so an evicted school's next request
+    reloads its roster and matrix.
+    """
+
+    def __init__(self, max_open):
+        self.max_open = max_open
+        self.main = Shard(None)
+        self._open = OrderedDict()  # key -> Shard, least recently used first
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.evicted = 0
+
+    def get(self, key):
+        if key is None:
+            return self.main
+        with self._lock:
+            shard = self._open.get(key)
+            if shard is not None:
+                self._open.move_to_end(key)
+                return shard
+        # Only registered schools, so a stale session can't create an empty file
+        with db.engine.connect() as conn:
+            if conn.execute(db.select(School.key).where(School.key == key)).first() is None:
+                raise LookupError(f"no school {key!r}")
+        with self._lock:
+            shard = self._open.get(key)
+            if shard is None:
+                url = shard_url(key)
+                shard = self._open[key] = Shard(create_engine(url, **engine_options(url)))
+                self.opened += 1
+                while len(self._open) > self.max_open:
+                    _, closed = self._open.popitem(last=False)
+                    closed.engine.dispose()
+                    self.evicted += 1
+            return shard
+
+    def open_keys(self):
+        with self._lock:
+            return list(self._open)
+
+
+shards = ShardRouter(SHARD_MAX_OPEN)
+
+
+def shard_state():
+    """This process's cache dict for the current school (g.shard)."""
+    return shards.get(g.get("shard")).state
+
+
+@contextmanager
+def school_context(key):
+    """An app context whose queries go to school key's shard (None: the main database)."""
+    with app.app_context():
+        g.shard = key
+        yield
+
+
+def school_dir(name):
+    """instance/<name>, or instance/<name>/<school> inside a school's context, created if missing."""
+    path = os.path.join(app.instance_path, name, *([g.shard] if g.get("shard") else []))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@app.before_request
+def select_shard():
+    g.shard = session.get("school")
+    if g.shard is not None:
+        try:
+            shards.get(g.shard)
+        except LookupError:
+            # The session outlived its school's registration
+            session.clear()
+            g.shard = None
+            flash('Please log in to access this page.', 'error')
+            return redirect(url_for('login'))
+
+
+def _weekday_expr(column):
+    """Day of week as 0 (Sunday) .. 6 (Saturday), matching SQLite's %w."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        return db.cast(db.extract("dow", column), db.Integer)
+    return db.cast(db.func.strftime("%w", column), db.Integer)
+
+
+def _month_expr(column):
+    if db.session.get_bind().dialect.name == "postgresql":
+        return db.func.to_char(column, "YYYY-MM")
+    return db.func.strftime("%Y-%m", column)
+
+
+def _day_number_expr(column, origin):
+    """Whole days from origin to column."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        return db.cast(column - origin, db.Integer)
+    return db.cast(db.func.julianday(column) - db.func.julianday(origin.isoformat()), db.Integer)
+
+
+def _list_agg(expr):
+    """Comma-separated aggregate of expr, skipping NULLs."""
+    if db.session.get_bind().dialect.name == "postgresql":
+        return db.func.string_agg(db.cast(expr, db.String), ",")
+    return db.func.group_concat(expr)
+
+
+def migrate_legacy_dates():
+    """Rewrite legacy "%d-%m-%Y" date strings to ISO so the Date columns sort and index correctly."""
+    if db.session.get_bind().dialect.name != "sqlite":
+        return
+    for table in ("attendance_record", "homework"):
+        db.session.execute(db.text(
+            f"UPDATE {table} "
+            "SET date = substr(date, 7, 4) || '-' || substr(date, 4, 2) || '-' || substr(date, 1, 2) "
+            "WHERE date LIKE '__-__-____'"
+        ))
+    db.session.commit()
+
+
+def database_tables():
+    """The tables of the current database: everything on the main one, school data on a shard."""
+    if g.get("shard") is None:
+        return db.metadata.sorted_tables
+    return [table for table in db.metadata.sorted_tables if table.name not in DIRECTORY_TABLES]
+
+
+def migrate_user_school():
+    """Add User.school to user tables created before schools had their own shards."""
+    bind = db.session.get_bind()
+    if 'school' in {c['name'] for c in db.inspect(bind).get_columns('user')}:
+        return
+    with bind.begin() as conn:
+        conn.exec_driver_sql(f"ALTER TABLE {bind.dialect.identifier_preparer.quote('user')} "
+                             "ADD COLUMN school VARCHAR(64) REFERENCES school (key)")
+
+
+def migrate_indexes():
+    """Add the model indexes to databases created before they were declared.
+
+    create_all() only builds indexes for new tables. Duplicate attendance marks
+    left by the old per-row save path are collapsed (latest wins) so the unique
+    index can be built.
+    """
+    existing = {ix['name'] for ix in db.inspect(db.session.get_bind()).get_indexes('attendance_record')}
+    if 'uq_attendance_date_course_student' not in existing:
+        db.session.execute(db.text(
+            "DELETE FROM attendance_record WHERE id NOT IN "
+            "(SELECT MAX(id) FROM attendance_record GROUP BY date, course_id, student_id)"
+        ))
+        db.session.commit()
+    for table in database_tables():
+        for index in table.indexes:
+            index.create(db.session.get_bind(), checkfirst=True)
+
+
+def migrate_course_ids():
+    """Move attendance_record and homework from course-name strings to course_id foreign keys.
+
+    Databases created before the Course table hold the subject name in a
+    "course" column. Each such table is rebuilt in place (create new, copy,
+    drop, rename, as SQLite requires for column changes) with names resolved
+    through the course table; the summary table is recreated and backfilled.
+    """
+    if db.session.get_bind().dialect.name != "sqlite":
+        return
+    inspector = db.inspect(db.session.get_bind())
+    legacy = [model for model in (AttendanceRecord, Homework)
+              if 'course' in {c['name'] for c in inspector.get_columns(model.__tablename__)}]
+    if not legacy:
+        return
+    # Scratch copy of the schema so the "_new" tables can resolve their foreign keys
+    scratch = db.MetaData()
+    for table in db.metadata.sorted_tables:
+        table.to_metadata(scratch)
+    with db.session.get_bind().begin() as conn:
+        conn.exec_driver_sql("INSERT OR IGNORE INTO course (name) VALUES (?)", [(name,) for name in initial_courses])
+        for model in legacy:
+            name = model.__tablename__
+            conn.exec_driver_sql(f"INSERT OR IGNORE INTO course (name) SELECT DISTINCT course FROM {name}")
+        for model in legacy:
+            name = model.__tablename__
+            for index in inspector.get_indexes(name):
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index['name']}")
+            new_table = model.__table__.to_metadata(scratch, name=f"{name}_new")
+            new_table.create(conn)
+            columns = [c.name for c in model.__table__.columns]
+            select_columns = ", ".join("c.id" if c == "course_id" else f"o.{c}" for c in columns)
+            # Keep only the latest of any duplicate marks so the unique index holds
+            where = ("WHERE o.id IN (SELECT MAX(id) FROM attendance_record GROUP BY date, course, student_id)"
+                     if model is AttendanceRecord else "")
+            conn.exec_driver_sql(
+                f"INSERT INTO {name}_new ({', '.join(columns)}) "
+                f"SELECT {select_columns} FROM {name} o JOIN course c ON c.name = o.course {where}"
+            )
+            conn.exec_driver_sql(f"DROP TABLE {name}")
+            conn.exec_driver_sql(f"ALTER TABLE {name}_new RENAME TO {name}")
+        conn.exec_driver_sql("DROP TABLE IF EXISTS attendance_summary")
+        AttendanceSummary.__table__.create(conn)
+
+
+# Full-text indexes over homework descriptions and doubts. They are FTS5
+# external-content tables (the text stays in the base tables) kept in step
+# by triggers, so every write path, bulk inserts included, is covered.
+SEARCH_INDEXES = {
+    "homework_fts": ("homework", ["description"]),
+    "homework_doubt_fts": ("homework_doubt", ["question", "answer"]),
+}
+
+
+def migrate_search_index():
+    """Create the FTS5 tables and triggers if missing, indexing existing rows; records search_fts() for this database."""
+    shard_state()["search_fts"] = False
+    if db.session.get_bind().dialect.name != "sqlite":
+        return
+    with db.session.get_bind().begin() as conn:
+        existing = {name for (name,) in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for fts, (table, columns) in SEARCH_INDEXES.items():
+            if fts in existing:
+                continue
+            cols = ", ".join(columns)
+            new_cols = ", ".join(f"new.{c}" for c in columns)
+            old_cols = ", ".join(f"old.{c}" for c in columns)
+            try:
+                conn.exec_driver_sql(
+                    f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', content_rowid='id', "
+                    f"tokenize='porter unicode61 remove_diacritics 2')"
+                )
+            except OperationalError:
+                app.logger.warning("SQLite was built without FTS5; search falls back to LIKE")
+                return
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END"
+            )
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+                f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END"
+            )
+            conn.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    shard_state()["search_fts"] = True
+
+
+def search_fts():
+    """Whether the current database (main or school shard) has the FTS5 search indexes.
+
+    Each shard is migrated separately, possibly by another process, so this is
+    looked up once per open shard rather than kept app-wide.
+    """
+    state = shard_state()
+    if "search_fts" not in state:
+        bind = db.session.get_bind()
+        state["search_fts"] = bind.dialect.name == "sqlite" and db.session.execute(db.text(
+            "SELECT count(*) FROM sqlite_master WHERE name IN ('homework_fts', 'homework_doubt_fts')"
+        )).scalar() == len(SEARCH_INDEXES)
+    return state["search_fts"]
+
+
+def migrate_database():
+    """Create missing tables and run every migration on the current database (main or school shard)."""
+    db.metadata.create_all(db.session.get_bind(), tables=database_tables())
+    if g.get("shard") is None:
+        migrate_user_school()
+    migrate_legacy_dates()
+    migrate_course_ids()
+    migrate_indexes()
+    migrate_search_index()
+    if not db.session.query(AttendanceSummary.student_id).first() and db.session.query(AttendanceRecord.id).first():
+        rebuild_attendance_summary()
+
+
+def rebuild_attendance_summary():
+    """Recompute AttendanceSummary from AttendanceRecord in one INSERT ... SELECT."""
+    db.session.query(AttendanceSummary).delete()
+    period = _month_expr(AttendanceRecord.date)
+    db.session.execute(db.insert(AttendanceSummary).from_select(
+        ["student_id", "course_id", "period", "present", "absent"],
+        db.select(
+            AttendanceRecord.student_id, AttendanceRecord.course_id, period,
+            db.func.sum(db.case((AttendanceRecord.status == 'P', 1), else_=0)),
+            db.func.sum(db.case((AttendanceRecord.status == 'A', 1), else_=0)),
+        ).group_by(AttendanceRecord.student_id, AttendanceRecord.course_id, period),
+    ))
+    db.session.commit()
+
+
+def school_option(f):
+    """Give a CLI command a --school KEY option and run it against that school's shard."""
+    @click.option("--school", help="School key (see `flask shards list`); default is the main database.")
+    @wraps(f)
+    def decorated(*args, school, **kwargs):
+        if school is not None and db.session.get(School, school) is None:
+            raise click.BadParameter(f"no school {school!r}", param_hint="--school")
+        with school_context(school):
+            return f(*args, **kwargs)
+    return decorated
+
+
+@app.cli.command("rebuild-summary")
+@school_option
+def rebuild_summary_command():
+    """Backfill the attendance summary table from the raw records."""
+    rebuild_attendance_summary()
+    print(f"Rebuilt {AttendanceSummary.query.count()} attendance summary rows.")
+
+
+@app.cli.group("shards")
+def shards_command():
+    """Create, migrate and list the per-school databases."""
+
+
+@shards_command.command("create")
+@click.argument("key")
+@click.option("--name", required=True, help="School name.")
+def create_shard_command(key, name):
+    """Register school KEY and create its database with the current schema and default subjects.
+
+    Then add its logins with `flask create-user ... --school KEY`.
+    """
+    if not SHARD_KEY.fullmatch(key):
+        raise click.BadParameter("use lowercase letters, digits, - and _", param_hint="KEY")
+    if db.session.get(School, key) is not None:
+        raise click.BadParameter(f"school {key!r} already exists", param_hint="KEY")
+    os.makedirs(SHARDS_DIR, exist_ok=True)
+    db.session.add(School(key=key, name=name, created_at=_utcnow()))
+    db.session.commit()
+    with school_context(key):
+        migrate_database()
+        db.session.add_all(Course(name=name) for name in initial_courses)
+        bump_cache_version("courses")
+        db.session.commit()
+    print(f"Created school {key} at {shard_url(key)}.")
+
+
+@shards_command.command("migrate")
+@click.argument("keys", nargs=-1)
+def migrate_shards_command(keys):
+    """Bring the given schools' databases (default: all) to the current schema; run after each deploy."""
+    known = [key for (key,) in db.session.query(School.key).order_by(School.key)]
+    for key in set(keys) - set(known):
+        raise click.BadParameter(f"no school {key!r}", param_hint="KEYS")
+    for key in keys or known:
+        started = time.perf_counter()
+        with school_context(key):
+            migrate_database()
+        print(f"Migrated {key} in {time.perf_counter() - started:.2f}s.")
+
+
+@shards_command.command("list")
+def list_shards_command():
+    """Schools with their login count and database size."""
+    logins = dict(db.session.query(User.school, db.func.count(User.id)).group_by(User.school))
+    print(f"{'(main)':<24} {'':<32} {logins.get(None, 0):>6} logins")
+    for school in School.query.order_by(School.key):
+        path = os.path.join(SHARDS_DIR, f"{school.key}.db")
+        size = sum(os.path.getsize(f) for f in (path, path + "-wal") if os.path.exists(f)) / 2**20
+        print(f"{school.key:<24} {school.name[:32]:<32} {logins.get(school.key, 0):>6} logins {size:>9.1f} MiB")
+
+
+# Create tables and add initial students and courses if not exist
 with app.app_context():
-    db.create_all()
+    migrate_database()
+    if not db.session.query(Course.id).first():
+        db.session.add_all(Course(name=name) for name in initial_courses)
     initial_students = [
         "Aravind", "Aswin", "Bhavana", "Gokul", "Hariharan", "Meenatchi", "Siva Bharathi", "Visal Stephenraj"
     ]
@@ -117,422 +730,2698 @@ with app.app_context():
         if not Student.query.filter_by(name=name).first():
             db.session.add(Student(name=name))
     db.session.commit()
+    # Demo accounts: (email, password, role, student name)
+    initial_users = [
+        ("aravind@example.com", "student123", "Student", "Aravind"),
+        ("aswin@example.com", "student123", "Student", "Aswin"),
+        ("bhavana@example.com", "student123", "Student", "Bhavana"),
+        ("gokul@example.com", "student123", "Student", "Gokul"),
+        ("hariharan@example.com", "student123", "Student", "Hariharan"),
+        ("meenatchi@example.com", "student123", "Student", "Meenatchi"),
+        ("sivabharathi@example.com", "student123", "Student", "Siva Bharathi"),
+        ("visal@example.com", "student123", "Student", "Visal Stephenraj"),
+        ("teacher@example.com", "teacher123", "Teacher", None),
+        ("admin@example.com", "admin123", "Admin", None),
+    ]
+    if not db.session.query(User.id).first():
+        student_ids = dict(db.session.query(Student.name, Student.id).filter(Student.name.in_(initial_students)))
+        db.session.add_all(
+            User(email=email, password_hash=hash_password(password), role=role, student_id=student_ids.get(name))
+            for email, password, role, name in initial_users
+        )
+        db.session.commit()
 
 @app.template_filter('dateformat')
 def dateformat(value, format="%Y-%m-%d"):
+    if isinstance(value, date_type):
+        return value.strftime(format)
     try:
         return datetime.strptime(value, "%d-%m-%Y").strftime(format)
     except:
         return datetime.now().strftime(format)
 
 
+def parse_date(value):
+    """Parse a "%Y-%m-%d" (form input) or "%d-%m-%Y" (legacy) string, returning None if invalid."""
+    for fmt in ("%Y-%m-%d", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except (TypeError, ValueError):
+            continue
+    return None
 
-# Redirect to login if not logged in
-@app.route("/", methods=["GET", "POST"])
-@app.route("/registeri", methods=["GET", "POST"])
-@login_required
-def home():
-    return redirect(url_for("front"))
 
+def resolve_date_range(range_type, base_date):
+    """Return the inclusive (start, end) dates of the day/week/month/year around base_date."""
+    if range_type == "week":
+        start_date = base_date - timedelta(days=base_date.weekday())
+        return start_date, start_date + timedelta(days=6)
+    if range_type == "month":
+        start_date = base_date.replace(day=1)
+        end_date = (start_date + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return start_date, end_date
+    if range_type == "year":
+        return base_date.replace(month=1, day=1), base_date.replace(month=12, day=31)
+    return base_date, base_date
 
-# Welcome front page, require login
-@app.route("/front")
-@login_required
-def front():
-    students = Student.query.all()
-    user_role = session.get('role')
-    user_email = session.get('user')
-    student_name = session.get('student_name', None)
-    return render_template("index.html", students=students, user_role=user_role, user_email=user_email, student_name=student_name)
 
-# ✅ Attendance marking logic now in this route (Teacher and Admin only)
-@app.route("/mark", methods=["GET", "POST"])
-@role_required('Teacher', 'Admin')
-def mark_attendance():
-    students = Student.query.all()
-    success_message = None
-    show_records = False
-    selected_course = None
-    if request.method == "POST":
-        selected_date = request.form.get("date")
-        selected_course = request.form.get("course")
-        if not selected_date:
-            selected_date = datetime.now().strftime("%d-%m-%Y")
-        else:
-            selected_date = datetime.strptime(selected_date, "%Y-%m-%d").strftime("%d-%m-%Y")
-
-        for s in students:
-            status = request.form.get(f"status_{s.name}", "A")
-            info = request.form.get(f"info_{s.name}", "not_informed")
-            record = AttendanceRecord.query.filter_by(student_id=s.id, date=selected_date, course=selected_course).first()
-            if record:
-                record.status = status
-                record.info = info
-            else:
-                new_record = AttendanceRecord(student_id=s.id, date=selected_date, course=selected_course, status=status, info=info)
-                db.session.add(new_record)
-        db.session.commit()
-        success_message = "Attendance saved successfully!"
-        show_records = True
-    else:
-        selected_date = datetime.now().strftime("%d-%m-%Y")
-        selected_course = courses[0] if courses else None
+def filter_date_range(query, column, range_type, selected_date):
+    """Restrict query to the range around selected_date; unparseable dates leave it unfiltered."""
+    base_date = parse_date(selected_date)
+    if base_date is None:
+        return query
+    start_date, end_date = resolve_date_range(range_type, base_date)
+    if start_date == end_date:
+        return query.filter(column == start_date)
+    return query.filter(column.between(start_date, end_date))
 
-    today_attendance = {s.name: {"status": "A", "info": "N/A"} for s in students}
-    records = AttendanceRecord.query.filter_by(date=selected_date, course=selected_course).all()
-    for r in records:
-        today_attendance[r.student.name] = {"status": r.status, "info": r.info}
 
-    present_count = sum(1 for v in today_attendance.values() if v["status"] == "P")
-    absent_count = sum(1 for v in today_attendance.values() if v["status"] == "A")
+# Rows per page on the record listings; ?per_page= overrides up to the maximum
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
-    return render_template("home.html",
-                           students=students,
-                           attendance=today_attendance,
-                           current_date=selected_date,
-                           present_count=present_count,
-                           absent_count=absent_count,
-                           courses=courses,
-                           homework_records=homework_records,
-                           success_message=success_message,
-                           show_records=show_records,
-                           selected_course=selected_course)
+Page = namedtuple("Page", ["rows", "next_cursor", "prev_cursor", "per_page"])
 
 
-@app.route("/student/<name>")
-@login_required
-def student_detail(name):
-    # Students can only view their own records
-    if session.get('role') == 'Student':
-        allowed_student_name = session.get('student_name')
-        if not allowed_student_name or name != allowed_student_name:
-            flash('You can only view your own attendance records.', 'error')
-            return redirect(url_for('front'))
-    
-    student = Student.query.filter_by(name=name).first()
-    if not student:
-        return f"Student {name} not found", 404
-    
-    # Get filter parameters
-    selected_course = request.args.get('course', 'all')
-    date_range = request.args.get('range', 'all')
-    selected_date = request.args.get('date')
-    
-    # Base query
-    query = AttendanceRecord.query.filter_by(student_id=student.id)
-    
-    # Filter by course
-    if selected_course != 'all':
-        query = query.filter_by(course=selected_course)
-    
-    # Filter by date range
-    if date_range != 'all' and selected_date:
-        try:
-            base_date = datetime.strptime(selected_date, "%Y-%m-%d")
-            if date_range == 'day':
-                db_date = base_date.strftime("%d-%m-%Y")
-                query = query.filter_by(date=db_date)
-            elif date_range == 'month':
-                start_date = base_date.replace(day=1)
-                if start_date.month == 12:
-                    end_date = start_date.replace(year=start_date.year+1, month=1, day=1) - timedelta(days=1)
-                else:
-                    end_date = start_date.replace(month=start_date.month+1, day=1) - timedelta(days=1)
-                start_db = start_date.strftime("%d-%m-%Y")
-                end_db = end_date.strftime("%d-%m-%Y")
-                query = query.filter(AttendanceRecord.date >= start_db, AttendanceRecord.date <= end_db)
-            elif date_range == 'year':
-                start_date = base_date.replace(month=1, day=1)
-                end_date = base_date.replace(month=12, day=31)
-                start_db = start_date.strftime("%d-%m-%Y")
-                end_db = end_date.strftime("%d-%m-%Y")
-                query = query.filter(AttendanceRecord.date >= start_db, AttendanceRecord.date <= end_db)
-        except Exception:
-            pass
-    
-    records = query.all()
-    records_list = [(r.date, r.status, r.course) for r in records]
-    records_list.sort(reverse=True)
-    
-    total_days = len(records_list)
-    present_count = sum(1 for _, s, _ in records_list if s == "P")
-    absent_count = sum(1 for _, s, _ in records_list if s == "A")
-    percentage = round((present_count / total_days) * 100, 2) if total_days > 0 else 0
-    
-    return render_template("student_detail.html",
-                           name=name,
-                           records=records_list,
-                           total_days=total_days,
-                           present_count=present_count,
-                           absent_count=absent_count,
-                           percentage=percentage,
-                           courses=courses,
-                           selected_course=selected_course,
-                           date_range=date_range,
-                           selected_date=selected_date or datetime.now().strftime("%Y-%m-%d"))
+def encode_cursor(row_date, row_id):
+    return f"{row_date.isoformat()}_{row_id}"
 
-@app.route("/attendance/<date>")
-@role_required('Teacher', 'Admin')
-def view_attendance(date):
-    students = Student.query.all()
-    records = AttendanceRecord.query.filter_by(date=date).all()
-    daily_att = {s.name: "A" for s in students}
-    for r in records:
-        daily_att[r.student.name] = r.status
-    return render_template("daily_attendance.html",
-                           date=date,
-                           students=students,
-                           attendance=daily_att)
 
+def decode_cursor(value):
+    """Parse a "YYYY-MM-DD_id" cursor into (date, id), or None if absent or malformed."""
+    row_date, _, row_id = (value or "").partition("_")
+    try:
+        return datetime.strptime(row_date, "%Y-%m-%d").date(), int(row_id)
+    except ValueError:
+        return None
 
-@app.route("/students", methods=["GET", "POST"])
-@role_required('Admin')
-def manage_students():
-    success_message = None
-    student_message = None
-    subject_message = None
-    if request.method == "POST":
-        if "delete_student" in request.form:
-            student_name = request.form.get("delete_student")
-            student = Student.query.filter_by(name=student_name).first()
-            if student:
-                AttendanceRecord.query.filter_by(student_id=student.id).delete()
-                db.session.delete(student)
-                db.session.commit()
-        elif "add_student" in request.form:
-            new_student = request.form.get("add_student").strip()
-            if new_student and not Student.query.filter_by(name=new_student).first():
-                db.session.add(Student(name=new_student))
-                db.session.commit()
-                student_message = f"Student '{new_student}' added successfully."
-        elif "course_name" in request.form:
-            new_course = request.form.get("course_name").strip()
-            if new_course and new_course not in courses:
-                courses.append(new_course)
-                subject_message = f"Subject '{new_course}' added successfully."
-        return redirect(url_for("manage_students", student_message=student_message, subject_message=subject_message))
-    student_message = request.args.get("student_message")
-    subject_message = request.args.get("subject_message")
-    students = Student.query.all()
-    return render_template("students.html", students=students, courses=courses, student_message=student_message, subject_message=subject_message)
 
+def keyset_page(query, date_column, id_column, descending=True):
+    """Fetch one page of query ordered by (date, id), positioned by the request's cursor.
 
-from flask import request  # make sure to import request
+    ?after=<cursor> continues past a row in list order and ?before=<cursor>
+    steps back; the cursor becomes a (date, id) row-value comparison that
+    the index seeks to, so deep pages cost the same as the first (no OFFSET).
+    The query must select date_column and id_column.
+    """
+    try:
+        per_page = min(max(int(request.args.get("per_page", PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        per_page = PAGE_SIZE
+    after = decode_cursor(request.args.get("after"))
+    before = None if after else decode_cursor(request.args.get("before"))
+    key = db.tuple_(date_column, id_column)
+    if after:
+        query = query.filter(key < after if descending else key > after)
+    elif before:
+        query = query.filter(key > before if descending else key < before)
+    # Stepping back walks the index the other way, then restores list order
+    walk_descending = descending != bool(before)
+    if walk_descending:
+        order = (date_column.desc(), id_column.desc())
+    else:
+        order = (date_column, id_column)
+    rows = query.order_by(None).order_by(*order).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before:
+        rows.reverse()
 
-@app.route("/attendance-records")
-@role_required('Teacher', 'Admin')
-def view_attendance_records():
-    from datetime import timedelta
-    selected_date = request.args.get("date")
+    def cursor(row):
+        return encode_cursor(row._mapping[date_column], row._mapping[id_column])
+
+    next_cursor = cursor(rows[-1]) if rows and (has_more or before) else None
+    prev_cursor = cursor(rows[0]) if rows and (after or (before and has_more)) else None
+    return Page(rows, next_cursor, prev_cursor, per_page)
+
+
+@app.template_global()
+def page_url(**cursor):
+    """URL of the current listing with its after/before cursor replaced by cursor."""
+    args = {k: v for k, v in request.args.items() if k not in ("after", "before")}
+    args.update(cursor)
+    return url_for(request.endpoint, **request.view_args, **args)
+
+
+def upsert_rows(model, rows, conflict_columns, update_columns, increment=False):
+    """Insert rows, updating update_columns where conflict_columns already exist.
+
+    With increment=True the update adds the new values to the stored ones
+    instead of overwriting them; a list of column names increments just
+    those. The INSERT ... ON CONFLICT DO UPDATE is compiled once and sent
+    as a single executemany.
+    """
+    if not rows:
+        return
+    dialect = postgresql if db.session.get_bind().dialect.name == "postgresql" else sqlite
+    table = model.__table__
+    stmt = dialect.insert(table)
+    added = set(update_columns if increment is True else increment or ())
+    set_ = {column: table.c[column] + getattr(stmt.excluded, column) if column in added else getattr(stmt.excluded, column)
+            for column in update_columns}
+    db.session.execute(stmt.on_conflict_do_update(index_elements=conflict_columns, set_=set_), rows)
+
+
+def save_attendance(selected_date, course_id, marks):
+    """Write a session's marks ({student_id: (status, info)}) with a constant number of queries.
+
+    Existing rows for (date, course) are loaded once, unchanged marks are
+    skipped, and the rest go out as a single upsert in the caller's
+    transaction. Returns {student_id: (old_status, new_status)} for the rows
+    that changed; old_status is None for new marks.
+    """
+    existing = {
+        student_id: (status, info)
+        for student_id, status, info in db.session.query(
+            AttendanceRecord.student_id, AttendanceRecord.status, AttendanceRecord.info
+        ).filter_by(date=selected_date, course_id=course_id)
+    }
+    rows = []
+    changes = {}
+    for student_id, (status, info) in marks.items():
+        old = existing.get(student_id)
+        if old == (status, info):
+            continue
+        rows.append({"student_id": student_id, "date": selected_date, "course_id": course_id,
+                     "status": status, "info": info})
+        changes[student_id] = (old[0] if old else None, status)
+    upsert_rows(AttendanceRecord, rows, ["date", "course_id", "student_id"], ["status", "info"])
+    update_attendance_summary(selected_date, course_id, changes)
+    bump_record_versions((student_id, course_id) for student_id in changes)
+    if changes:
+        # Cached pages showing this session are dropped once the transaction commits
+        db.session.info.setdefault("touched_sessions", set()).add((selected_date, course_id))
+        statuses = {student_id: status for student_id, (status, _) in existing.items()}
+        statuses.update((row["student_id"], row["status"]) for row in rows)
+        queue_board_update(selected_date, course_id, rows, statuses)
+    return changes
+
+
+def update_attendance_summary(selected_date, course_id, changes):
+    """Apply {student_id: (old_status, new_status)} to the month's summary rows."""
+    period = selected_date.strftime("%Y-%m")
+    rows = []
+    for student_id, (old_status, new_status) in changes.items():
+        if old_status == new_status:
+            continue
+        present = (new_status == "P") - (old_status == "P")
+        absent = (new_status == "A") - (old_status == "A")
+        rows.append({"student_id": student_id, "course_id": course_id, "period": period,
+                     "present": present, "absent": absent})
+    upsert_rows(AttendanceSummary, rows, ["student_id", "course_id", "period"], ["present", "absent"], increment=True)
+
+
+def attendance_totals(student_id, course_id, date_range, selected_date):
+    """Return (present, absent) from AttendanceSummary, or None if the range isn't month-aligned.
+
+    course_id=None totals across all courses.
+    """
+    query = db.session.query(
+        db.func.coalesce(db.func.sum(AttendanceSummary.present), 0),
+        db.func.coalesce(db.func.sum(AttendanceSummary.absent), 0),
+    ).filter(AttendanceSummary.student_id == student_id)
+    if course_id is not None:
+        query = query.filter(AttendanceSummary.course_id == course_id)
+    base_date = parse_date(selected_date)
+    if date_range == 'all' or base_date is None:
+        pass
+    elif date_range == 'month':
+        query = query.filter(AttendanceSummary.period == base_date.strftime("%Y-%m"))
+    elif date_range == 'year':
+        query = query.filter(AttendanceSummary.period.between(f"{base_date.year}-01", f"{base_date.year}-12"))
+    else:
+        return None
+    return tuple(query.one())
+
+
+COURSE_WIDE = 0
+
+
+def bump_record_versions(pairs):
+    """Advance the change counter of each (student_id, course_id) pair in the caller's transaction."""
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    rows = [{"student_id": student_id, "course_id": course_id, "version": 1, "updated_at": now}
+            for student_id, course_id in set(pairs)]
+    upsert_rows(RecordVersion, rows, ["student_id", "course_id"], ["version", "updated_at"], increment=["version"])
+
+
+def student_attendance(student_id, course_id, date_range, selected_date):
+    """One page of a student's marks (newest first) plus (present, absent) over the whole range.
+
+    course_id=None covers every course; date_range 'all' ignores selected_date.
+    """
+    query = db.session.query(AttendanceRecord.id, AttendanceRecord.date, AttendanceRecord.status, AttendanceRecord.course_id) \
+        .filter_by(student_id=student_id)
+    if course_id is not None:
+        query = query.filter_by(course_id=course_id)
+    if date_range != 'all':
+        query = filter_date_range(query, AttendanceRecord.date, date_range, selected_date)
+    page = keyset_page(query, AttendanceRecord.date, AttendanceRecord.id)
+    totals = attendance_totals(student_id, course_id, date_range, selected_date)
+    if totals is None:
+        # Day/week ranges: count over the whole range, not just this page
+        totals = query.with_entities(
+            db.func.coalesce(db.func.sum(db.case((AttendanceRecord.status == "P", 1), else_=0)), 0),
+            db.func.coalesce(db.func.sum(db.case((AttendanceRecord.status == "A", 1), else_=0)), 0),
+        ).one()
+    return page, totals[0], totals[1]
+
+
+# --- CACHES ---
+
+def cache_versions():
+    """All cache version counters, read once per request (or app context)."""
+    if "cache_versions" not in g:
+        g.cache_versions = dict(db.session.query(CacheVersion.name, CacheVersion.version))
+    return g.cache_versions
+
+
+def bump_cache_version(name):
+    """Invalidate the named cache in every worker once the current transaction commits."""
+    upsert_rows(CacheVersion, [{"name": name, "version": 1}], ["name"], ["version"], increment=True)
+    g.pop("cache_versions", None)
+
+
+class VersionedCache:
+    """A process-level value, one per school, rebuilt by loader() whenever its CacheVersion counter moves."""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+
+    def get(self):
+        version = cache_versions().get(self.name, 0)
+        state = shard_state()
+        cached_version, value = state.get(self.name, (None, None))  # swapped atomically
+        if cached_version != version:
+            value = self.loader()
+            state[self.name] = (version, value)
+        return value
+
+
+RosterStudent = namedtuple("RosterStudent", "id name")
+Roster = namedtuple("Roster", "students ids_by_name names_by_id")
+
+
+def _load_roster():
+    students = [RosterStudent(id, name) for id, name in db.session.query(Student.id, Student.name).order_by(Student.id)]
+    return Roster(
+        students=students,
+        ids_by_name={s.name: s.id for s in students},
+        names_by_id={s.id: s.name for s in students},
+    )
+
+
+roster_cache = VersionedCache("roster", _load_roster)
+
+
+def get_roster():
+    """The ordered student list plus id<->name maps, without querying Student on a warm cache."""
+    return roster_cache.get()
+
+
+CourseList = namedtuple("CourseList", "names ids_by_name names_by_id")
+
+
+def _load_courses():
+    rows = db.session.query(Course.id, Course.name).order_by(Course.id).all()
+    return CourseList(
+        names=[name for _, name in rows],
+        ids_by_name={name: id for id, name in rows},
+        names_by_id={id: name for id, name in rows},
+    )
+
+
+course_cache = VersionedCache("courses", _load_courses)
+
+
+def get_courses():
+    """The ordered subject names plus id<->name maps, shared across workers via CacheVersion."""
+    return course_cache.get()
+
+
+def ensure_courses(names):
+    """Return {name: id} for names, creating any subjects that don't exist yet."""
+    known = get_courses().ids_by_name
+    missing = set(names) - known.keys()
+    if missing:
+        upsert_rows(Course, [{"name": name} for name in sorted(missing)], ["name"], ["name"])
+        bump_cache_version("courses")
+        known = get_courses().ids_by_name
+    return {name: known[name] for name in names}
+
+
+class MemoryCacheBackend:
+    """LRU dict of cached pages, private to this process."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires, scope, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def set(self, key, value, scope, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, scope, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, course_id, day):
+        with self._lock:
+            stale = [key for key, (_, scope, _) in self._entries.items() if _scope_covers(scope, course_id, day)]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def size(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": sum(len(v) for _, _, v in self._entries.values())}
+
+
+class SQLiteCacheBackend:
+    """Cached pages in a local SQLite file, shared by every worker on the host."""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS page_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "course_id INTEGER, start TEXT, end TEXT, expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_page_cache_accessed ON page_cache (accessed)")
+
+    def _connect(self):
+        if not hasattr(self._local, "conn"):
+            self._local.conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn.execute("PRAGMA journal_mode = WAL")
+            self._local.conn.execute("PRAGMA synchronous = OFF")
+        return self._local.conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value FROM page_cache WHERE key = ? AND expires >= ?", (key, now)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE page_cache SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key, value, scope, ttl):
+        course_id, start, end = scope
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO page_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, value, course_id, start and start.isoformat(), end and end.isoformat(), now + ttl, now),
+            )
+            conn.execute("DELETE FROM page_cache WHERE expires < ?", (now,))
+            conn.execute(
+                "DELETE FROM page_cache WHERE key IN "
+                "(SELECT key FROM page_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def invalidate(self, course_id, day):
+        with self._connect() as conn:
+            return conn.execute(
+                "DELETE FROM page_cache WHERE (course_id IS NULL OR course_id = ?) "
+                "AND (start IS NULL OR ? BETWEEN start AND end)",
+                (course_id, day.isoformat()),
+            ).rowcount
+
+    def size(self):
+        entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM page_cache").fetchone()
+        return {"entries": entries, "bytes": size}
+
+
+def _scope_covers(scope, course_id, day):
+    """Whether a page scoped to (course_id, start, end) shows marks for (day, course_id); None is unbounded."""
+    scope_course, start, end = scope
+    return scope_course in (None, course_id) and (start is None or start <= day <= end)
+
+
+class PageCache:
+    """Rendered pages keyed on endpoint and query string, with TTL expiry and (date, course) invalidation."""
+
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, scope):
+        self.backend.set(key, value, scope, self.ttl)
+
+    def invalidate(self, course_id, day):
+        self.invalidations += self.backend.invalidate(course_id, day)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl": self.ttl,
+            "max_entries": self.backend.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0,
+            "invalidated": self.invalidations,
+            **self.backend.size(),
+        }
+
+
+def _make_page_cache():
+    """PAGE_CACHE=memory (default, per process), sqlite (PAGE_CACHE_PATH, shared per host) or off.
+
+    With several worker processes use the sqlite backend: an in-memory cache
+    only sees invalidations from writes made by its own process.
+    """
+    kind = os.environ.get("PAGE_CACHE", "memory")
+    max_entries = int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", 500))
+    ttl = int(os.environ.get("PAGE_CACHE_TTL", 300))
+    if kind == "off":
+        return None
+    if kind == "sqlite":
+        path = os.environ.get("PAGE_CACHE_PATH", os.path.join(app.instance_path, "page_cache.db"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return PageCache(SQLiteCacheBackend(path, max_entries), ttl)
+    return PageCache(MemoryCacheBackend(max_entries), ttl)
+
+
+page_cache = _make_page_cache()
+
+
+@db.event.listens_for(db.session, "after_commit")
+def invalidate_touched_pages(session):
+    for day, course_id in session.info.pop("touched_sessions", ()):
+        if page_cache is not None:
+            page_cache.invalidate(course_id, day)
+
+
+@db.event.listens_for(db.session, "after_rollback")
+def forget_touched_pages(session):
+    session.info.pop("touched_sessions", None)
+
+
+def cached_page(scope):
+    """Serve a GET view's rendered HTML from page_cache.
+
+    The key is the endpoint plus its sorted query string and the roster and
+    course versions (so adding a student or subject misses) and the school.
+    Invalidation ignores the school, so a save also drops other schools'
+    pages for the same course id and date. scope(request.args)
+    returns the (course_id, start, end) dates the page shows, which
+    invalidate() matches against; None means any course or date.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if page_cache is None or request.method != "GET":
+                return f(*args, **kwargs)
+            versions = cache_versions()
+            key = "{}?{}|roster={}|courses={}|school={}".format(
+                request.endpoint, "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True))),
+                versions.get("roster", 0), versions.get("courses", 0), g.get("shard") or "",
+            )
+            body = page_cache.get(key)
+            if body is None:
+                body = f(*args, **kwargs)
+                if not isinstance(body, str):
+                    return body
+                page_cache.set(key, body, scope(request.args))
+            return body
+        return decorated_function
+    return decorator
+
+
+# --- LIVE ATTENDANCE BOARD ---
+
+# Publish each worker's saves to the others through the attendance_event table
+LIVE_BOARD_RELAY = os.environ.get("LIVE_BOARD_RELAY", "1") != "0"
+LIVE_BOARD_POLL_SECONDS = 1  # relay poll, once per process and only while someone watches
+LIVE_BOARD_KEEPALIVE = 15
+LIVE_BOARD_MAX_SECONDS = 300  # browsers reconnect (with Last-Event-ID), freeing the worker thread
+LIVE_BOARD_SYNC_MAX_SECONDS = 30  # on single-threaded workers (gunicorn's default sync), where a stream holds the whole worker
+LIVE_BOARD_KEEP = timedelta(hours=1)
+_PROCESS_TOKEN = uuid.uuid4().hex
+
+
+class BoardBroker:
+    """In-process fan-out of attendance changes to the SSE streams watching them.
+
+    Streams subscribe to a (school, date, course) or to a whole date (course None).
+    Each subscriber has a bounded queue; a viewer too slow to drain it skips
+    updates until it reconnects and catches up from attendance_event.
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # (school, iso date, course name or None) -> set of queues
+        self._lock = threading.Lock()
+
+    def subscribe(self, key):
+        q = queue.Queue(maxsize=100)
+        if LIVE_BOARD_RELAY:
+            # Before subscribing, so the relay never sees a school without its last event id
+            start_board_relay(key[0])
+        with self._lock:
+            self._subscribers.setdefault(key, set()).add(q)
+        return q
+
+    def unsubscribe(self, key, q):
+        with self._lock:
+            subscribers = self._subscribers.get(key, set())
+            subscribers.discard(q)
+            if not subscribers:
+                self._subscribers.pop(key, None)
+
+    def watched_schools(self):
+        with self._lock:
+            return {key[0] for key in self._subscribers}
+
+    def publish(self, school, event_id, payload):
+        with self._lock:
+            targets = [q for key in ((school, payload["date"], payload["course"]), (school, payload["date"], None))
+                       for q in self._subscribers.get(key, ())]
+        for q in targets:
+            try:
+                q.put_nowait((event_id, payload))
+            except queue.Full:
+                pass
+
+
+board = BoardBroker()
+
+
+def queue_board_update(selected_date, course_id, rows, statuses):
+    """Queue a live-board update for the changed rows of a session, published once the transaction commits.
+
+    statuses is {student_id: status} for the whole session after the change;
+    absent counts unmarked students, as the mark page does.
+    """
+    roster = get_roster()
+    present = sum(1 for status in statuses.values() if status == "P")
+    payload = {
+        "date": selected_date.isoformat(),
+        "course": get_courses().names_by_id.get(course_id),
+        "course_id": course_id,
+        "rows": [{"student_id": row["student_id"], "name": roster.names_by_id.get(row["student_id"]),
+                  "status": row["status"], "info": row["info"]} for row in rows],
+        "present": present,
+        "absent": max(len(roster.students) - present, 0),
+    }
+    event_id = None
+    if LIVE_BOARD_RELAY:
+        event_id = db.session.execute(db.insert(AttendanceEvent).values(
+            date=selected_date, course_id=course_id, origin=_PROCESS_TOKEN, payload=payload, created_at=_utcnow(),
+        )).inserted_primary_key[0]
+    db.session.info.setdefault("board_events", []).append((g.get("shard"), event_id, payload))
+
+
+@db.event.listens_for(db.session, "after_commit")
+def publish_board_updates(session):
+    for school, event_id, payload in session.info.pop("board_events", ()):
+        board.publish(school, event_id, payload)
+        cache = shards.get(school).state.get("matrix_cache")
+        if cache is not None:
+            cache.apply(payload)
+
+
+@db.event.listens_for(db.session, "after_rollback")
+def forget_board_updates(session):
+    session.info.pop("board_events", None)
+
+
+_board_relay = []
+_board_relay_lock = threading.Lock()
+_board_relay_last_ids = {}  # school -> last event id relayed
+
+
+def _relay_board_events():
+    """Forward events committed by other processes to this process's streams, for each watched school."""
+    last_ids = _board_relay_last_ids
+    last_prunes = {}
+    while True:
+        time.sleep(LIVE_BOARD_POLL_SECONDS)
+        for school in board.watched_schools():
+            if school not in last_ids:
+                continue
+            with school_context(school):
+                try:
+                    events = db.session.query(AttendanceEvent.id, AttendanceEvent.origin, AttendanceEvent.payload) \
+                        .filter(AttendanceEvent.id > last_ids[school]).order_by(AttendanceEvent.id).all()
+                    if time.monotonic() - last_prunes.get(school, 0) > 60:
+                        AttendanceEvent.query.filter(AttendanceEvent.created_at < _utcnow() - LIVE_BOARD_KEEP) \
+                            .delete(synchronize_session=False)
+                        db.session.commit()
+                        last_prunes[school] = time.monotonic()
+                except Exception:
+                    # One school's failure (a locked or unmigrated shard) must not stop the others
+                    app.logger.warning("Live board relay poll failed for school %s", school, exc_info=True)
+                    db.session.rollback()
+                    continue
+            for event_id, origin, payload in events:
+                last_ids[school] = event_id
+                if origin != _PROCESS_TOKEN:
+                    board.publish(school, event_id, payload)
+
+
+def start_board_relay(school):
+    """Relay other processes' events for school from now on, starting the relay thread if it isn't running."""
+    if school not in _board_relay_last_ids:
+        _board_relay_last_ids[school] = db.session.query(db.func.max(AttendanceEvent.id)).scalar() or 0
+    with _board_relay_lock:
+        if not (_board_relay and _board_relay[0].is_alive()):
+            thread = threading.Thread(target=_relay_board_events, name="board-relay", daemon=True)
+            thread.start()
+            _board_relay[:] = [thread]
+
+
+def threaded_worker():
+    """Whether this request is served by a threaded or async worker (gunicorn gthread/gevent, the dev server)."""
+    return bool(request.environ.get("wsgi.multithread"))
+
+
+def sse_event(event_id, payload):
+    return (f"id: {event_id}\n" if event_id else "") + f"event: attendance\ndata: {json.dumps(payload)}\n\n"
+
+
+@app.route("/attendance/live")
+@role_required('Teacher', 'Admin')
+def live_attendance():
+    """Server-Sent Events stream of attendance changes for ?date= and, optionally, ?course=.
+
+    Each event carries only the changed student rows and the session's
+    present/absent counts. The stream holds no database connection while it
+    waits, but it does hold a worker: on single-threaded workers it ends after
+    LIVE_BOARD_SYNC_MAX_SECONDS and the mark page only opens it on request.
+    """
+    day = parse_date(request.args.get("date")) or date_type.today()
+    course = request.args.get("course") or None
+    course_id = get_courses().ids_by_name.get(course)
+    if course and course_id is None:
+        return f"Unknown subject {course}", 400
+
+    missed = []
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    if last_event_id and LIVE_BOARD_RELAY:
+        query = db.session.query(AttendanceEvent.id, AttendanceEvent.payload) \
+            .filter(AttendanceEvent.id > last_event_id, AttendanceEvent.date == day)
+        if course_id is not None:
+            query = query.filter(AttendanceEvent.course_id == course_id)
+        missed = query.order_by(AttendanceEvent.id).all()
+    key = (g.shard, day.isoformat(), course)
+    q = board.subscribe(key)
+    threaded = threaded_worker()
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            for event_id, payload in missed:
+                yield sse_event(event_id, payload)
+            deadline = time.monotonic() + (LIVE_BOARD_MAX_SECONDS if threaded else LIVE_BOARD_SYNC_MAX_SECONDS)
+            while time.monotonic() < deadline:
+                try:
+                    event_id, payload = q.get(timeout=max(0, min(LIVE_BOARD_KEEPALIVE, deadline - time.monotonic())))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_event(event_id, payload)
+        finally:
+            board.unsubscribe(key, q)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# --- ATTENDANCE MATRIX ---
+
+class CourseBits:
+    """One subject's marks: per-student bitsets over days plus per-day class counts.
+
+    Bit d of present[row] / marked[row] is day origin + d. Python ints are
+    arbitrary-length bitsets whose &, >> and bit_count() run in C over a
+    whole term at once; day_present/day_marked are compact per-day counters.
+    """
+
+    def __init__(self, n_students):
+        self.present = [0] * n_students
+        self.marked = [0] * n_students
+        self.day_present = array("I")
+        self.day_marked = array("I")
+
+    def extend(self, d):
+        """Make room in the per-day counters for day d."""
+        if len(self.day_marked) <= d:
+            grow = array("I", bytes(4 * (d + 1 - len(self.day_marked))))
+            self.day_marked.extend(grow)
+            self.day_present.extend(grow)
+
+
+class AttendanceMatrix:
+    """Students x days x courses attendance, for class-wide reports without a query per student."""
+
+    def __init__(self, student_ids, origin):
+        self.student_ids = list(student_ids)
+        self.row_of = {student_id: row for row, student_id in enumerate(self.student_ids)}
+        self.origin = origin
+        self.courses = {}  # course_id -> CourseBits
+
+    def _bits(self, course_id):
+        bits = self.courses.get(course_id)
+        if bits is None:
+            bits = self.courses[course_id] = CourseBits(len(self.student_ids))
+        return bits
+
+    def _day(self, day):
+        """Bit index of day, moving the origin back (and shifting every bitset) for earlier dates."""
+        offset = (day - self.origin).days
+        if offset < 0:
+            for bits in self.courses.values():
+                bits.present = [value << -offset for value in bits.present]
+                bits.marked = [value << -offset for value in bits.marked]
+                bits.day_present[0:0] = array("I", bytes(4 * -offset))
+                bits.day_marked[0:0] = array("I", bytes(4 * -offset))
+            self.origin = day
+            offset = 0
+        return offset
+
+    def set(self, student_id, course_id, day, status):
+        """Record a mark; setting the same status twice is a no-op, so updates can be replayed."""
+        row = self.row_of.get(student_id)
+        if row is None:
+            return
+        bits = self._bits(course_id)
+        d = self._day(day)
+        bit = 1 << d
+        bits.extend(d)
+        was_marked = bool(bits.marked[row] & bit)
+        was_present = bool(bits.present[row] & bit)
+        is_present = status == "P"
+        if not was_marked:
+            bits.marked[row] |= bit
+            bits.day_marked[d] += 1
+        if is_present != was_present:
+            bits.present[row] ^= bit
+            if is_present:
+                bits.day_present[d] += 1
+            else:
+                bits.day_present[d] -= 1
+
+    def _mask(self, start, end):
+        """Bits for start..end inclusive (either may be None for open-ended), or None for all days."""
+        if start is None and end is None:
+            return None
+        lo = max((start - self.origin).days, 0) if start else 0
+        hi = (end - self.origin).days if end else None
+        if hi is not None and hi < lo:
+            return 0
+        return (((1 << (hi - lo + 1)) - 1) << lo) if hi is not None else -1 << lo
+
+    def _course_bits(self, course_id):
+        if course_id is None:
+            return list(self.courses.values())
+        return [self.courses[course_id]] if course_id in self.courses else []
+
+    def student_totals(self, course_id=None, start=None, end=None):
+        """{student_id: (present, marked)} over the range, for one course or all of them."""
+        mask = self._mask(start, end)
+        present = [0] * len(self.student_ids)
+        marked = [0] * len(self.student_ids)
+        for bits in self._course_bits(course_id):
+            for row, (p, m) in enumerate(zip(bits.present, bits.marked)):
+                if mask is not None:
+                    p &= mask
+                    m &= mask
+                present[row] += p.bit_count()
+                marked[row] += m.bit_count()
+        return {student_id: (present[row], marked[row]) for row, student_id in enumerate(self.student_ids)}
+
+    def lowest(self, n, course_id=None, start=None, end=None, min_sessions=1):
+        """The n students with the lowest attendance rate: (rate, student_id, present, marked)."""
+        totals = self.student_totals(course_id, start, end)
+        return heapq.nsmallest(n, (
+            (present / marked * 100, student_id, present, marked)
+            for student_id, (present, marked) in totals.items() if marked >= min_sessions
+        ))
+
+    def absence_streaks(self, course_id=None, min_streak=2):
+        """{student_id: absences in a row up to their latest mark}, counting marked days only.
+
+        Per course the streak is the number of marked days after the last
+        present one: marked >> (last present bit + 1), popcounted. Across
+        courses each subject's streak is counted separately and the longest kept.
+        """
+        streaks = {}
+        for bits in self._course_bits(course_id):
+            for row, (p, m) in enumerate(zip(bits.present, bits.marked)):
+                streak = (m >> p.bit_length()).bit_count()
+                if streak >= min_streak and streak > streaks.get(self.student_ids[row], 0):
+                    streaks[self.student_ids[row]] = streak
+        return streaks
+
+    def daily_rates(self, course_id=None, start=None, end=None):
+        """[(date, present, marked)] for each marked day in the range, oldest first."""
+        lo = max((start - self.origin).days, 0) if start else 0
+        hi = (end - self.origin).days if end else None
+        present, marked = {}, {}
+        for bits in self._course_bits(course_id):
+            for d in range(lo, len(bits.day_marked) if hi is None else min(hi + 1, len(bits.day_marked))):
+                if bits.day_marked[d]:
+                    present[d] = present.get(d, 0) + bits.day_present[d]
+                    marked[d] = marked.get(d, 0) + bits.day_marked[d]
+        return [(self.origin + timedelta(days=d), present[d], marked[d]) for d in sorted(marked)]
+
+    def nbytes(self):
+        """Approximate memory held by the bitsets and counters."""
+        total = 0
+        for bits in self.courses.values():
+            total += sum(sys.getsizeof(value) for value in bits.present) + sum(sys.getsizeof(value) for value in bits.marked)
+            total += bits.day_present.itemsize * len(bits.day_present) * 2
+        return total
+
+
+def _bitset(day_numbers):
+    return sum(map((1).__lshift__, map(int, day_numbers.split(",")))) if day_numbers else 0
+
+
+def load_attendance_matrix():
+    """Build the matrix in bulk: one row of day lists per (student, course) and one count per (course, day)."""
+    origin = db.session.query(db.func.min(AttendanceRecord.date)).scalar() or date_type.today()
+    matrix = AttendanceMatrix((s.id for s in get_roster().students), origin)
+    day = _day_number_expr(AttendanceRecord.date, origin)
+    is_present = AttendanceRecord.status == "P"
+    rows = db.session.query(
+        AttendanceRecord.student_id, AttendanceRecord.course_id,
+        _list_agg(day), _list_agg(db.case((is_present, day))),
+    ).group_by(AttendanceRecord.student_id, AttendanceRecord.course_id).yield_per(EXPORT_FETCH_SIZE)
+    for student_id, course_id, marked_days, present_days in rows:
+        row = matrix.row_of.get(student_id)
+        if row is not None:
+            bits = matrix._bits(course_id)
+            bits.marked[row] = _bitset(marked_days)
+            bits.present[row] = _bitset(present_days)
+    counts = db.session.query(
+        AttendanceRecord.course_id, day, db.func.count(), db.func.sum(db.case((is_present, 1), else_=0)),
+    ).group_by(AttendanceRecord.course_id, day)
+    for course_id, d, marked, present in counts:
+        bits = matrix._bits(course_id)
+        bits.extend(d)
+        bits.day_marked[d] = marked
+        bits.day_present[d] = present
+    return matrix
+
+
+class MatrixCache:
+    """This process's AttendanceMatrix for one school, kept current from save_attendance() commits.
+
+    Commits in this process are applied as they happen. Commits in other
+    workers are replayed from attendance_event (see the live board) on the
+    next get(). A roster or subject change, or a gap longer than the event
+    table keeps, rebuilds the matrix.
+    """
+
+    def __init__(self):
+        self.matrix = None
+        self.versions = None
+        self.last_event_id = 0
+        self.synced_at = 0
+        self.load_seconds = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        versions = (cache_versions().get("roster", 0), cache_versions().get("courses", 0))
+        with self._lock:
+            stale = time.monotonic() - self.synced_at > LIVE_BOARD_KEEP.total_seconds() / 2
+            if self.matrix is None or self.versions != versions or (LIVE_BOARD_RELAY and stale):
+                started = time.perf_counter()
+                # Events from here on are replayed over the load; replays are idempotent
+                self.last_event_id = db.session.query(db.func.max(AttendanceEvent.id)).scalar() or 0
+                self.matrix = load_attendance_matrix()
+                self.versions = versions
+                self.load_seconds = time.perf_counter() - started
+            elif LIVE_BOARD_RELAY:
+                events = db.session.query(AttendanceEvent.id, AttendanceEvent.payload) \
+                    .filter(AttendanceEvent.id > self.last_event_id).order_by(AttendanceEvent.id).all()
+                for event_id, payload in events:
+                    self._apply(payload)
+                    self.last_event_id = event_id
+            self.synced_at = time.monotonic()
+            return self.matrix
+
+    def apply(self, payload):
+        with self._lock:
+            self._apply(payload)
+
+    def _apply(self, payload):
+        if self.matrix is None or "course_id" not in payload:
+            return
+        day = date_type.fromisoformat(payload["date"])
+        for row in payload["rows"]:
+            self.matrix.set(row["student_id"], payload["course_id"], day, row["status"])
+
+    def stats(self):
+        matrix = self.matrix
+        return {
+            "loaded": matrix is not None,
+            "students": len(matrix.student_ids) if matrix else 0,
+            "courses": len(matrix.courses) if matrix else 0,
+            "days": max((len(bits.day_marked) for bits in matrix.courses.values()), default=0) if matrix else 0,
+            "bytes": matrix.nbytes() if matrix else 0,
+            "load_ms": round(self.load_seconds * 1000, 1) if self.load_seconds is not None else None,
+        }
+
+
+def get_matrix_cache():
+    """This process's MatrixCache for the current school."""
+    return shard_state().setdefault("matrix_cache", MatrixCache())
+
+
+def matrix_rates(course_id=None, start=None, end=None):
+    """attendance_rates("student") from the matrix: the same rows, in name order."""
+    names = get_roster().names_by_id
+    rates = []
+    for student_id, (present, marked) in get_matrix_cache().get().student_totals(course_id, start, end).items():
+        if marked and student_id in names:
+            rates.append({
+                "key": names[student_id],
+                "present": present,
+                "absent": marked - present,
+                "total": marked,
+                "rate": round(present / marked * 100, 2),
+            })
+    return sorted(rates, key=lambda row: row["key"])
+
+
+def class_watchlist(course_id=None, start=None, end=None, limit=10):
+    """Lowest attendance, current absence streaks and per-day class rates for a report page."""
+    matrix = get_matrix_cache().get()
+    names = get_roster().names_by_id
+    return {
+        "lowest": [{"name": names.get(student_id), "rate": round(rate, 2), "present": present, "total": marked}
+                   for rate, student_id, present, marked in matrix.lowest(limit, course_id, start, end)],
+        "streaks": sorted(({"name": names.get(student_id), "streak": streak}
+                           for student_id, streak in matrix.absence_streaks(course_id).items()),
+                          key=lambda row: -row["streak"])[:limit],
+        "daily": [{"date": day, "present": present, "total": marked, "rate": round(present / marked * 100, 2)}
+                  for day, present, marked in matrix.daily_rates(course_id, start, end)],
+    }
+
+
+@app.route("/api/attendance-matrix")
+@role_required('Teacher', 'Admin')
+def api_attendance_matrix():
+    """Matrix size and load time in this process, plus the watchlist for ?course= and ?range=/?date=."""
+    course = request.args.get("course") or None
+    course_id = get_courses().ids_by_name.get(course)
+    if course and course_id is None:
+        return jsonify({"error": f"unknown course {course}"}), 404
+    start = end = None
+    base_date = parse_date(request.args.get("date"))
+    if base_date and request.args.get("range", "all") != "all":
+        start, end = resolve_date_range(request.args["range"], base_date)
+    watchlist = class_watchlist(course_id, start, end)
+    watchlist["daily"] = [dict(row, date=row["date"].isoformat()) for row in watchlist["daily"]]
+    return jsonify({"matrix": get_matrix_cache().stats(), "course": course, **watchlist})
+
+
+# Redirect to login if not logged in
+@app.route("/", methods=["GET", "POST"])
+@app.route("/registeri", methods=["GET", "POST"])
+@login_required
+def home():
+    return redirect(url_for("front"))
+
+
+# Welcome front page, require login
+@app.route("/front")
+@login_required
+def front():
+    students = get_roster().students
+    user_role = session.get('role')
+    user_email = session.get('user')
+    student_name = session.get('student_name', None)
+    return render_template("index.html", students=students, user_role=user_role, user_email=user_email, student_name=student_name)
+
+# ✅ Attendance marking logic now in this route (Teacher and Admin only)
+@app.route("/mark", methods=["GET", "POST"])
+@role_required('Teacher', 'Admin')
+def mark_attendance():
+    roster = get_roster()
+    students = roster.students
+    success_message = None
+    show_records = False
+    selected_course = None
+    if request.method == "POST":
+        selected_date = parse_date(request.form.get("date")) or date_type.today()
+        selected_course = request.form.get("course")
+        course_id = get_courses().ids_by_name.get(selected_course)
+        if course_id is None:
+            return f"Unknown subject {selected_course}", 400
+
+        marks = {
+            s.id: (request.form.get(f"status_{s.name}", "A"), request.form.get(f"info_{s.name}", "not_informed"))
+            for s in students
+        }
+        save_attendance(selected_date, course_id, marks)
+        db.session.commit()
+        success_message = "Attendance saved successfully!"
+        show_records = True
+    else:
+        selected_date = date_type.today()
+        selected_course = get_courses().names[0] if get_courses().names else None
+
+    today_attendance = {s.name: {"status": "A", "info": "N/A"} for s in students}
+    records = db.session.query(AttendanceRecord.student_id, AttendanceRecord.status, AttendanceRecord.info) \
+        .filter(AttendanceRecord.date == selected_date,
+                AttendanceRecord.course_id == get_courses().ids_by_name.get(selected_course))
+    for student_id, status, info in records:
+        if student_id in roster.names_by_id:
+            today_attendance[roster.names_by_id[student_id]] = {"status": status, "info": info}
+
+    present_count = sum(1 for v in today_attendance.values() if v["status"] == "P")
+    absent_count = sum(1 for v in today_attendance.values() if v["status"] == "A")
+
+    return render_template("home.html",
+                           students=students,
+                           attendance=today_attendance,
+                           current_date=selected_date,
+                           present_count=present_count,
+                           absent_count=absent_count,
+                           courses=get_courses().names,
+                           homework_records=homework_records,
+                           success_message=success_message,
+                           show_records=show_records,
+                           selected_course=selected_course,
+                           live_auto=threaded_worker())
+
+
+@app.route("/student/<name>")
+@login_required
+def student_detail(name):
+    # Students can only view their own records
+    if session.get('role') == 'Student':
+        allowed_student_name = session.get('student_name')
+        if not allowed_student_name or name != allowed_student_name:
+            flash('You can only view your own attendance records.', 'error')
+            return redirect(url_for('front'))
+        student_id = session_student_id()
+    else:
+        student_id = get_roster().ids_by_name.get(name)
+    if not student_id:
+        return f"Student {name} not found", 404
+    
+    # Get filter parameters
+    selected_course = request.args.get('course', 'all')
+    date_range = request.args.get('range', 'all')
+    selected_date = request.args.get('date')
+    
+    course_list = get_courses()
+    course_id = None if selected_course == 'all' else course_list.ids_by_name.get(selected_course, -1)
+    page, present_count, absent_count = student_attendance(student_id, course_id, date_range, selected_date)
+    records_list = [(r.date, r.status, course_list.names_by_id.get(r.course_id)) for r in page.rows]
+    
+    total_days = present_count + absent_count
+    percentage = round((present_count / total_days) * 100, 2) if total_days > 0 else 0
+    
+    return render_template("student_detail.html",
+                           name=name,
+                           records=records_list,
+                           page=page,
+                           total_days=total_days,
+                           present_count=present_count,
+                           absent_count=absent_count,
+                           percentage=percentage,
+                           courses=course_list.names,
+                           selected_course=selected_course,
+                           date_range=date_range,
+                           selected_date=selected_date or datetime.now().strftime("%Y-%m-%d"))
+
+@app.route("/attendance/<date>")
+@role_required('Teacher', 'Admin')
+def view_attendance(date):
+    students = get_roster().students
+    day = parse_date(date)
+    records = db.session.query(Student.name, AttendanceRecord.status) \
+        .join(AttendanceRecord.student) \
+        .filter(AttendanceRecord.date == day)
+    daily_att = {s.name: "A" for s in students}
+    for student_name, status in records:
+        daily_att[student_name] = status
+    present_count = sum(1 for status in daily_att.values() if status == "P")
+    return render_template("daily_attendance.html",
+                           date=date,
+                           day=day,
+                           students=students,
+                           attendance=daily_att,
+                           present_count=present_count,
+                           absent_count=len(daily_att) - present_count)
+
+
+@app.route("/students", methods=["GET", "POST"])
+@role_required('Admin')
+def manage_students():
+    success_message = None
+    student_message = None
+    subject_message = None
+    if request.method == "POST":
+        if "delete_student" in request.form:
+            student_name = request.form.get("delete_student")
+            student = Student.query.filter_by(name=student_name).first()
+            if student:
+                job_id = enqueue_job("delete_student", student_id=student.id, name=student.name).id
+                db.session.commit()
+                student_message = f"Deleting '{student_name}' and their records in the background (job #{job_id})."
+        elif "add_student" in request.form:
+            new_student = request.form.get("add_student").strip()
+            if new_student and not Student.query.filter_by(name=new_student).first():
+                db.session.add(Student(name=new_student))
+                bump_cache_version("roster")
+                db.session.commit()
+                student_message = f"Student '{new_student}' added successfully."
+        elif "course_name" in request.form:
+            new_course = request.form.get("course_name").strip()
+            if new_course and new_course not in get_courses().ids_by_name:
+                db.session.add(Course(name=new_course))
+                bump_cache_version("courses")
+                db.session.commit()
+                subject_message = f"Subject '{new_course}' added successfully."
+        elif "import_file" in request.files:
+            upload = request.files["import_file"]
+            if upload.filename:
+                # Spool the upload where any job thread on this host can read it
+                os.makedirs(os.path.join(app.instance_path, "imports"), exist_ok=True)
+                fd, path = tempfile.mkstemp(suffix=".csv", dir=os.path.join(app.instance_path, "imports"))
+                with os.fdopen(fd, "wb") as f:
+                    upload.save(f)
+                job_id = enqueue_job("import_csv", path=path, filename=upload.filename).id
+                db.session.commit()
+                student_message = f"Importing {upload.filename} in the background (job #{job_id})."
+        return redirect(url_for("manage_students", student_message=student_message, subject_message=subject_message))
+    student_message = request.args.get("student_message")
+    subject_message = request.args.get("subject_message")
+    students = get_roster().students
+    return render_template("students.html", students=students, courses=get_courses().names, student_message=student_message, subject_message=subject_message)
+
+
+from flask import request  # make sure to import request
+
+def _report_scope(args):
+    """The report covers every date of its subject, or every subject when none is chosen."""
+    return get_courses().ids_by_name.get(args.get("subject")), None, None
+
+
+@app.route("/report", methods=["GET"])
+@role_required('Teacher', 'Admin')
+@cached_page(_report_scope)
+def student_report():
+    roster = get_roster()
+    students = roster.students
+    selected_subject = request.args.get("subject")
+    selected_student = request.args.get("student")
+    records = []
+    page = None
+    if selected_subject and selected_student:
+        student_id = roster.ids_by_name.get(selected_student)
+        if student_id:
+            query = db.session.query(AttendanceRecord.id, AttendanceRecord.date, AttendanceRecord.status, AttendanceRecord.info) \
+                .filter_by(student_id=student_id, course_id=get_courses().ids_by_name.get(selected_subject))
+            page = keyset_page(query, AttendanceRecord.date, AttendanceRecord.id)
+            records = page.rows
+    # Class-wide rates for the subject (or per subject when none is chosen);
+    # per-student figures come from the in-memory matrix
+    watchlist = None
+    if selected_subject:
+        course_id = get_courses().ids_by_name.get(selected_subject)
+        analytics = {group: attendance_rates(group, course=selected_subject) for group in ("weekday", "month")}
+        analytics["student"] = matrix_rates(course_id) if course_id is not None else []
+        if course_id is not None:
+            watchlist = class_watchlist(course_id)
+    else:
+        analytics = {"course": attendance_rates("course")}
+    return render_template(
+        "report.html",
+        students=students,
+        courses=get_courses().names,
+        selected_subject=selected_subject,
+        selected_student=selected_student,
+        records=records,
+        page=page,
+        analytics=analytics,
+        watchlist=watchlist
+    )
+
+
+def attendance_records_query(selected_course, range_type, selected_date):
+    """(student name, date, status, info, record id) rows for a course over the chosen range, oldest first."""
+    query = db.session.query(Student.name, AttendanceRecord.date, AttendanceRecord.status, AttendanceRecord.info, AttendanceRecord.id) \
+        .join(AttendanceRecord.student) \
+        .filter(AttendanceRecord.course_id == get_courses().ids_by_name.get(selected_course))
+    query = filter_date_range(query, AttendanceRecord.date, range_type, selected_date)
+    return query.order_by(AttendanceRecord.date, AttendanceRecord.id)
+
+
+def _attendance_records_scope(args):
+    base_date = parse_date(args.get("date"))
+    if base_date is None:
+        return None, None, None
+    return (get_courses().ids_by_name.get(args.get("course")),) + resolve_date_range(args.get("range", "day"), base_date)
+
+
+@app.route("/attendance-records")
+@role_required('Teacher', 'Admin')
+@cached_page(_attendance_records_scope)
+def view_attendance_records():
+    selected_date = request.args.get("date")
+    selected_course = request.args.get("course")
+    range_type = request.args.get("range", "day")
+    records_dict = {}
+    page = None
+    watchlist = None
+    course_id = get_courses().ids_by_name.get(selected_course)
+    if parse_date(selected_date) and selected_course:
+        page = keyset_page(attendance_records_query(selected_course, range_type, selected_date),
+                           AttendanceRecord.date, AttendanceRecord.id, descending=False)
+        for student_name, record_date, status, info, _ in page.rows:
+            if student_name not in records_dict:
+                records_dict[student_name] = []
+            records_dict[student_name].append({'date': record_date, 'status': status, 'info': info})
+        if course_id is not None:
+            watchlist = class_watchlist(course_id, *resolve_date_range(range_type, parse_date(selected_date)), limit=5)
+    return render_template(
+        "attendance_records.html",
+        courses=get_courses().names,
+        selected_date=selected_date,
+        selected_course=selected_course,
+        records=records_dict,
+        page=page,
+        range_type=range_type,
+        watchlist=watchlist
+    )
+
+
+
+def filter_homework(query, filter_date, filter_course, filter_range):
+    """Apply the homework listing's date range and subject filters (query must join Course)."""
+    if filter_date:
+        query = filter_date_range(query, Homework.date, filter_range, filter_date)
+    if filter_course:
+        query = query.filter(Course.name == filter_course)
+    return query
+
+
+def homework_progress_query(filter_date, filter_course, filter_range, homework_ids=None):
+    """One outer join yielding every (homework, student progress) pair for the filter, newest first.
+
+    homework_ids limits the result to one page of homework.
+    """
+    query = db.session.query(
+        Homework.date, Course.name, Homework.description,
+        HomeworkProgress.id, HomeworkProgress.marks, HomeworkProgress.progress, Student.name,
+    ).select_from(Homework).join(Homework.course).outerjoin(Homework.progresses).outerjoin(HomeworkProgress.student)
+    query = filter_homework(query, filter_date, filter_course, filter_range)
+    if homework_ids is not None:
+        query = query.filter(Homework.id.in_(homework_ids))
+    return query.order_by(Homework.date.desc(), Homework.id.desc(), HomeworkProgress.id)
+
+
+@app.route("/homework", methods=["GET", "POST"])
+@role_required('Teacher', 'Admin')
+def homework():
+
+    students = get_roster().students
+    success_message = None
+    selected_course = None
+    # Handle POST (save homework and answer doubts)
+    if request.method == "POST":
+        # Check if it's a doubt answer
+        if 'doubt_id' in request.form:
+            doubt_id = request.form.get("doubt_id")
+            answer = request.form.get("answer", "").strip()
+            if doubt_id and answer:
+                doubt = HomeworkDoubt.query.get(doubt_id)
+                if doubt:
+                    doubt.answer = answer
+                    doubt.answered_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    bump_record_versions([(doubt.student_id, doubt.homework.course_id)])
+                    db.session.commit()
+                    success_message = "Answer submitted successfully!"
+        else:
+            # Save homework
+            selected_date = parse_date(request.form.get("date")) or date_type.today()
+            selected_course = request.form.get("course")
+            course_id = get_courses().ids_by_name.get(selected_course)
+            if course_id is None:
+                return f"Unknown subject {selected_course}", 400
+            description = request.form.get("description", "").strip()
+            homework = Homework.query.filter_by(date=selected_date, course_id=course_id).first()
+            if not homework:
+                homework = Homework(date=selected_date, course_id=course_id, description=description)
+                db.session.add(homework)
+            else:
+                homework.description = description
+            db.session.flush()
+            existing_progress = dict(
+                db.session.query(HomeworkProgress.student_id, HomeworkProgress.id).filter_by(homework_id=homework.id)
+            )
+            new_rows, changed_rows = [], []
+            for student in students:
+                mark = request.form.get(f"{student.name}_marks", "").strip()
+                progress = request.form.get(f"{student.name}_progress", "").strip()
+                if student.id in existing_progress:
+                    changed_rows.append({"id": existing_progress[student.id], "marks": mark, "progress": progress})
+                else:
+                    new_rows.append({"homework_id": homework.id, "student_id": student.id, "marks": mark, "progress": progress})
+            # Two executemany statements regardless of class size
+            if new_rows:
+                db.session.execute(db.insert(HomeworkProgress), new_rows)
+            if changed_rows:
+                db.session.execute(db.update(HomeworkProgress), changed_rows)
+            bump_record_versions([(COURSE_WIDE, course_id)])
+            db.session.commit()
+            success_message = "Homework and Exercism progress saved!"
+
+    # Handle GET (filter records)
+    filter_date = request.args.get("filter_date")
+    filter_course = request.args.get("filter_course")
+    filter_range = request.args.get("filter_range", "day")
+    homework_records = {}
+    # Page over homework entries, then load the progress rows for just that page
+    page = keyset_page(
+        filter_homework(db.session.query(Homework.id, Homework.date).join(Homework.course), filter_date, filter_course, filter_range),
+        Homework.date, Homework.id,
+    )
+    rows = homework_progress_query(filter_date, filter_course, filter_range, [row.id for row in page.rows]).all()
+    for hw_date, hw_course, description, progress_id, marks, progress, student_name in rows:
+        if hw_date not in homework_records:
+            homework_records[hw_date] = {}
+        if hw_course not in homework_records[hw_date]:
+            homework_records[hw_date][hw_course] = {
+                "description": description,
+                "marks": {},
+                "progress": {}
+            }
+        if progress_id is not None:
+            student_name = student_name or "Unknown"
+            homework_records[hw_date][hw_course]["marks"][student_name] = marks or "N/A"
+            homework_records[hw_date][hw_course]["progress"][student_name] = progress or "N/A"
+
+    # Get all unanswered doubts
+    unanswered_doubts = HomeworkDoubt.query.filter_by(answer=None) \
+        .options(joinedload(HomeworkDoubt.student), joinedload(HomeworkDoubt.homework)) \
+        .order_by(HomeworkDoubt.created_at.desc()).all()
+    
+    return render_template(
+        "homework.html",
+        students=students,
+        courses=get_courses().names,
+        homework_records=homework_records,
+        page=page,
+        selected_course=selected_course,
+        current_date=datetime.now().strftime("%Y-%m-%d"),
+        success_message=success_message,
+        unanswered_doubts=unanswered_doubts
+    )
+
+
+
+# --- ANALYTICS ---
+
+WEEKDAY_NAMES = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+ANALYTICS_GROUPS = ("student", "course", "weekday", "month")
+
+
+def attendance_rates(group_by, course=None, date_range="all", selected_date=None):
+    """Present/absent counts and rate per student, course, weekday or month.
+
+    All counting happens in one GROUP BY query over the indexed record table;
+    returns a list of {"key", "present", "absent", "total", "rate"} dicts.
+    """
+    present = db.func.sum(db.case((AttendanceRecord.status == "P", 1), else_=0))
+    absent = db.func.sum(db.case((AttendanceRecord.status == "A", 1), else_=0))
+    if group_by == "student":
+        keys = (Student.name,)
+    elif group_by == "course":
+        keys = (Course.name,)
+    elif group_by == "weekday":
+        keys = (_weekday_expr(AttendanceRecord.date),)
+    elif group_by == "month":
+        keys = (_month_expr(AttendanceRecord.date),)
+    else:
+        raise ValueError(f"Unknown analytics grouping: {group_by}")
+
+    query = db.session.query(*keys, present, absent)
+    if group_by == "student":
+        query = query.join(AttendanceRecord.student)
+    elif group_by == "course":
+        query = query.join(AttendanceRecord.course)
+    if course:
+        query = query.filter(AttendanceRecord.course_id == get_courses().ids_by_name.get(course))
+    if date_range != "all":
+        query = filter_date_range(query, AttendanceRecord.date, date_range, selected_date)
+    query = query.group_by(*keys).order_by(*keys)
+
+    rates = []
+    for key, present_count, absent_count in query:
+        total = present_count + absent_count
+        rates.append({
+            "key": WEEKDAY_NAMES[key] if group_by == "weekday" else key,
+            "present": present_count,
+            "absent": absent_count,
+            "total": total,
+            "rate": round(present_count / total * 100, 2) if total else 0,
+        })
+    return rates
+
+
+@app.route("/api/analytics")
+@role_required('Teacher', 'Admin')
+def api_analytics():
+    course = request.args.get("course") or None
+    date_range = request.args.get("range", "all")
+    selected_date = request.args.get("date")
+    group = request.args.get("group")
+    if group and group not in ANALYTICS_GROUPS:
+        return jsonify({"error": f"group must be one of {', '.join(ANALYTICS_GROUPS)}"}), 400
+    groups = [group] if group else ANALYTICS_GROUPS
+    return jsonify({
+        "course": course,
+        "range": date_range,
+        "date": selected_date,
+        **{f"by_{g}": attendance_rates(g, course, date_range, selected_date) for g in groups},
+    })
+
+
+@app.route("/api/page-cache")
+@role_required('Admin')
+def api_page_cache():
+    """Hit/miss counters (this process) and size of the rendered-page cache, for sizing it."""
+    if page_cache is None:
+        return jsonify({"backend": None})
+    return jsonify(page_cache.stats())
+
+
+# --- JSON API (v1) ---
+
+def record_validators(student_id=None, course_id=None):
+    """Weak ETag and Last-Modified for the RecordVersion counters in scope.
+
+    Reads only the counter table, so a revalidation never touches the record
+    tables. A student's scope includes the COURSE_WIDE counters.
+    """
+    query = db.session.query(
+        db.func.count(), db.func.coalesce(db.func.sum(RecordVersion.version), 0), db.func.max(RecordVersion.updated_at)
+    )
+    if student_id is not None:
+        query = query.filter(RecordVersion.student_id.in_((student_id, COURSE_WIDE)))
+    if course_id is not None:
+        query = query.filter(RecordVersion.course_id == course_id)
+    count, total, updated_at = query.one()
+    last_modified = updated_at.replace(tzinfo=timezone.utc) if updated_at else None
+    stamp = int(last_modified.timestamp()) if last_modified else 0
+    return f"v1-{count}-{total}-{stamp}", last_modified
+
+
+def conditional_json(validators, build):
+    """304 if the request's If-None-Match/If-Modified-Since still match, else jsonify(build()).
+
+    Responses may be stored by browsers and shared caches but must be
+    revalidated (no-cache), which re-runs the login check on every use.
+    RecordVersion.updated_at has whole-second resolution, so Last-Modified
+    is only sent (and If-Modified-Since only trusted) once that second has
+    passed; until then a second write could share the timestamp, and the
+    exact-counter ETag is the only validator.
+    """
+    etag, last_modified = validators
+    settled = bool(last_modified and last_modified < datetime.now(timezone.utc).replace(microsecond=0))
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    else:
+        fresh = bool(settled and request.if_modified_since and last_modified <= request.if_modified_since)
+    response = Response(status=304) if fresh else jsonify(build())
+    response.set_etag(etag, weak=True)
+    if settled:
+        response.last_modified = last_modified  # assigning None would stamp the current time
+    response.cache_control.no_cache = True
+    response.vary.add("Cookie")
+    return response
+
+
+def page_json(page):
+    return {"next": page.next_cursor, "prev": page.prev_cursor, "per_page": page.per_page}
+
+
+@app.route("/api/v1/students/<name>/attendance")
+@login_required
+def api_student_attendance(name):
+    """JSON mirror of student_detail: ?course=, ?range=, ?date= and the page cursors."""
+    if session.get('role') == 'Student':
+        if name != session.get('student_name'):
+            return jsonify({"error": "students can only view their own attendance"}), 403
+        student_id = session_student_id()
+    else:
+        student_id = get_roster().ids_by_name.get(name)
+    if not student_id:
+        return jsonify({"error": f"student {name} not found"}), 404
+    course_list = get_courses()
+    selected_course = request.args.get('course', 'all')
+    date_range = request.args.get('range', 'all')
+    selected_date = request.args.get('date')
+    course_id = None
+    if selected_course != 'all':
+        course_id = course_list.ids_by_name.get(selected_course)
+        if course_id is None:
+            return jsonify({"error": f"unknown course {selected_course}"}), 404
+
+    def build():
+        page, present, absent = student_attendance(student_id, course_id, date_range, selected_date)
+        total = present + absent
+        return {
+            "student": name,
+            "course": selected_course,
+            "range": date_range,
+            "date": selected_date,
+            "present": present,
+            "absent": absent,
+            "total": total,
+            "percentage": round(present / total * 100, 2) if total else 0,
+            "records": [{"date": r.date.isoformat(), "course": course_list.names_by_id.get(r.course_id), "status": r.status}
+                        for r in page.rows],
+            "page": page_json(page),
+        }
+
+    return conditional_json(record_validators(student_id, course_id), build)
+
+
+@app.route("/api/v1/attendance-records")
+@role_required('Teacher', 'Admin')
+def api_attendance_records():
+    """JSON mirror of view_attendance_records: ?course=, ?date=, ?range= and the page cursors."""
+    selected_date = request.args.get("date")
+    selected_course = request.args.get("course")
+    range_type = request.args.get("range", "day")
+    course_id = get_courses().ids_by_name.get(selected_course)
+    if not parse_date(selected_date) or course_id is None:
+        return jsonify({"error": "a valid date and known course are required"}), 400
+
+    def build():
+        page = keyset_page(attendance_records_query(selected_course, range_type, selected_date),
+                           AttendanceRecord.date, AttendanceRecord.id, descending=False)
+        return {
+            "course": selected_course,
+            "date": selected_date,
+            "range": range_type,
+            "records": [{"student": name, "date": record_date.isoformat(), "status": status, "info": info}
+                        for name, record_date, status, info, _ in page.rows],
+            "page": page_json(page),
+        }
+
+    return conditional_json(record_validators(course_id=course_id), build)
+
+
+@app.route("/api/v1/student-homework")
+@role_required('Student')
+def api_student_homework():
+    """JSON mirror of student_homework for the logged-in student: ?course= filters."""
+    student_id = session_student_id()
+    if not student_id:
+        return jsonify({"error": "student profile not found"}), 404
+    filter_course = request.args.get("course")
+    course_id = None
+    if filter_course:
+        course_id = get_courses().ids_by_name.get(filter_course)
+        if course_id is None:
+            return jsonify({"error": f"unknown course {filter_course}"}), 404
+
+    def build():
+        return {
+            "student": session.get('student_name'),
+            "course": filter_course,
+            "homework": [{
+                "id": item['homework'].id,
+                "date": item['homework'].date.isoformat(),
+                "course": item['homework'].course.name,
+                "description": item['homework'].description,
+                "marks": item['marks'],
+                "progress": item['progress'],
+                "doubts": [{"question": d.question, "answer": d.answer, "created_at": d.created_at, "answered_at": d.answered_at}
+                           for d in item['doubts']],
+            } for item in student_homework_data(student_id, course_id)],
+        }
+
+    return conditional_json(record_validators(student_id, course_id), build)
+
+
+# --- EXPORTS ---
+
+# Rows fetched per round trip while streaming, and bytes buffered per chunk sent
+EXPORT_FETCH_SIZE = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def export_filename(prefix, *parts):
+    """A download name like prefix_part_part.csv from query-string parts (None is "all").
+
+    Control characters, whitespace and characters that are special in headers
+    or paths become "-"; letters in any script are kept.
+    """
+    cleaned = []
+    for part in parts:
+        part = "".join("-" if unicodedata.category(ch)[0] in "CZ" or ch in '"\\/:;,*?<>|%' else ch
+                       for ch in part or "all")
+        cleaned.append(re.sub(r"-{2,}", "-", part).strip("-.")[:40] or "all")
+    return "_".join([prefix, *cleaned]) + ".csv"
+
+
+def content_disposition(response, filename):
+    """Set an attachment Content-Disposition for filename, with filename* for non-ASCII names as send_file() does."""
+    try:
+        filename.encode("ascii")
+        names = {"filename": filename}
+    except UnicodeEncodeError:
+        fallback = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+        names = {"filename": fallback, "filename*": "UTF-8''" + quote(filename, safe="!#$&+-.^_`|~")}
+    response.headers.set("Content-Disposition", "attachment", **names)
+    return response
+
+
+def stream_csv(filename, header, rows):
+    """Stream rows as a CSV download, holding at most one chunk in memory."""
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return content_disposition(Response(stream_with_context(generate()), mimetype="text/csv"), filename)
+
+
+@app.route("/attendance-records/export")
+@role_required('Teacher', 'Admin')
+def export_attendance_records():
+    selected_date = request.args.get("date")
     selected_course = request.args.get("course")
     range_type = request.args.get("range", "day")
-    records_dict = {}
-    records = []
-    db_date = None
-    if selected_date:
-        try:
-            db_date = datetime.strptime(selected_date, "%Y-%m-%d").strftime("%d-%m-%Y")
-        except Exception:
-            db_date = selected_date
-    if db_date and selected_course:
-        if range_type == "day":
-            records = AttendanceRecord.query.filter_by(date=db_date, course=selected_course).all()
-        else:
-            base_date = datetime.strptime(selected_date, "%Y-%m-%d")
-            if range_type == "week":
-                start_date = base_date - timedelta(days=base_date.weekday())
-                end_date = start_date + timedelta(days=6)
-            elif range_type == "month":
-                start_date = base_date.replace(day=1)
-                if start_date.month == 12:
-                    end_date = start_date.replace(year=start_date.year+1, month=1, day=1) - timedelta(days=1)
-                else:
-                    end_date = start_date.replace(month=start_date.month+1, day=1) - timedelta(days=1)
-            elif range_type == "year":
-                start_date = base_date.replace(month=1, day=1)
-                end_date = base_date.replace(month=12, day=31)
-            else:
-                start_date = end_date = base_date
-            start_db_date = start_date.strftime("%d-%m-%Y")
-            end_db_date = end_date.strftime("%d-%m-%Y")
-            records = AttendanceRecord.query.filter(
-                AttendanceRecord.course==selected_course,
-                AttendanceRecord.date >= start_db_date,
-                AttendanceRecord.date <= end_db_date
-            ).all()
-        for r in records:
-            if r.student.name not in records_dict:
-                records_dict[r.student.name] = []
-            records_dict[r.student.name].append({'date': r.date, 'status': r.status, 'info': r.info})
-    return render_template(
-        "attendance_records.html",
-        courses=courses,
-        selected_date=selected_date,
-        selected_course=selected_course,
-        records=records_dict,
-        range_type=range_type
+    if not (parse_date(selected_date) and selected_course):
+        return "date and course are required", 400
+    rows = attendance_records_query(selected_course, range_type, selected_date).yield_per(EXPORT_FETCH_SIZE)
+    return stream_csv(
+        export_filename("attendance", selected_course, range_type, selected_date),
+        ["student", "date", "course", "status", "info"],
+        ((name, record_date, selected_course, status, info) for name, record_date, status, info, _ in rows),
     )
 
 
+REPORT_EXPORT_HEADER = ["student", "date", "course", "status", "info"]
 
-@app.route("/homework", methods=["GET", "POST"])
+
+def report_export_query(selected_subject, selected_student):
+    """Attendance rows for the report export, newest first; either filter may be None for all."""
+    query = db.session.query(Student.name, AttendanceRecord.date, Course.name,
+                             AttendanceRecord.status, AttendanceRecord.info) \
+        .join(AttendanceRecord.student).join(AttendanceRecord.course)
+    if selected_subject:
+        query = query.filter(Course.name == selected_subject)
+    if selected_student:
+        query = query.filter(Student.name == selected_student)
+    return query.order_by(AttendanceRecord.date.desc(), Student.name)
+
+
+@app.route("/report/export")
 @role_required('Teacher', 'Admin')
-def homework():
+def export_student_report():
+    selected_subject = request.args.get("subject")
+    selected_student = request.args.get("student")
+    return stream_csv(
+        export_filename("report", selected_subject, selected_student),
+        REPORT_EXPORT_HEADER,
+        report_export_query(selected_subject, selected_student).yield_per(EXPORT_FETCH_SIZE),
+    )
 
-    students = Student.query.all()
-    success_message = None
-    selected_course = None
-    # Handle POST (save homework and answer doubts)
-    if request.method == "POST":
-        # Check if it's a doubt answer
-        if 'doubt_id' in request.form:
-            doubt_id = request.form.get("doubt_id")
-            answer = request.form.get("answer", "").strip()
-            if doubt_id and answer:
-                doubt = HomeworkDoubt.query.get(doubt_id)
-                if doubt:
-                    doubt.answer = answer
-                    doubt.answered_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    db.session.commit()
-                    success_message = "Answer submitted successfully!"
-        else:
-            # Save homework
-            selected_date = request.form.get("date")
-            selected_course = request.form.get("course")
-            description = request.form.get("description", "").strip()
-            homework = Homework.query.filter_by(date=selected_date, course=selected_course).first()
-            if not homework:
-                homework = Homework(date=selected_date, course=selected_course, description=description)
-                db.session.add(homework)
-            else:
-                homework.description = description
-            db.session.commit()
-            for student in students:
-                mark = request.form.get(f"{student.name}_marks", "").strip()
-                progress = request.form.get(f"{student.name}_progress", "").strip()
-                hw_progress = HomeworkProgress.query.filter_by(homework_id=homework.id, student_id=student.id).first()
-                if not hw_progress:
-                    hw_progress = HomeworkProgress(homework_id=homework.id, student_id=student.id)
-                    db.session.add(hw_progress)
-                hw_progress.marks = mark
-                hw_progress.progress = progress
-            db.session.commit()
-            success_message = "Homework and Exercism progress saved!"
 
-    # Handle GET (filter records)
+@app.route("/homework/export")
+@role_required('Teacher', 'Admin')
+def export_homework():
     filter_date = request.args.get("filter_date")
     filter_course = request.args.get("filter_course")
     filter_range = request.args.get("filter_range", "day")
-    homework_records = {}
-    query = Homework.query
-    # Date filtering logic
-    if filter_date:
-        try:
-            base_date = datetime.strptime(filter_date, "%Y-%m-%d")
-            if filter_range == "day":
-                start_date = end_date = base_date
-            elif filter_range == "week":
-                start_date = base_date - timedelta(days=base_date.weekday())
-                end_date = start_date + timedelta(days=6)
-            elif filter_range == "month":
-                start_date = base_date.replace(day=1)
-                if start_date.month == 12:
-                    end_date = start_date.replace(year=start_date.year+1, month=1, day=1) - timedelta(days=1)
-                else:
-                    end_date = start_date.replace(month=start_date.month+1, day=1) - timedelta(days=1)
-            elif filter_range == "year":
-                start_date = base_date.replace(month=1, day=1)
-                end_date = base_date.replace(month=12, day=31)
-            else:
-                start_date = end_date = base_date
-            start_db_date = start_date.strftime("%Y-%m-%d")
-            end_db_date = end_date.strftime("%Y-%m-%d")
-            query = query.filter(Homework.date >= start_db_date, Homework.date <= end_db_date)
-        except Exception:
-            pass
-    if filter_course:
-        query = query.filter_by(course=filter_course)
-    all_homeworks = query.order_by(Homework.date.desc()).all()
-    # Only add records that match the filter
-    for hw in all_homeworks:
-        # If filtering by date and range, only include matching dates
-        if filter_date and filter_range == "day":
-            if hw.date != filter_date:
+    rows = homework_progress_query(filter_date, filter_course, filter_range).yield_per(EXPORT_FETCH_SIZE)
+    return stream_csv(
+        export_filename("homework", filter_course, filter_range, filter_date),
+        ["date", "course", "description", "student", "marks", "progress"],
+        ((hw_date, course, description, name, marks, progress)
+         for hw_date, course, description, _, marks, progress, name in rows),
+    )
+
+
+# --- IMPORT ---
+
+# Rows validated and written per transaction
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_MAX_ERRORS = 20
+
+
+def import_csv(stream, progress=None):
+    """Load a roster or attendance CSV in chunked transactions.
+
+    A file with only a "student" (or "name") column adds students. A file with
+    student, date, course, status and optional info columns (the export format)
+    also creates any missing students and upserts their marks through
+    save_attendance(), so summaries stay in step. Student names resolve through
+    one cached name -> id map. progress(result), if given, runs after each
+    committed chunk. Returns counts, elapsed time and the first few
+    validation errors.
+    """
+    started = time.perf_counter()
+    reader = csv.DictReader(stream)
+    fields = {f.strip().lower() for f in reader.fieldnames or []}
+    name_field = "student" if "student" in fields else "name"
+    if name_field not in fields:
+        raise ValueError("CSV needs a 'student' or 'name' column")
+    roster_only = not {"date", "course", "status"} <= fields
+    student_ids = dict(db.session.query(Student.name, Student.id))
+    result = {"rows": 0, "imported": 0, "students_added": 0, "errors": [], "error_count": 0}
+
+    def error(line_no, message):
+        result["error_count"] += 1
+        if len(result["errors"]) < IMPORT_MAX_ERRORS:
+            result["errors"].append(f"line {line_no}: {message}")
+
+    chunk = []
+    for raw in reader:
+        line_no = reader.line_num  # the record's last line; quoted fields can span lines
+        result["rows"] += 1
+        if raw.get(None):
+            error(line_no, "too many fields")
+            continue
+        row = {k.strip().lower(): (v or "").strip() for k, v in raw.items()}
+        name = row.get(name_field)
+        if not name:
+            error(line_no, "missing student name")
+            continue
+        if roster_only:
+            chunk.append((name,))
+        else:
+            mark_date = parse_date(row.get("date"))
+            status = row.get("status", "").upper()
+            if mark_date is None:
+                error(line_no, f"bad date {row.get('date')!r}")
                 continue
-            if filter_course and hw.course != filter_course:
+            if not row.get("course"):
+                error(line_no, "missing course")
                 continue
-        if hw.date not in homework_records:
-            homework_records[hw.date] = {}
-        # Only add the selected course for 'Today' filter
-        if filter_date and filter_range == "day" and filter_course:
-            if hw.course != filter_course:
+            if status not in ("P", "A"):
+                error(line_no, f"status must be P or A, got {status!r}")
                 continue
-        homework_records[hw.date][hw.course] = {
-            "description": hw.description,
-            "marks": {},
-            "progress": {}
-        }
-        for prog in hw.progresses:
-            student_name = prog.student.name if prog.student else "Unknown"
-            homework_records[hw.date][hw.course]["marks"][student_name] = prog.marks or "N/A"
-            homework_records[hw.date][hw.course]["progress"][student_name] = prog.progress or "N/A"
+            chunk.append((name, mark_date, row["course"], status, row.get("info") or "not_informed"))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            _import_chunk(chunk, student_ids, result)
+            chunk = []
+            if progress:
+                progress(result)
+    if chunk:
+        _import_chunk(chunk, student_ids, result)
 
-    # Get all unanswered doubts
-    unanswered_doubts = HomeworkDoubt.query.filter_by(answer=None).order_by(HomeworkDoubt.created_at.desc()).all()
-    
-    return render_template(
-        "homework.html",
-        students=students,
-        courses=courses,
-        homework_records=homework_records,
-        selected_course=selected_course,
-        current_date=datetime.now().strftime("%Y-%m-%d"),
-        success_message=success_message,
-        unanswered_doubts=unanswered_doubts
+    result["elapsed"] = time.perf_counter() - started
+    result["rows_per_sec"] = result["rows"] / result["elapsed"] if result["elapsed"] else 0
+    return result
+
+
+def _import_chunk(chunk, student_ids, result):
+    """Write one validated chunk (new students, then marks per session) in a single transaction."""
+    new_names = {row[0] for row in chunk} - student_ids.keys()
+    if new_names:
+        upsert_rows(Student, [{"name": name} for name in sorted(new_names)], ["name"], ["name"])
+        bump_cache_version("roster")
+        student_ids.update(db.session.query(Student.name, Student.id).filter(Student.name.in_(new_names)))
+        result["students_added"] += len(new_names)
+    sessions = {}
+    for name, *mark in chunk:
+        if mark:
+            mark_date, course, status, info = mark
+            sessions.setdefault((mark_date, course), {})[student_ids[name]] = (status, info)
+    course_ids = ensure_courses({course for _, course in sessions})
+    for (mark_date, course), marks in sessions.items():
+        save_attendance(mark_date, course_ids[course], marks)
+    db.session.commit()
+    result["imported"] += len(chunk)
+
+
+def format_import_result(result):
+    message = (f"Imported {result['imported']} of {result['rows']} rows "
+               f"({result['students_added']} new students) at {result['rows_per_sec']:.0f} rows/sec.")
+    if result["error_count"]:
+        message += f" Skipped {result['error_count']} invalid rows: " + "; ".join(result["errors"][:3])
+    return message
+
+
+@app.cli.command("import-csv")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@school_option
+def import_csv_command(path):
+    """Import a roster or attendance CSV (student,date,course,status,info)."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        result = import_csv(f)
+    print(format_import_result(result))
+    for message in result["errors"]:
+        print(f"  {message}")
+
+
+# --- BACKGROUND JOBS ---
+
+# Job threads per process; JOB_THREADS=0 leaves the queue to `flask run-jobs`
+JOB_THREADS = int(os.environ.get("JOB_THREADS", 2))
+JOB_POLL_SECONDS = 2  # also picks up jobs queued by other processes
+JOB_SWEEP_SECONDS = 60  # schools whose shard isn't open in this process are checked this often
+JOB_STALE_AFTER = timedelta(minutes=10)  # a running job silent this long is retried
+JOB_DELETE_CHUNK = 5000
+JOB_HANDLERS = {}
+_job_wakeup = threading.Event()
+_job_threads = []
+_job_threads_lock = threading.Lock()
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def job_handler(kind):
+    """Register f(job, **params) to run jobs of this kind; its return value becomes job.result."""
+    def decorator(f):
+        JOB_HANDLERS[kind] = f
+        return f
+    return decorator
+
+
+def enqueue_job(kind, **params):
+    """Queue a job in the caller's transaction; a job thread picks it up once that commits."""
+    job = Job(kind=kind, params=params, status="queued", progress=0, created_at=_utcnow(),
+              created_by=session.get('user') if has_request_context() else None)
+    db.session.add(job)
+    db.session.flush()
+    db.session.info["jobs_enqueued"] = True
+    return job
+
+
+@db.event.listens_for(db.session, "after_commit")
+def wake_job_threads(session):
+    if session.info.pop("jobs_enqueued", False):
+        start_job_threads()
+        _job_wakeup.set()
+
+
+@db.event.listens_for(db.session, "after_rollback")
+def forget_enqueued_jobs(session):
+    session.info.pop("jobs_enqueued", None)
+
+
+def job_progress(job, percent, message=None):
+    """Record progress and commit; handlers call this between chunks so each chunk is its own transaction."""
+    job.progress = max(0, min(int(percent), 99))
+    if message is not None:
+        job.message = message[:255]
+    job.heartbeat_at = _utcnow()
+    db.session.commit()
+
+
+def _runnable_jobs(now):
+    return db.or_(Job.status == "queued", db.and_(Job.status == "running", Job.heartbeat_at < now - JOB_STALE_AFTER))
+
+
+def claim_job():
+    """Mark the oldest runnable job as running and return its id, or None if the queue is empty."""
+    now = _utcnow()
+    runnable = _runnable_jobs(now)
+    job_id = db.session.query(Job.id).filter(runnable).order_by(Job.id).limit(1).scalar()
+    if job_id is None:
+        db.session.rollback()
+        return None
+    # Conditional update so two threads (or processes) never claim the same job
+    claimed = db.session.execute(
+        db.update(Job).where(Job.id == job_id, runnable).values(status="running", started_at=now, heartbeat_at=now)
+    ).rowcount
+    db.session.commit()
+    return job_id if claimed else claim_job()
+
+
+def run_job(job_id):
+    job = db.session.get(Job, job_id)
+    try:
+        handler = JOB_HANDLERS.get(job.kind)
+        if handler is None:
+            raise ValueError(f"no handler for job kind {job.kind!r}")
+        result = handler(job, **job.params)
+    except Exception as error:
+        app.logger.exception("Job %s (%s) failed", job_id, job.kind)
+        db.session.rollback()
+        job = db.session.get(Job, job_id)
+        job.status = "failed"
+        job.message = f"{type(error).__name__}: {error}"[:255]
+    else:
+        job.status = "done"
+        job.progress = 100
+        job.result = result
+    job.finished_at = _utcnow()
+    db.session.commit()
+
+
+def school_has_jobs(key):
+    """Whether school key's shard has a runnable job, checked over a throwaway connection.
+
+    Used for schools this process doesn't have open: going through the shard
+    router would open them and evict the busy schools' engines and caches.
+    """
+    if not os.path.exists(os.path.join(SHARDS_DIR, f"{key}.db")):
+        return False
+    engine = create_engine(shard_url(key), poolclass=NullPool)
+    try:
+        with engine.connect() as conn:
+            return conn.execute(db.select(Job.id).where(_runnable_jobs(_utcnow())).limit(1)).first() is not None
+    except OperationalError:
+        app.logger.warning("Could not check school %s for jobs", key, exc_info=True)
+        return False
+    finally:
+        engine.dispose()
+
+
+def _job_thread():
+    last_sweep = 0
+    while True:
+        # Each school's jobs live in its shard; poll the open ones, and now and then the
+        # others, which are only opened when they have work
+        schools = shards.open_keys()
+        if time.monotonic() - last_sweep > JOB_SWEEP_SECONDS:
+            with app.app_context():
+                try:
+                    registered = [key for (key,) in db.session.query(School.key).order_by(School.key)]
+                    schools += [key for key in registered if key not in schools and school_has_jobs(key)]
+                    last_sweep = time.monotonic()
+                except Exception:
+                    app.logger.exception("Job thread could not list schools")
+                    db.session.rollback()
+        ran = False
+        for school in [None] + schools:
+            with school_context(school):
+                # A locked or unmigrated database fails this poll, not the thread
+                try:
+                    job_id = claim_job()
+                    if job_id is not None:
+                        run_job(job_id)
+                        ran = True
+                except Exception:
+                    app.logger.exception("Job poll failed for school %s", school)
+                    db.session.rollback()
+        if not ran:
+            _job_wakeup.wait(JOB_POLL_SECONDS)
+            _job_wakeup.clear()
+
+
+def start_job_threads(count=None):
+    """Start this process's job threads once (after any fork, so gunicorn workers each get their own).
+
+    Later calls replace any thread that has died.
+    """
+    count = JOB_THREADS if count is None else count
+    with _job_threads_lock:
+        if not _job_threads:
+            _job_threads.extend([None] * count)
+        for i, thread in enumerate(_job_threads):
+            if thread is None or not thread.is_alive():
+                _job_threads[i] = threading.Thread(target=_job_thread, name=f"job-{i}", daemon=True)
+                _job_threads[i].start()
+
+
+@app.before_request
+def ensure_job_threads():
+    # Jobs queued before a restart, or by a process that went away, still run
+    if JOB_THREADS and not (_job_threads and all(thread.is_alive() for thread in _job_threads)):
+        start_job_threads()
+
+
+@app.cli.command("run-jobs")
+@click.option("--threads", default=2, show_default=True, help="Jobs to run at once.")
+def run_jobs_command(threads):
+    """Run queued jobs in this process until interrupted (use with JOB_THREADS=0 on the web workers)."""
+    start_job_threads(threads)
+    print(f"Running jobs with {threads} threads; Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+@job_handler("delete_student")
+def delete_student_job(job, student_id, name=None):
+    """Remove a student and every row that references them, one chunk per transaction."""
+    models = (AttendanceRecord, HomeworkProgress, HomeworkDoubt)
+    total = sum(model.query.filter_by(student_id=student_id).count() for model in models) or 1
+    deleted = 0
+    for model in models:
+        while True:
+            ids = [id for (id,) in db.session.query(model.id).filter_by(student_id=student_id).limit(JOB_DELETE_CHUNK)]
+            if not ids:
+                break
+            model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+            deleted += len(ids)
+            job_progress(job, deleted * 100 / total, f"Deleted {deleted} rows")
+    # Last transaction sweeps up anything marked while the job ran, then drops the student
+    for model in models + (AttendanceSummary, RecordVersion, StudentRisk):
+        model.query.filter_by(student_id=student_id).delete(synchronize_session=False)
+    User.query.filter_by(school=g.get("shard"), student_id=student_id).delete(synchronize_session=False)
+    Student.query.filter_by(id=student_id).delete(synchronize_session=False)
+    bump_cache_version("roster")
+    db.session.commit()
+    job.message = f"Deleted {name or student_id} and {deleted} related rows"
+    return {"rows_deleted": deleted}
+
+
+@job_handler("import_csv")
+def import_csv_job(job, path, filename=None):
+    """Run import_csv() on a spooled upload, reporting progress by bytes read."""
+    size = os.path.getsize(path) or 1
+    try:
+        with open(path, "rb") as raw:
+            def progress(result):
+                job_progress(job, raw.tell() * 100 / size, f"{result['rows']} rows read")
+            result = import_csv(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""), progress)
+    finally:
+        os.remove(path)
+    job.message = format_import_result(result)[:255]
+    return result
+
+
+@job_handler("rebuild_summary")
+def rebuild_summary_job(job):
+    job_progress(job, 10, "Recomputing attendance summary")
+    rebuild_attendance_summary()
+    job.message = f"Rebuilt {AttendanceSummary.query.count()} summary rows"
+    return {}
+
+
+@job_handler("export_report")
+def export_report_job(job, subject=None, student=None):
+    """Write the report export to a file under instance/exports (per school) for download from /admin/jobs."""
+    total = report_export_query(subject, student).order_by(None).count() or 1
+    path = os.path.join(school_dir("exports"), f"job-{job.id}.csv")
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_EXPORT_HEADER)
+        for row in report_export_query(subject, student).yield_per(EXPORT_FETCH_SIZE):
+            writer.writerow(row)
+            written += 1
+            if written % 50_000 == 0:
+                # The session is mid-cursor, so report progress on a separate connection;
+                # without WAL the open read can block it, and progress is only advisory
+                try:
+                    with db.session.get_bind().begin() as conn:
+                        conn.execute(db.update(Job).where(Job.id == job.id).values(
+                            progress=min(written * 100 // total, 99), heartbeat_at=_utcnow()))
+                except OperationalError:
+                    pass
+    job.message = f"Exported {written} rows"
+    return {"path": path, "rows": written, "filename": export_filename("report", subject, student)}
+
+
+def job_json(job):
+    return {
+        "id": job.id, "kind": job.kind, "params": job.params, "status": job.status, "progress": job.progress,
+        "message": job.message, "created_by": job.created_by,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@app.route("/admin/jobs", methods=["GET", "POST"])
+@role_required('Admin')
+def admin_jobs():
+    if request.method == "POST":
+        kind = request.form.get("kind")
+        if kind == "rebuild_summary":
+            enqueue_job("rebuild_summary")
+        elif kind == "export_report":
+            enqueue_job("export_report", subject=request.form.get("subject") or None)
+        else:
+            return f"Unknown job kind {kind}", 400
+        db.session.commit()
+        return redirect(url_for("admin_jobs"))
+    jobs = Job.query.order_by(Job.id.desc()).limit(50).all()
+    return render_template("admin_jobs.html", jobs=jobs, courses=get_courses().names)
+
+
+@app.route("/api/jobs")
+@role_required('Admin')
+def api_jobs():
+    """Status and progress of the given ?id= jobs (repeatable), or the 50 most recent."""
+    ids = request.args.getlist("id", type=int)
+    query = Job.query.filter(Job.id.in_(ids)) if ids else Job.query.order_by(Job.id.desc()).limit(50)
+    return jsonify({"jobs": [job_json(job) for job in query]})
+
+
+@app.route("/admin/jobs/<int:job_id>/download")
+@role_required('Admin')
+def download_job_result(job_id):
+    job = db.get_or_404(Job, job_id)
+    if job.status != "done" or not (job.result or {}).get("path") or not os.path.exists(job.result["path"]):
+        return "No file for this job", 404
+    return send_file(job.result["path"], as_attachment=True, download_name=job.result.get("filename"))
+
+
+# --- EARLY WARNING ---
+
+EARLY_WARNING_WINDOW = timedelta(days=30)  # rolling attendance window
+EARLY_WARNING_RATE = 75  # flag below this attendance % over the window...
+EARLY_WARNING_MIN_SESSIONS = 3  # ...once the window has this many marks
+EARLY_WARNING_STREAK = 3  # or this many absences in a row
+EARLY_WARNING_MISSING = 2  # or this many homework not submitted
+EARLY_WARNING_MAX_AGE = timedelta(minutes=5)  # viewing older results queues a refresh
+# RecordVersion.updated_at is stamped when a save writes, not when it commits, so an
+# incremental run also rereads counters stamped this long before the previous run began
+EARLY_WARNING_OVERLAP = timedelta(minutes=2)
+
+
+def last_early_warning_run():
+    return Job.query.filter_by(kind="early_warning", status="done").order_by(Job.id.desc()).first()
+
+
+def homework_counts(course_ids, student_ids=None):
+    """(homework set per course, {(student_id, course_id): (submitted, ungraded)}) for homework due by today."""
+    due = db.and_(Homework.course_id.in_(course_ids), Homework.date <= date_type.today())
+    assigned = dict(db.session.query(Homework.course_id, db.func.count()).filter(due).group_by(Homework.course_id))
+    submitted = db.func.coalesce(HomeworkProgress.progress, "") != ""
+    query = db.session.query(
+        HomeworkProgress.student_id, Homework.course_id,
+        db.func.sum(db.case((submitted, 1), else_=0)),
+        db.func.sum(db.case((db.and_(submitted, db.func.coalesce(HomeworkProgress.marks, "") == ""), 1), else_=0)),
+    ).join(Homework, HomeworkProgress.homework_id == Homework.id).filter(due)
+    if student_ids is not None:
+        query = query.filter(HomeworkProgress.student_id.in_(student_ids))
+    query = query.group_by(HomeworkProgress.student_id, Homework.course_id)
+    return assigned, {(student_id, course_id): (done, ungraded) for student_id, course_id, done, ungraded in query}
+
+
+def refresh_student_risk(pairs=None):
+    """Recompute StudentRisk for {course_id: set of student_ids or None (everyone)}; pairs=None is every course.
+
+    Attendance figures come from the attendance matrix, homework counts from
+    two grouped queries over the affected courses. Returns the number of
+    rows written.
+    """
+    matrix = get_matrix_cache().get()
+    roster_ids = [s.id for s in get_roster().students]
+    if pairs is None:
+        pairs = {course_id: None for course_id in get_courses().names_by_id}
+    window_start = date_type.today() - EARLY_WARNING_WINDOW
+    now = _utcnow()
+    written = 0
+    for course_id, student_ids in pairs.items():
+        students = roster_ids if student_ids is None else [id for id in roster_ids if id in student_ids]
+        if not students:
+            continue
+        rolling = matrix.student_totals(course_id, window_start, None)
+        streaks = matrix.absence_streaks(course_id, min_streak=1)
+        assigned, done = homework_counts([course_id], None if student_ids is None else students)
+        rows = []
+        for student_id in students:
+            present, sessions = rolling.get(student_id, (0, 0))
+            submitted, ungraded = done.get((student_id, course_id), (0, 0))
+            missing = assigned.get(course_id, 0) - submitted
+            streak = streaks.get(student_id, 0)
+            rows.append({
+                "student_id": student_id, "course_id": course_id,
+                "rolling_present": present, "rolling_sessions": sessions,
+                "absence_streak": streak, "homework_missing": missing, "homework_ungraded": ungraded,
+                "flagged": (sessions >= EARLY_WARNING_MIN_SESSIONS and present * 100 < EARLY_WARNING_RATE * sessions)
+                           or streak >= EARLY_WARNING_STREAK or missing >= EARLY_WARNING_MISSING,
+                "updated_at": now,
+            })
+        upsert_rows(StudentRisk, rows, ["student_id", "course_id"],
+                    ["rolling_present", "rolling_sessions", "absence_streak", "homework_missing",
+                     "homework_ungraded", "flagged", "updated_at"])
+        db.session.commit()
+        written += len(rows)
+    return written
+
+
+@job_handler("early_warning")
+def early_warning_job(job, full=False):
+    """Refresh StudentRisk for the (student, course) pairs whose RecordVersion moved since the last run.
+
+    The first run of each day is full, since the rolling window moves with
+    the date. Later runs look back EARLY_WARNING_OVERLAP further, to catch
+    saves still uncommitted when the previous run read the records.
+    """
+    previous = last_early_warning_run()
+    if full or previous is None or previous.started_at.date() < _utcnow().date():
+        written = refresh_student_risk()
+        job.message = f"Full refresh: {written} student/subject rows"
+        return {"full": True, "rows": written}
+    pairs = {}
+    changed = db.session.query(RecordVersion.student_id, RecordVersion.course_id) \
+        .filter(RecordVersion.updated_at >= (previous.started_at - EARLY_WARNING_OVERLAP).replace(microsecond=0))
+    for student_id, course_id in changed:
+        if student_id == COURSE_WIDE:
+            pairs[course_id] = None
+        elif pairs.get(course_id, set()) is not None:
+            pairs.setdefault(course_id, set()).add(student_id)
+    written = refresh_student_risk(pairs)
+    job.message = f"Refreshed {written} student/subject rows changed since job #{previous.id}"
+    return {"full": False, "rows": written}
+
+
+@app.cli.command("early-warning")
+@click.option("--full", is_flag=True, help="Recompute every student and subject.")
+@school_option
+def early_warning_command(full):
+    """Queue an early-warning refresh and run it in this process (e.g. from cron)."""
+    job_id = enqueue_job("early_warning", full=full).id
+    db.session.commit()
+    # Work through the queue up to this job (a job thread may get to it first)
+    while db.session.get(Job, job_id, populate_existing=True).status not in ("done", "failed"):
+        claimed = claim_job()
+        if claimed is None:
+            time.sleep(0.5)
+        else:
+            run_job(claimed)
+    job = db.session.get(Job, job_id)
+    print(f"Job #{job.id} {job.status}: {job.message}")
+
+
+@app.route("/early-warning", methods=["GET", "POST"])
+@role_required('Teacher', 'Admin')
+def early_warning():
+    """Flagged students from the last batch run; viewing stale results queues the next run."""
+    pending = Job.query.filter(Job.kind == "early_warning", Job.status.in_(("queued", "running"))).first()
+    if request.method == "POST":
+        if not pending:
+            enqueue_job("early_warning", full=request.form.get("full") == "1")
+            db.session.commit()
+        return redirect(url_for("early_warning", course=request.form.get("course") or None))
+    last_run = last_early_warning_run()
+    if not pending and (last_run is None or last_run.finished_at < _utcnow() - EARLY_WARNING_MAX_AGE):
+        pending = enqueue_job("early_warning")
+        db.session.commit()
+
+    selected_course = request.args.get("course") or None
+    query = db.session.query(StudentRisk).filter(StudentRisk.flagged.is_(True))
+    if selected_course:
+        query = query.filter(StudentRisk.course_id == get_courses().ids_by_name.get(selected_course))
+    names = get_roster().names_by_id
+    course_names = get_courses().names_by_id
+    rows = []
+    for risk in query:
+        rate = round(risk.rolling_present / risk.rolling_sessions * 100, 2) if risk.rolling_sessions else None
+        rows.append({
+            "student": names.get(risk.student_id), "course": course_names.get(risk.course_id),
+            "rate": rate, "sessions": risk.rolling_sessions, "streak": risk.absence_streak,
+            "missing": risk.homework_missing, "ungraded": risk.homework_ungraded,
+            "low_rate": rate is not None and risk.rolling_sessions >= EARLY_WARNING_MIN_SESSIONS and rate < EARLY_WARNING_RATE,
+        })
+    rows.sort(key=lambda row: (-row["streak"], row["rate"] if row["rate"] is not None else 100, -row["missing"]))
+    return render_template("early_warning.html",
+                           rows=rows,
+                           courses=get_courses().names,
+                           selected_course=selected_course,
+                           last_run=last_run,
+                           pending=pending is not None,
+                           window_days=EARLY_WARNING_WINDOW.days,
+                           rate_threshold=EARLY_WARNING_RATE,
+                           streak_threshold=EARLY_WARNING_STREAK,
+                           missing_threshold=EARLY_WARNING_MISSING)
+
+
+# --- SEARCH ---
+
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# bm25 costs a few microseconds per match, so a word in every other doubt
+# would take tens of ms to rank. Unfiltered searches rank only the newest
+# this many matches (filters already narrow the rest).
+SEARCH_RANK_WINDOW = int(os.environ.get("SEARCH_RANK_WINDOW", 500))
+
+
+def fts_query(text):
+    """An FTS5 MATCH string requiring every word of text (the last as a prefix), or None.
+
+    Words are quoted, so user input can't inject FTS5 syntax.
+    """
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+
+
+def highlighted(text):
+    """HTML-escape text from highlight()/snippet(), turning its \\x02/\\x03 markers into <mark> tags."""
+    return escape(text or "").replace("\x02", Markup("<mark>")).replace("\x03", Markup("</mark>"))
+
+
+def _search_filters(course_id, start, end, student_id=None):
+    clauses, params = [], {}
+    if course_id is not None:
+        clauses.append("h.course_id = :course_id")
+        params["course_id"] = course_id
+    if start:
+        clauses.append("h.date >= :start")
+        params["start"] = start.isoformat()
+    if end:
+        clauses.append("h.date <= :end")
+        params["end"] = end.isoformat()
+    if student_id is not None:
+        clauses.append("d.student_id = :student_id")
+        params["student_id"] = student_id
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+
+def search_records(text, course_id=None, start=None, end=None, student_id=None, limit=SEARCH_LIMIT):
+    """Best matches for text among homework descriptions and doubts (question or answer).
+
+    Ranked by FTS5's bm25 (a doubt's question weighs twice its answer) and
+    filtered by homework subject and date range; student_id limits doubts to
+    one student's. Without filters, doubts are ranked among the newest
+    SEARCH_RANK_WINDOW matches. Returns {"homework": [...], "doubts": [...]}, with <mark>ed
+    Markup in "description", "question" and "answer".
+    """
+    query = fts_query(text)
+    if query is None:
+        return {"homework": [], "doubts": []}
+    if not search_fts():
+        return _search_records_like(re.findall(r"\w+", text), course_id, start, end, student_id, limit)
+    courses = get_courses().names_by_id
+    where, params = _search_filters(course_id, start, end)
+    homework = db.session.execute(db.text(
+        "SELECT h.id, h.date, h.course_id, highlight(homework_fts, 0, char(2), char(3)) "
+        "FROM homework_fts JOIN homework h ON h.id = homework_fts.rowid "
+        f"WHERE homework_fts MATCH :query{where} ORDER BY bm25(homework_fts) LIMIT :limit"
+    ), {"query": query, "limit": limit, **params})
+    where, params = _search_filters(course_id, start, end, student_id)
+    if not where:
+        where = (" AND homework_doubt_fts.rowid >= coalesce((SELECT rowid FROM homework_doubt_fts "
+                 "WHERE homework_doubt_fts MATCH :query ORDER BY rowid DESC LIMIT 1 OFFSET :window), 0)")
+        params = {"window": SEARCH_RANK_WINDOW - 1}
+    doubts = db.session.execute(db.text(
+        "SELECT d.id, d.homework_id, d.student_id, h.date, h.course_id, "
+        "snippet(homework_doubt_fts, 0, char(2), char(3), '…', 24), "
+        "snippet(homework_doubt_fts, 1, char(2), char(3), '…', 24), d.answer IS NOT NULL "
+        "FROM homework_doubt_fts JOIN homework_doubt d ON d.id = homework_doubt_fts.rowid "
+        "JOIN homework h ON h.id = d.homework_id "
+        f"WHERE homework_doubt_fts MATCH :query{where} ORDER BY bm25(homework_doubt_fts, 2.0, 1.0) LIMIT :limit"
+    ), {"query": query, "limit": limit, **params})
+    names = get_roster().names_by_id
+    return {
+        "homework": [{"id": id, "date": parse_date(day), "course": courses.get(cid), "description": highlighted(text)}
+                     for id, day, cid, text in homework],
+        "doubts": [{"id": id, "homework_id": homework_id, "student": names.get(sid), "date": parse_date(day),
+                    "course": courses.get(cid), "question": highlighted(question),
+                    "answer": highlighted(answer) if answered else None}
+                   for id, homework_id, sid, day, cid, question, answer, answered in doubts],
+    }
+
+
+def _search_records_like(words, course_id, start, end, student_id, limit):
+    """search_records() without FTS5 (e.g. PostgreSQL): every word as a substring, newest first."""
+    courses = get_courses().names_by_id
+    homework = Homework.query.filter(*(Homework.description.ilike(f"%{word}%") for word in words))
+    doubts = db.session.query(HomeworkDoubt, Homework).join(HomeworkDoubt.homework).filter(*(
+        db.or_(HomeworkDoubt.question.ilike(f"%{word}%"), HomeworkDoubt.answer.ilike(f"%{word}%")) for word in words
+    ))
+    if course_id is not None:
+        homework = homework.filter(Homework.course_id == course_id)
+        doubts = doubts.filter(Homework.course_id == course_id)
+    if start:
+        homework = homework.filter(Homework.date >= start)
+        doubts = doubts.filter(Homework.date >= start)
+    if end:
+        homework = homework.filter(Homework.date <= end)
+        doubts = doubts.filter(Homework.date <= end)
+    if student_id is not None:
+        doubts = doubts.filter(HomeworkDoubt.student_id == student_id)
+    names = get_roster().names_by_id
+    return {
+        "homework": [{"id": hw.id, "date": hw.date, "course": courses.get(hw.course_id), "description": escape(hw.description or "")}
+                     for hw in homework.order_by(Homework.date.desc()).limit(limit)],
+        "doubts": [{"id": d.id, "homework_id": hw.id, "student": names.get(d.student_id), "date": hw.date,
+                    "course": courses.get(hw.course_id), "question": escape(d.question),
+                    "answer": escape(d.answer) if d.answer is not None else None}
+                   for d, hw in doubts.order_by(Homework.date.desc(), HomeworkDoubt.id.desc()).limit(limit)],
+    }
+
+
+def search_args():
+    """(text, course_id, start, end, limit) from ?q=, ?course=, ?from=, ?to= and ?limit=; course_id -1 if unknown."""
+    course = request.args.get("course") or None
+    course_id = get_courses().ids_by_name.get(course, -1) if course else None
+    limit = min(max(request.args.get("limit", SEARCH_LIMIT, type=int), 1), MAX_SEARCH_LIMIT)
+    return (request.args.get("q", ""), course_id, parse_date(request.args.get("from")),
+            parse_date(request.args.get("to")), limit)
+
+
+@app.route("/search")
+@login_required
+def search():
+    """Search homework and doubts; students see only their own doubts."""
+    text, course_id, start, end, limit = search_args()
+    student_id = None
+    if session.get('role') == 'Student':
+        # None would mean no doubt filter, i.e. every student's doubts
+        student_id = session_student_id()
+        if not student_id:
+            flash('Student profile not found.', 'error')
+            return redirect(url_for('front'))
+    results = search_records(text, course_id, start, end, student_id, limit) if text.strip() else None
+    return render_template("search.html",
+                           results=results,
+                           q=text,
+                           user_role=session.get('role'),
+                           courses=get_courses().names,
+                           selected_course=request.args.get("course") or None,
+                           date_from=request.args.get("from", ""),
+                           date_to=request.args.get("to", ""))
+
+
+@app.route("/api/v1/search")
+@login_required
+def api_search():
+    """JSON mirror of /search; highlighted fields are HTML with <mark> around matches."""
+    text, course_id, start, end, limit = search_args()
+    if course_id == -1:
+        return jsonify({"error": f"unknown course {request.args.get('course')}"}), 404
+    student_id = None
+    if session.get('role') == 'Student':
+        student_id = session_student_id()
+        if not student_id:
+            return jsonify({"error": "student profile not found"}), 404
+    results = search_records(text, course_id, start, end, student_id, limit)
+    for rows in results.values():
+        for row in rows:
+            row["date"] = row["date"].isoformat() if row["date"] else None
+            for field in ("description", "question", "answer"):
+                if row.get(field) is not None:
+                    row[field] = str(row[field])
+    return jsonify({"q": text, **results})
+
+
+# --- PROFILING ---
+
+# PROFILING=1 times every request; cheap enough to leave on (two clock reads
+# per query and per template, one deque append per request)
+app.config['PROFILING'] = os.environ.get('PROFILING', '0') == '1'
+PERF_SAMPLES = 200  # recent requests kept per endpoint, per worker
+N_PLUS_ONE_THRESHOLD = 5  # one statement run this often in a request is flagged
+
+PerfSample = namedtuple("PerfSample", "wall sql_count sql_time render_time repeats repeated_sql")
+perf_samples = {}
+_perf_lock = threading.Lock()
+
+
+@app.before_request
+def start_request_timer():
+    if app.config['PROFILING']:
+        g.perf = {"start": time.perf_counter(), "sql_count": 0, "sql_time": 0.0, "render_time": 0.0, "statements": {}}
+
+
+@db.event.listens_for(db.Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "perf" in g:
+        conn.info.setdefault("perf_query_start", []).append(time.perf_counter())
+
+
+@db.event.listens_for(db.Engine, "after_cursor_execute")
+def record_query_time(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "perf" in g and conn.info.get("perf_query_start"):
+        perf = g.perf
+        perf["sql_time"] += time.perf_counter() - conn.info["perf_query_start"].pop()
+        perf["sql_count"] += 1
+        perf["statements"][statement] = perf["statements"].get(statement, 0) + 1
+
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+    if "perf" in g:
+        g.perf["render_start"] = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def record_render_time(sender, template, context, **extra):
+    if "perf" in g and "render_start" in g.perf:
+        g.perf["render_time"] += time.perf_counter() - g.perf.pop("render_start")
+
+
+@app.after_request
+def record_request_timing(response):
+    """Send the request's timings as Server-Timing and add them to the endpoint's samples."""
+    perf = g.pop("perf", None)
+    if perf is None:
+        return response
+    wall = time.perf_counter() - perf["start"]
+    repeated_sql, repeats = max(perf["statements"].items(), key=lambda item: item[1], default=(None, 0))
+    response.headers.add(
+        "Server-Timing",
+        f'app;dur={wall * 1000:.1f}, db;dur={perf["sql_time"] * 1000:.1f};desc="{perf["sql_count"]} queries", '
+        f'tpl;dur={perf["render_time"] * 1000:.1f}',
     )
+    sample = PerfSample(wall, perf["sql_count"], perf["sql_time"], perf["render_time"], repeats, repeated_sql)
+    with _perf_lock:
+        samples = perf_samples.get(request.endpoint)
+        if samples is None:
+            samples = perf_samples[request.endpoint] = deque(maxlen=PERF_SAMPLES)
+        samples.append(sample)
+    return response
+
+
+def perf_summary():
+    """Per-endpoint latency percentiles and query stats over the recent samples, slowest p95 first."""
+    with _perf_lock:
+        snapshot = {endpoint: list(samples) for endpoint, samples in perf_samples.items()}
+    rows = []
+    for endpoint, samples in snapshot.items():
+        walls = sorted(sample.wall for sample in samples)
+        worst = max(samples, key=lambda sample: sample.repeats)
+        count = len(samples)
+        rows.append({
+            "endpoint": endpoint or "(no endpoint)",
+            "requests": count,
+            "p50": round(walls[count // 2] * 1000, 1),
+            "p95": round(walls[min(count - 1, int(count * 0.95))] * 1000, 1),
+            "max": round(walls[-1] * 1000, 1),
+            "queries": round(sum(sample.sql_count for sample in samples) / count, 1),
+            "sql_ms": round(sum(sample.sql_time for sample in samples) / count * 1000, 1),
+            "render_ms": round(sum(sample.render_time for sample in samples) / count * 1000, 1),
+            "max_repeats": worst.repeats,
+            "repeated_sql": worst.repeated_sql,
+        })
+    rows.sort(key=lambda row: row["p95"], reverse=True)
+    return rows
 
 
+@app.route("/admin/perf")
+@role_required('Admin')
+def admin_perf():
+    endpoints = perf_summary()
+    offenders = sorted((row for row in endpoints if row["max_repeats"] >= N_PLUS_ONE_THRESHOLD),
+                       key=lambda row: row["max_repeats"], reverse=True)
+    return render_template("admin_perf.html",
+                           enabled=app.config['PROFILING'],
+                           endpoints=endpoints,
+                           offenders=offenders,
+                           samples=PERF_SAMPLES,
+                           threshold=N_PLUS_ONE_THRESHOLD)
+
 
 # --- LOGIN & LOGOUT ROUTES ---
 
-# Dummy user data for demonstration (replace with real DB queries)
-# Format: email -> {'password': 'xxx', 'student_name': 'xxx'}
-USERS = {
-    'Student': {
-        'aravind@example.com': {'password': 'student123', 'student_name': 'Aravind'},
-        'aswin@example.com': {'password': 'student123', 'student_name': 'Aswin'},
-        'bhavana@example.com': {'password': 'student123', 'student_name': 'Bhavana'},
-        'gokul@example.com': {'password': 'student123', 'student_name': 'Gokul'},
-        'hariharan@example.com': {'password': 'student123', 'student_name': 'Hariharan'},
-        'meenatchi@example.com': {'password': 'student123', 'student_name': 'Meenatchi'},
-        'sivabharathi@example.com': {'password': 'student123', 'student_name': 'Siva Bharathi'},
-        'visal@example.com': {'password': 'student123', 'student_name': 'Visal Stephenraj'},
-    },
-    'Teacher': {'teacher@example.com': {'password': 'teacher123'}},
-    'Admin': {'admin@example.com': {'password': 'admin123'}},
-}
+def session_student_id():
+    """The logged-in student's id, cached in the session at login so pages skip the name lookup."""
+    student_id = session.get('student_id')
+    if student_id is None and session.get('student_name'):
+        # Sessions from before the id was cached
+        student_id = get_roster().ids_by_name.get(session['student_name'])
+        if student_id is not None:
+            session['student_id'] = student_id
+    return student_id
+
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
     error = None
     if request.method == "POST":
         role = request.form.get("role")
-        email = request.form.get("email")
-        password = request.form.get("password")
-        user_group = USERS.get(role, {})
-        user = user_group.get(email)
-        if user and user["password"] == password:
+        email = (request.form.get("email") or "").strip().lower()
+        password = request.form.get("password") or ""
+        user = User.query.filter_by(email=email).first()
+        if check_password(user.password_hash if user else None, password) and user.role == role:
+            if needs_rehash(user.password_hash):
+                user.password_hash = hash_password(password)
+                db.session.commit()
+            session.clear()
             session["user"] = email
             session["role"] = role
-            # Store student name for easy access
-            if role == 'Student' and 'student_name' in user:
-                session["student_name"] = user['student_name']
+            session["school"] = g.shard = user.school
+            # Store the student's id and name for easy access
+            if role == 'Student' and user.student_id is not None:
+                session["student_id"] = user.student_id
+                session["student_name"] = get_roster().names_by_id.get(user.student_id)
             # Redirect to main page after login
             return redirect(url_for("front"))
         else:
             error = "Invalid credentials. Please try again."
     return render_template("login.html", error=error)
 
+
+@app.cli.command("create-user")
+@click.argument("email")
+@click.option("--role", type=click.Choice(["Student", "Teacher", "Admin"]), required=True)
+@click.option("--student", help="Student name, for Student accounts.")
+@click.option("--school", help="School key (see `flask shards list`); default is the main database.")
+@click.password_option()
+def create_user_command(email, role, student, school, password):
+    """Add a login, or reset its password and role if the email exists."""
+    if school is not None and db.session.get(School, school) is None:
+        raise click.BadParameter(f"no school {school!r}", param_hint="--school")
+    g.shard = school
+    student_id = None
+    if role == "Student":
+        student_id = get_roster().ids_by_name.get(student)
+        if student_id is None:
+            raise click.BadParameter(f"no student named {student!r}", param_hint="--student")
+    email = email.strip().lower()
+    user = User.query.filter_by(email=email).first() or User(email=email)
+    user.password_hash = hash_password(password)
+    user.role = role
+    user.student_id = student_id
+    user.school = school
+    db.session.add(user)
+    db.session.commit()
+    print(f"Saved {role} login {email}.")
+
 @app.route("/logout")
 def logout():
     session.clear()
@@ -540,13 +3429,45 @@ def logout():
     return redirect(url_for('login'))
 
 # --- STUDENT HOMEWORK ROUTES ---
+def student_homework_data(student_id, course_id=None):
+    """A student's homework, newest first, each with their marks, progress and doubts."""
+    # Query homework, outer-joined to this student's progress row
+    query = db.session.query(Homework, HomeworkProgress).outerjoin(
+        HomeworkProgress,
+        db.and_(HomeworkProgress.homework_id == Homework.id, HomeworkProgress.student_id == student_id),
+    )
+    if course_id is not None:
+        query = query.filter(Homework.course_id == course_id)
+    rows = query.order_by(Homework.date.desc(), Homework.id, HomeworkProgress.id).all()
+    
+    # All of the student's doubts in one query, grouped by homework
+    doubts_by_homework = {}
+    for doubt in HomeworkDoubt.query.filter_by(student_id=student_id).order_by(HomeworkDoubt.id):
+        doubts_by_homework.setdefault(doubt.homework_id, []).append(doubt)
+    
+    # Build homework records with student's progress and doubts
+    homework_data = []
+    seen = set()
+    for hw, progress in rows:
+        if hw.id in seen:
+            continue
+        seen.add(hw.id)
+        homework_data.append({
+            'homework': hw,
+            'marks': progress.marks if progress else 'Not graded',
+            'progress': progress.progress if progress else 'Not submitted',
+            'doubts': doubts_by_homework.get(hw.id, [])
+        })
+    return homework_data
+
+
 @app.route("/student-homework", methods=["GET", "POST"])
 @role_required('Student')
 def student_homework():
     student_name = session.get('student_name')
-    student = Student.query.filter_by(name=student_name).first()
+    student_id = session_student_id()
     
-    if not student:
+    if not student_id:
         flash('Student profile not found.', 'error')
         return redirect(url_for('front'))
     
@@ -555,44 +3476,27 @@ def student_homework():
         homework_id = request.form.get("homework_id")
         question = request.form.get("question", "").strip()
         
-        if homework_id and question:
+        homework = db.session.get(Homework, homework_id) if homework_id else None
+        if homework and question:
             new_doubt = HomeworkDoubt(
-                homework_id=homework_id,
-                student_id=student.id,
+                homework_id=homework.id,
+                student_id=student_id,
                 question=question,
                 created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             )
             db.session.add(new_doubt)
+            bump_record_versions([(student_id, homework.course_id)])
             db.session.commit()
             flash('Your question has been submitted successfully!', 'success')
         return redirect(url_for('student_homework'))
     
     # Get filter parameters
     filter_course = request.args.get("filter_course")
-    
-    # Query homework
-    query = Homework.query
-    if filter_course:
-        query = query.filter_by(course=filter_course)
-    
-    all_homeworks = query.order_by(Homework.date.desc()).all()
-    
-    # Build homework records with student's progress and doubts
-    homework_data = []
-    for hw in all_homeworks:
-        progress = HomeworkProgress.query.filter_by(homework_id=hw.id, student_id=student.id).first()
-        doubts = HomeworkDoubt.query.filter_by(homework_id=hw.id, student_id=student.id).all()
-        
-        homework_data.append({
-            'homework': hw,
-            'marks': progress.marks if progress else 'Not graded',
-            'progress': progress.progress if progress else 'Not submitted',
-            'doubts': doubts
-        })
+    homework_data = student_homework_data(student_id, get_courses().ids_by_name.get(filter_course) if filter_course else None)
     
     return render_template("student_homework.html",
                            homework_data=homework_data,
-                           courses=courses,
+                           courses=get_courses().names,
                            filter_course=filter_course,
                            student_name=student_name)
 
@@ -0,0 +1,113 @@
+"""Measure attendance write throughput with several worker processes on one SQLite file.
+
+Each worker process imports the app the way a gunicorn worker would and
+loops over save_attendance() for random (date, course) sessions, with a
+read of the daily view between writes. The run is repeated on a fresh
+scratch database with SQLite's defaults (SQLITE_TUNING=0) and with the
+connection pragmas applied, and writes/s, reads/s, p95 write latency and
+"database is locked" failures are printed for both.
+
+    python benchmarks/bench_concurrent_writes.py --workers 4 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+START = date(2025, 6, 2)
+
+
+def _import_app(database_url, tuning):
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["SQLITE_TUNING"] = tuning
+    sys.path.insert(0, APP_DIR)
+    import attendance_app
+    return attendance_app
+
+
+def setup(database_url, tuning, n_students):
+    app_module = _import_app(database_url, tuning)
+    with app_module.app.app_context():
+        db = app_module.db
+        existing = db.session.query(app_module.Student).count()
+        db.session.add_all(app_module.Student(name=f"Student {i:05d}") for i in range(existing, n_students))
+        db.session.commit()
+
+
+def worker(database_url, tuning, seconds, seed, results):
+    app_module = _import_app(database_url, tuning)
+    from sqlalchemy.exc import OperationalError
+    rng = random.Random(seed)
+    writes, reads, locked, latencies = 0, 0, 0, []
+    with app_module.app.app_context():
+        db = app_module.db
+        student_ids = [row.id for row in db.session.query(app_module.Student.id)]
+        course_ids = [row.id for row in db.session.query(app_module.Course.id)]
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            day = START + timedelta(days=rng.randrange(120))
+            course_id = rng.choice(course_ids)
+            marks = {sid: ("P" if rng.random() < 0.9 else "A", "not_informed") for sid in student_ids}
+            started = time.perf_counter()
+            try:
+                app_module.save_attendance(day, course_id, marks)
+                db.session.commit()
+                writes += 1
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                db.session.rollback()
+                locked += 1
+            try:
+                db.session.query(app_module.AttendanceRecord.status).filter_by(date=day).all()
+                reads += 1
+            except OperationalError:
+                db.session.rollback()
+                locked += 1
+    results.put((writes, reads, locked, latencies))
+
+
+def run(label, tuning, args):
+    path = os.path.join(tempfile.mkdtemp(), "concurrent.db")
+    database_url = f"sqlite:///{path}"
+    ctx = multiprocessing.get_context("spawn")
+    prepare = ctx.Process(target=setup, args=(database_url, tuning, args.students))
+    prepare.start()
+    prepare.join()
+
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(database_url, tuning, args.seconds, seed, results))
+             for seed in range(args.workers)]
+    for proc in procs:
+        proc.start()
+    collected = [results.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    writes = sum(r[0] for r in collected)
+    reads = sum(r[1] for r in collected)
+    locked = sum(r[2] for r in collected)
+    latencies = sorted(l for r in collected for l in r[3])
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float("nan")
+    print(f"{label:<16} {writes / args.seconds:9.1f} writes/s {reads / args.seconds:9.1f} reads/s "
+          f"p95 write {p95:8.1f} ms  locked={locked}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--students", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, {args.students} students per session, {args.seconds:g}s per run")
+    run("sqlite defaults", "0", args)
+    run("tuned pragmas", "1", args)
+
+
+if __name__ == "__main__":
+    main()
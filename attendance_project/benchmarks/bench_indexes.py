@@ -0,0 +1,131 @@
+"""Show how the attendance indexes change the hot-path query plans.
+
+Seeds a scratch SQLite file with a school year of attendance (2,000 students
+by default), then runs the queries behind mark_attendance, view_attendance,
+view_attendance_records, student_report and student_detail twice: once with
+the model indexes dropped and once with them built. For each query it prints
+the EXPLAIN QUERY PLAN and the average run time.
+
+    python benchmarks/bench_indexes.py --students 2000 --days 365
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from attendance_app import db, initial_courses  # noqa: E402
+
+
+def seed(engine, n_students, n_days):
+    start = date.today() - timedelta(days=n_days)
+    school_days = [start + timedelta(days=i) for i in range(n_days)
+                   if (start + timedelta(days=i)).weekday() < 5]
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO student (id, name) VALUES (?, ?)",
+            [(i, f"Student {i:05d}") for i in range(1, n_students + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO course (id, name) VALUES (?, ?)",
+            list(enumerate(initial_courses, start=1)),
+        )
+        rows = []
+        for day_no, day in enumerate(school_days):
+            # Three sessions a day, rotating through the course list
+            for slot in range(3):
+                course_id = (day_no * 3 + slot) % len(initial_courses) + 1
+                for sid in range(1, n_students + 1):
+                    status = 'P' if random.random() < 0.9 else 'A'
+                    rows.append((sid, day.isoformat(), course_id, status, 'not_informed'))
+            if len(rows) >= 200_000:
+                conn.exec_driver_sql(
+                    "INSERT INTO attendance_record (student_id, date, course_id, status, info) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                rows = []
+        if rows:
+            conn.exec_driver_sql(
+                "INSERT INTO attendance_record (student_id, date, course_id, status, info) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+    return school_days
+
+
+def hot_queries(school_days):
+    mid = school_days[len(school_days) // 2]
+    month_start = mid.replace(day=1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    course = 1
+    return [
+        ("mark_attendance (date, course)",
+         "SELECT * FROM attendance_record WHERE date = ? AND course_id = ?", (mid.isoformat(), course)),
+        ("mark_attendance point lookup",
+         "SELECT * FROM attendance_record WHERE student_id = ? AND date = ? AND course_id = ?",
+         (1000, mid.isoformat(), course)),
+        ("view_attendance (date)",
+         "SELECT * FROM attendance_record WHERE date = ?", (mid.isoformat(),)),
+        ("view_attendance_records month",
+         "SELECT * FROM attendance_record WHERE course_id = ? AND date BETWEEN ? AND ?",
+         (course, month_start.isoformat(), month_end.isoformat())),
+        ("student_report",
+         "SELECT * FROM attendance_record WHERE student_id = ? AND course_id = ? ORDER BY date DESC",
+         (1000, course)),
+        ("student_detail all",
+         "SELECT * FROM attendance_record WHERE student_id = ? ORDER BY date DESC", (1000,)),
+    ]
+
+
+def run(engine, queries, label, repeat):
+    print(f"\n=== {label} ===")
+    with engine.connect() as conn:
+        for name, sql, params in queries:
+            plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            started = time.perf_counter()
+            for _ in range(repeat):
+                n_rows = len(conn.exec_driver_sql(sql, params).fetchall())
+            elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+            print(f"{name:<34} {elapsed_ms:9.2f} ms  rows={n_rows}")
+            for row in plan:
+                print(f"    {row[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = sa.create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    table = db.metadata.tables["attendance_record"]
+    for index in table.indexes:
+        index.drop(engine)
+
+    started = time.perf_counter()
+    school_days = seed(engine, args.students, args.days)
+    with engine.connect() as conn:
+        total = conn.exec_driver_sql("SELECT COUNT(*) FROM attendance_record").scalar()
+    print(f"Seeded {total} attendance rows in {time.perf_counter() - started:.1f}s ({path})")
+
+    queries = hot_queries(school_days)
+    run(engine, queries, "without indexes", args.repeat)
+
+    started = time.perf_counter()
+    for index in table.indexes:
+        index.create(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    print(f"\nBuilt indexes in {time.perf_counter() - started:.1f}s")
+    run(engine, queries, "with indexes", args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Login storm: many students signing in at once, as at the start of an exam.
+
+Adds a login for every student in a generated school, then has --concurrency
+threads (each its own browser session) post to /login back to back for
+--seconds, once per password hash setting in --methods. Every account is
+given the same stored hash for a run, so each login costs one verification at
+that work factor. Prints logins/s, p50/p95/p99 latency and failures per
+setting, to size PASSWORD_HASH and LOGIN_HASH_CONCURRENCY for the hardware.
+
+    python benchmarks/bench_login_storm.py --students 2000 --concurrency 16 --seconds 10
+    python benchmarks/bench_login_storm.py --methods scrypt:32768:8:1,scrypt:16384:8:1 --hash-slots 4
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_login.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PASSWORD = "exam-day-2025"
+
+
+def storm(app, emails, concurrency, seconds, seed):
+    """Log in from concurrency threads until the deadline; returns (latencies, failures)."""
+    latencies, failures = [], []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def user(n):
+        rng = random.Random(seed + n)
+        client = app.test_client()
+        while time.perf_counter() < deadline:
+            email = rng.choice(emails)
+            started = time.perf_counter()
+            response = client.post("/login", data={"role": "Student", "email": email, "password": PASSWORD})
+            elapsed = time.perf_counter() - started
+            with lock:
+                (latencies if response.status_code == 302 else failures).append(elapsed)
+            client.get("/logout")
+
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--methods", default="scrypt:32768:8:1,scrypt:16384:8:1,scrypt:8192:8:1",
+                        help="comma-separated PASSWORD_HASH settings to compare")
+    parser.add_argument("--hash-slots", type=int, help="LOGIN_HASH_CONCURRENCY (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.hash_slots:
+        os.environ["LOGIN_HASH_CONCURRENCY"] = str(args.hash_slots)
+
+    import attendance_app
+    from attendance_app import app, db, Student, User
+    from werkzeug.security import check_password_hash, generate_password_hash
+    from generate_school import generate_school
+    from latency import summarize
+
+    with app.app_context():
+        generate_school(args.students, courses=3, days=5, seed=args.seed)
+        linked = {id for (id,) in db.session.query(User.student_id).filter(User.student_id.isnot(None))}
+        db.session.execute(db.insert(User), [
+            {"email": f"student{id}@example.com", "password_hash": "", "role": "Student", "student_id": id}
+            for (id,) in db.session.query(Student.id) if id not in linked
+        ])
+        db.session.commit()
+        emails = [email for (email,) in db.session.query(User.email).filter(User.role == "Student")]
+
+    print(f"{len(emails)} student logins, {args.concurrency} concurrent sessions, {args.seconds:g}s per setting\n")
+    print(f"{'PASSWORD_HASH':<24} {'1 hash ms':>9} {'logins/s':>9} {'p50':>8} {'p95':>8} {'p99':>8} {'failed':>7}")
+    for method in args.methods.split(","):
+        stored = generate_password_hash(PASSWORD, method=method)
+        started = time.perf_counter()
+        check_password_hash(stored, PASSWORD)
+        single = (time.perf_counter() - started) * 1000
+        with app.app_context():
+            db.session.execute(db.update(User).values(password_hash=stored))
+            db.session.commit()
+        attendance_app.PASSWORD_HASH = method  # matches the stored hash, so no rehash on login
+        latencies, failures = storm(app, emails, args.concurrency, args.seconds, args.seed)
+        stats = summarize(latencies)
+        print(f"{method:<24} {single:>9.1f} {stats['n'] / args.seconds:>9.1f} {stats['p50']:>8.1f} "
+              f"{stats['p95']:>8.1f} {stats['p99']:>8.1f} {len(failures):>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Time class-wide reports on the in-memory attendance matrix against SQL.
+
+Generates a school, loads the attendance matrix (one streamed query) and
+reports its load time and size. Then it times, --repeat times each, the
+term-wide per-student rates for one subject as a SQL GROUP BY
+(attendance_rates) and from the matrix, plus the matrix's lowest-attendance
+ranking, current absence streaks and per-day class rates.
+
+    python benchmarks/bench_matrix.py --students 3000 --courses 10 --days 180
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_matrix.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from attendance_app import app, get_courses, attendance_rates, matrix_rates, load_attendance_matrix  # noqa: E402
+from generate_school import generate_school  # noqa: E402
+from latency import summarize  # noqa: E402
+
+
+def timed(label, f, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = f()
+        durations.append(time.perf_counter() - started)
+    stats = summarize(durations)
+    print(f"{label:<40} {stats['p50']:>9.2f} {stats['p95']:>9.2f}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with app.test_request_context():
+        started = time.perf_counter()
+        counts = generate_school(args.students, args.courses, args.days)
+        print(f"Generated {counts} in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        matrix = load_attendance_matrix()
+        load_seconds = time.perf_counter() - started
+        tracemalloc.start()  # a second, traced load for the memory peak
+        load_attendance_matrix()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"Matrix: {len(matrix.student_ids)} students x {len(matrix.courses)} courses, loaded in "
+              f"{load_seconds:.2f}s, {matrix.nbytes() / 2**20:.1f} MiB held, {peak / 2**20:.1f} MiB peak while loading\n")
+
+        from attendance_app import get_matrix_cache
+        get_matrix_cache().get()  # the routes' copy
+        course = get_courses().names[0]
+        course_id = get_courses().ids_by_name[course]
+        print(f"{'term-wide, one subject (ms)':<40} {'p50':>9} {'p95':>9}")
+        sql = timed("per-student rates, SQL GROUP BY", lambda: attendance_rates("student", course=course), args.repeat)
+        mem = timed("per-student rates, matrix", lambda: matrix_rates(course_id), args.repeat)
+        assert sql == mem, "matrix and SQL disagree"
+        timed("lowest 10, matrix", lambda: matrix.lowest(10, course_id), args.repeat)
+        timed("absence streaks, matrix", lambda: matrix.absence_streaks(course_id), args.repeat)
+        timed("per-day class rates, matrix", lambda: matrix.daily_rates(course_id), args.repeat)
+        timed("per-student rates, all subjects, matrix", lambda: matrix.student_totals(), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Time every route through Flask's test client against a generated school.
+
+Builds a scratch school with generate_school.py, requests each route
+--iterations times as the role that uses it, and prints p50/p95/p99 latency
+and SQL statements per request. --save writes the results as a baseline and
+--compare exits non-zero when a route's p95 grows past --tolerance times the
+baseline (and by more than --min-ms) or it issues more queries, so a deploy
+can be gated on it.
+
+    python benchmarks/bench_routes.py --students 1000 --days 180 --save baseline.json
+    python benchmarks/bench_routes.py --students 1000 --days 180 --compare baseline.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_routes.db"))
+# Time the work behind each page, not the rendered-page cache
+os.environ.setdefault("PAGE_CACHE", "off")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from attendance_app import app, db, get_roster, get_courses, Homework  # noqa: E402
+from generate_school import generate_school  # noqa: E402
+from latency import summarize  # noqa: E402
+from querycount import count_queries  # noqa: E402
+
+LOGINS = {
+    "Admin": ("admin@example.com", "admin123"),
+    "Teacher": ("teacher@example.com", "teacher123"),
+    "Student": ("aravind@example.com", "student123"),
+}
+STUDENT = "Aravind"
+
+
+def routes(day, course, homework_id, roster_names):
+    """(role, method, url, form) for every route, with parameters that hit real data."""
+    d = day.isoformat()
+    mark_form = {"date": d, "course": course}
+    for i, name in enumerate(roster_names):
+        mark_form[f"status_{name}"] = "P" if i % 10 else "A"
+        mark_form[f"info_{name}"] = "informed"
+    homework_form = {"date": d, "course": course, "description": "Benchmark homework"}
+    for name in roster_names:
+        homework_form[f"{name}_marks"] = "8"
+        homework_form[f"{name}_progress"] = "done"
+    return [
+        ("Admin", "GET", "/front", None),
+        ("Teacher", "GET", "/mark", None),
+        ("Teacher", "POST", "/mark", mark_form),
+        ("Teacher", "GET", f"/attendance/{d}", None),
+        ("Teacher", "GET", f"/attendance-records?date={d}&course={course}&range=day", None),
+        ("Teacher", "GET", f"/attendance-records?date={d}&course={course}&range=month", None),
+        ("Teacher", "GET", "/report", None),
+        ("Teacher", "GET", f"/report?subject={course}&student={STUDENT}", None),
+        ("Teacher", "GET", f"/homework?filter_date={d}&filter_range=month", None),
+        ("Teacher", "POST", "/homework", homework_form),
+        ("Admin", "GET", "/students", None),
+        ("Student", "GET", f"/student/{STUDENT}", None),
+        ("Student", "GET", f"/student/{STUDENT}?range=month&date={d}&course=all", None),
+        ("Student", "GET", "/student-homework", None),
+        ("Student", "POST", "/student-homework", {"homework_id": str(homework_id), "question": "Benchmark doubt"}),
+        ("Teacher", "GET", f"/api/analytics?course={course}", None),
+        ("Teacher", "GET", f"/api/attendance-matrix?course={course}", None),
+        ("Teacher", "GET", "/early-warning", None),
+        ("Student", "GET", f"/api/v1/students/{STUDENT}/attendance", None),
+        ("Teacher", "GET", f"/api/v1/attendance-records?date={d}&course={course}&range=month", None),
+        ("Student", "GET", "/api/v1/student-homework", None),
+        ("Teacher", "GET", "/search?q=exercises", None),
+        ("Teacher", "GET", f"/api/v1/search?q=exercises&course={course}", None),
+        ("Teacher", "GET", f"/attendance-records/export?date={d}&course={course}&range=month", None),
+        ("Teacher", "GET", f"/report/export?subject={course}", None),
+        ("Teacher", "GET", f"/homework/export?filter_date={d}&filter_range=month", None),
+        ("Admin", "GET", "/api/page-cache", None),
+        ("Admin", "GET", "/admin/perf", None),
+        ("Admin", "GET", "/admin/jobs", None),
+        ("Admin", "GET", "/api/jobs", None),
+        ("Student", "GET", "/login", None),
+    ]
+
+
+def bench(clients, route, iterations, engine):
+    role, method, url, form = route
+    client = clients[role]
+    client.open(url, method=method, data=form).close()  # warm caches and the page
+    durations, queries = [], []
+    for _ in range(iterations):
+        with count_queries(engine) as counter:
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=form)
+            response.get_data()  # drain streamed exports
+            durations.append(time.perf_counter() - started)
+            response.close()  # ends the streamed request's context, as a WSGI server would
+        queries.append(counter.count)
+        assert response.status_code in (200, 302), (method, url, response.status_code)
+    return summarize(durations) | {"queries": max(queries)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to check against")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed p95 growth factor")
+    parser.add_argument("--min-ms", type=float, default=2.0, help="ignore p95 growth smaller than this")
+    args = parser.parse_args()
+
+    end = date.today()
+    with app.app_context():
+        started = time.perf_counter()
+        counts = generate_school(args.students, args.courses, args.days, end=end)
+        print(f"Generated {counts} in {time.perf_counter() - started:.1f}s")
+        engine = db.engine
+        roster_names = [s.name for s in get_roster().students]
+        course = get_courses().names[0]
+        day = db.session.query(db.func.max(Homework.date)).scalar() or end
+        homework_id = db.session.query(db.func.max(Homework.id)).scalar() or 1
+
+    clients = {}
+    for role, (email, password) in LOGINS.items():
+        clients[role] = app.test_client()
+        clients[role].post("/login", data={"role": role, "email": email, "password": password})
+
+    results = {}
+    print(f"\n{'route':<78} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}")
+    for route in routes(day, course, homework_id, roster_names):
+        name = f"{route[1]} {route[2].replace(day.isoformat(), '<date>')}"
+        results[name] = bench(clients, route, args.iterations, engine)
+        r = results[name]
+        print(f"{name[:78]:<78} {r['p50']:>8.2f} {r['p95']:>8.2f} {r['p99']:>8.2f} {r['queries']:>8}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = []
+        for name, r in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+            if r["p95"] > base["p95"] * args.tolerance and r["p95"] - base["p95"] > args.min_ms:
+                regressions.append(f"{name}: p95 {base['p95']} -> {r['p95']} ms")
+            if r["queries"] > base["queries"]:
+                regressions.append(f"{name}: queries {base['queries']} -> {r['queries']}")
+        print("\n" + ("\n".join(regressions) if regressions else "No regressions against " + args.compare))
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
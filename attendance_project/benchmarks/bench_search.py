@@ -0,0 +1,97 @@
+"""Time homework and doubt search on the FTS5 index against a LIKE scan.
+
+Generates a school, then adds --doubts more doubts (half answered) whose
+questions and answers are drawn from a small maths/science vocabulary, so
+terms match anywhere from a handful to thousands of rows. Each term is
+searched --repeat times through search_records(), on the FTS5 index and on
+the LIKE fallback, with and without a subject and date filter.
+
+    python benchmarks/bench_search.py --doubts 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_search.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from attendance_app import app, db, get_courses, search_records, shard_state, Homework, HomeworkDoubt, Student  # noqa: E402
+from generate_school import generate_school, BATCH  # noqa: E402
+from latency import summarize  # noqa: E402
+
+TOPICS = ["quadratic equations", "photosynthesis", "integration by parts", "newton's laws", "simple interest",
+          "prime factorisation", "chemical bonding", "probability", "trigonometric identities", "electric circuits",
+          "cell division", "linear inequalities", "acids and bases", "coordinate geometry", "kinetic energy"]
+ASKS = ["How do I solve question {n} on {topic}?", "I don't understand step {n} of the {topic} example.",
+        "Is there a shortcut for {topic} problems?", "Why does the answer to {n} use {topic}?"]
+ANSWERS = ["Revise the {topic} notes and try again.", "Start from the worked example on {topic}.",
+           "Question {n} needs {topic}; see page {n} of the textbook."]
+TERMS = ["photosynthesis", "quadr", "integration parts", "shortcut", "textbook page", "nonexistentword"]
+
+
+def add_doubts(count, rng):
+    """Bulk-insert count doubts spread over the existing homework and students."""
+    homework_ids = [id for (id,) in db.session.query(Homework.id)]
+    student_ids = [id for (id,) in db.session.query(Student.id)]
+    start = datetime.combine(date.today() - timedelta(days=180), datetime.min.time())
+    rows = []
+    for _ in range(count):
+        topic, n = rng.choice(TOPICS), rng.randint(1, 40)
+        asked = start + timedelta(minutes=rng.randrange(180 * 24 * 60))
+        answered = rng.random() < 0.5
+        rows.append({"homework_id": rng.choice(homework_ids), "student_id": rng.choice(student_ids),
+                     "question": rng.choice(ASKS).format(n=n, topic=topic),
+                     "answer": rng.choice(ANSWERS).format(n=n, topic=topic) if answered else None,
+                     "created_at": asked.strftime("%Y-%m-%d %H:%M:%S"),
+                     "answered_at": (asked + timedelta(hours=6)).strftime("%Y-%m-%d %H:%M:%S") if answered else None})
+    for offset in range(0, len(rows), BATCH):
+        db.session.execute(db.insert(HomeworkDoubt.__table__), rows[offset:offset + BATCH])
+    db.session.commit()
+
+
+def timed(label, f, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = f()
+        durations.append(time.perf_counter() - started)
+    stats = summarize(durations)
+    print(f"{label:<44} {stats['p50']:>9.2f} {stats['p95']:>9.2f} {len(result['doubts']):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--doubts", type=int, default=30_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with app.test_request_context():
+        started = time.perf_counter()
+        counts = generate_school(args.students, args.courses, args.days, seed=args.seed)
+        add_doubts(args.doubts, random.Random(args.seed))
+        total = db.session.query(db.func.count(HomeworkDoubt.id)).scalar()
+        print(f"Generated {counts} plus {args.doubts} doubts ({total} in all, indexed by triggers) "
+              f"in {time.perf_counter() - started:.1f}s\n")
+        course_id = get_courses().ids_by_name[get_courses().names[0]]
+        since = date.today() - timedelta(days=30)
+
+        print(f"{'search (ms)':<44} {'p50':>9} {'p95':>9} {'doubts':>7}")
+        for fts in (True, False):
+            shard_state()["search_fts"] = fts
+            engine = "fts5" if fts else "like"
+            for term in TERMS:
+                timed(f"{engine} {term!r}", lambda: search_records(term), args.repeat)
+            timed(f"{engine} {TERMS[0]!r}, one subject, 30 days",
+                  lambda: search_records(TERMS[0], course_id=course_id, start=since), args.repeat)
+        shard_state()["search_fts"] = True
+
+
+if __name__ == "__main__":
+    main()
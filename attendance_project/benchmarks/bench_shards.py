@@ -0,0 +1,123 @@
+"""Attendance write throughput with one shared database against one shard per school.
+
+Creates --schools school shards of --students students each, plus the same
+number of subjects over a roster of that size in the main database. Then one
+process per teacher posts full-class attendance saves back to back for
+--seconds: first every teacher on the main database (each marking their own
+subject), then each teacher on their own school's shard. Prints saves/s and
+p50/p95/p99 save latency per layout. In the shared layout every save queues
+on one SQLite write lock; sharded, each school has its own.
+
+    python benchmarks/bench_shards.py --schools 4 --students 300 --seconds 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+scratch = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(scratch, "bench_shards.db"))
+os.environ.setdefault("SHARDS_DIR", os.path.join(scratch, "shards"))
+os.environ.setdefault("JOB_THREADS", "0")
+os.environ.setdefault("PAGE_CACHE", "off")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "bench-shards"
+
+
+def setup(schools, students):
+    """Create the schools and main-database subjects; returns ([shared teacher emails], [school teacher emails])."""
+    from attendance_app import app, db, User, hash_password, school_context, ensure_courses
+    from generate_school import generate_school
+    cli = app.test_cli_runner()
+    password_hash = hash_password(PASSWORD)
+    shared, sharded = [], []
+    with app.app_context():
+        generate_school(students, courses=0, days=0)
+        ensure_courses([f"Shared {i}" for i in range(schools)])
+        db.session.commit()
+        for i in range(schools):
+            key = f"school-{i}"
+            result = cli.invoke(args=["shards", "create", key, "--name", f"Bench School {i}"])
+            assert result.exit_code == 0, result.output
+            shared.append(f"teacher-{i}@main.example")
+            sharded.append(f"teacher@{key}.example")
+            db.session.add(User(email=shared[-1], password_hash=password_hash, role="Teacher"))
+            db.session.add(User(email=sharded[-1], password_hash=password_hash, role="Teacher", school=key))
+        db.session.commit()
+    for i in range(schools):
+        with school_context(f"school-{i}"):
+            generate_school(students, courses=0, days=0, seed=i)
+            ensure_courses(["Maths"])
+            db.session.commit()
+    return shared, sharded
+
+
+def teacher(email, course, seconds, start, results):
+    """One process: log in, then save the whole class's attendance for course until the deadline."""
+    from attendance_app import app
+    client = app.test_client()
+    client.post("/login", data={"role": "Teacher", "email": email, "password": PASSWORD})
+    page = client.get("/mark").get_data(as_text=True)
+    names = re.findall(r'name="status_([^"]+)"', page)
+    rng = random.Random(email)
+    latencies, failures = [], 0
+    start.wait()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        form = {"date": (date.today() - timedelta(days=rng.randrange(60))).isoformat(), "course": course}
+        for name in names:
+            form[f"status_{name}"] = "P" if rng.random() < 0.9 else "A"
+            form[f"info_{name}"] = "informed"
+        started = time.perf_counter()
+        response = client.post("/mark", data=form)
+        latencies.append(time.perf_counter() - started)
+        failures += response.status_code != 200
+    results.put((latencies, failures))
+
+
+def run(label, teachers, seconds):
+    context = multiprocessing.get_context("spawn")  # each teacher imports the app afresh
+    start, results = context.Event(), context.Queue()
+    processes = [context.Process(target=teacher, args=(email, course, seconds, start, results))
+                 for email, course in teachers]
+    for process in processes:
+        process.start()
+    time.sleep(3)  # let every process import the app and log in
+    start.set()
+    latencies, failures = [], 0
+    for _ in processes:
+        batch, failed = results.get()
+        latencies += batch
+        failures += failed
+    for process in processes:
+        process.join()
+    from latency import summarize
+    stats = summarize(latencies)
+    print(f"{label:<32} {stats['n']:>7} {stats['n'] / seconds:>8.1f} {stats['p50']:>8.2f} {stats['p95']:>8.2f} "
+          f"{stats['p99']:>8.2f} {failures:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--schools", type=int, default=4)
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    shared, sharded = setup(args.schools, args.students)
+    print(f"Created {args.schools} schools of {args.students} students in {time.perf_counter() - started:.1f}s "
+          f"({os.cpu_count()} CPUs)\n")
+    print(f"{'layout':<32} {'saves':>7} {'saves/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    run(f"shared file, {args.schools} teachers", [(email, f"Shared {i}") for i, email in enumerate(shared)], args.seconds)
+    run(f"{args.schools} shards, 1 teacher each", [(email, "Maths") for email in sharded], args.seconds)
+
+
+if __name__ == "__main__":
+    main()
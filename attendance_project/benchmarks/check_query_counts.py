@@ -0,0 +1,80 @@
+"""Fail if an attendance page's query count grows with the size of the data.
+
+Each page is requested against a small and a larger scratch school; an N+1
+lazy load shows up as a higher count on the larger one. Exits non-zero on a
+regression; tests/test_attendance.py runs the same check under pytest.
+
+    python benchmarks/check_query_counts.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "querycount.db"))
+# Measure the queries behind each page, not the rendered-page cache
+os.environ.setdefault("PAGE_CACHE", "off")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from attendance_app import app, db, initial_courses, bump_cache_version, Student, Course, AttendanceRecord  # noqa: E402
+from querycount import count_queries  # noqa: E402
+
+DAY = date(2025, 9, 1)
+COURSE = initial_courses[0]
+PAGES = [
+    ("GET", "/mark"),
+    ("POST", "/mark"),
+    ("GET", f"/attendance/{DAY.isoformat()}"),
+    ("GET", f"/attendance-records?date={DAY.isoformat()}&course={COURSE}&range=month"),
+    ("GET", f"/report?subject={COURSE}&student=Aravind"),
+]
+
+
+def grow_school(n_students, n_days):
+    """Top the scratch school up to n_students, each marked for n_days in COURSE."""
+    existing = Student.query.count()
+    db.session.add_all(Student(name=f"Student {i:05d}") for i in range(existing, n_students))
+    bump_cache_version("roster")
+    db.session.commit()
+    db.session.query(AttendanceRecord).delete()
+    course_id = Course.query.filter_by(name=COURSE).one().id
+    db.session.add_all(
+        AttendanceRecord(student_id=s.id, date=DAY + timedelta(days=d), course_id=course_id, status="P", info="informed")
+        for s in Student.query.all() for d in range(n_days)
+    )
+    db.session.commit()
+
+
+def measure(client):
+    counts = {}
+    with app.app_context():
+        engine = db.engine
+    for method, url in PAGES:
+        data = {"date": DAY.isoformat(), "course": COURSE} if method == "POST" else None
+        client.open(url, method=method, data=data)  # warm the process-level caches
+        with count_queries(engine) as counter:
+            response = client.open(url, method=method, data=data)
+        assert response.status_code == 200, (url, response.status_code)
+        counts[f"{method} {url}"] = counter.count
+    return counts
+
+
+def main():
+    client = app.test_client()
+    client.post("/login", data={"role": "Teacher", "email": "teacher@example.com", "password": "teacher123"})
+    results = []
+    for n_students, n_days in [(20, 3), (200, 20)]:
+        with app.app_context():
+            grow_school(n_students, n_days)
+        results.append(measure(client))
+
+    failed = False
+    for page, small in results[0].items():
+        large = results[1][page]
+        flag = "ok" if large == small else "GROWS"
+        failed |= large != small
+        print(f"{flag:<6} {small:>4} -> {large:<4} {page}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
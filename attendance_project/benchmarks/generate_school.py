@@ -0,0 +1,140 @@
+"""Fill a database with a synthetic school for benchmarks and load tests.
+
+Adds students (each with their own attendance habit), extra subjects, and
+school days of attendance with three sessions a day. It also adds homework
+for most sessions, progress for most students, and a trickle of doubts, half
+of them answered. Rows go in through bulk inserts, then the attendance summary
+is rebuilt. Point DATABASE_URL at a scratch database; --db is a shortcut for
+a SQLite file.
+
+    python benchmarks/generate_school.py --db /tmp/school.db --students 2000 --courses 12 --days 365
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIRST_NAMES = ["Aarav", "Anika", "Arjun", "Bala", "Deepa", "Divya", "Farhan", "Gowri", "Ishaan", "Janani",
+               "Karthik", "Lakshmi", "Manoj", "Nandini", "Pranav", "Priya", "Rahul", "Sanjana", "Tarun", "Vidya"]
+LAST_NAMES = ["Anand", "Bose", "Chandran", "Das", "Iyer", "Joseph", "Kumar", "Menon", "Nair", "Pillai",
+              "Rajan", "Raman", "Reddy", "Sharma", "Singh", "Subramanian", "Thomas", "Varghese", "Verma", "Zacharia"]
+SESSIONS_PER_DAY = 3
+BATCH = 50_000
+
+
+def student_names(count, taken):
+    """count unique "First Last" names (numbered once the combinations run out), skipping taken."""
+    names = []
+    round_no = 0
+    while len(names) < count:
+        for first in FIRST_NAMES:
+            for last in LAST_NAMES:
+                name = f"{first} {last}" + (f" {round_no + 1}" if round_no else "")
+                if name not in taken:
+                    names.append(name)
+                if len(names) == count:
+                    return names
+        round_no += 1
+    return names
+
+
+def _insert(table, rows):
+    from attendance_app import db
+    for start in range(0, len(rows), BATCH):
+        db.session.execute(db.insert(table), rows[start:start + BATCH])
+
+
+def generate_school(students=500, courses=10, days=180, end=None, seed=0):
+    """Add a synthetic school to the app's database; call inside an app context.
+
+    Returns a dict of row counts. The same seed and end date give the same data.
+    """
+    from attendance_app import (db, Student, Course, AttendanceRecord, Homework, HomeworkProgress, HomeworkDoubt,
+                                bump_cache_version, rebuild_attendance_summary)
+    rng = random.Random(seed)
+    end = end or date.today()
+
+    existing = {name for (name,) in db.session.query(Student.name)}
+    _insert(Student.__table__, [{"name": name} for name in student_names(max(students - len(existing), 0), existing)])
+    known_courses = {name for (name,) in db.session.query(Course.name)}
+    extra = [f"Elective {i}" for i in range(1, courses + 1) if f"Elective {i}" not in known_courses]
+    _insert(Course.__table__, [{"name": name} for name in extra[:max(courses - len(known_courses), 0)]])
+    bump_cache_version("roster")
+    bump_cache_version("courses")
+    db.session.commit()
+
+    student_ids = [id for (id,) in db.session.query(Student.id).order_by(Student.id)]
+    course_ids = [id for (id,) in db.session.query(Course.id).order_by(Course.id)]
+    # Most students attend ~90-97% of sessions; a few are chronically absent
+    presence = {sid: (rng.uniform(0.55, 0.8) if rng.random() < 0.05 else rng.uniform(0.88, 0.98)) for sid in student_ids}
+    diligence = {sid: rng.uniform(0.5, 1.0) for sid in student_ids}
+    school_days = [end - timedelta(days=i) for i in range(days, -1, -1) if (end - timedelta(days=i)).weekday() < 5]
+
+    counts = {"students": len(student_ids), "courses": len(course_ids), "attendance": 0,
+              "homework": 0, "progress": 0, "doubts": 0}
+    attendance, progress, doubts = [], [], []
+    next_homework_id = (db.session.query(db.func.max(Homework.id)).scalar() or 0) + 1
+    for day_no, day in enumerate(school_days):
+        for slot in range(SESSIONS_PER_DAY):
+            course_id = course_ids[(day_no * SESSIONS_PER_DAY + slot) % len(course_ids)]
+            for sid in student_ids:
+                present = rng.random() < presence[sid]
+                attendance.append({"student_id": sid, "date": day, "course_id": course_id,
+                                   "status": "P" if present else "A",
+                                   "info": "not_informed" if present or rng.random() < 0.4 else "informed"})
+            if rng.random() < 0.6:
+                homework_id = next_homework_id
+                next_homework_id += 1
+                _insert(Homework.__table__, [{"id": homework_id, "date": day, "course_id": course_id,
+                                              "description": f"Exercises for session {day_no * SESSIONS_PER_DAY + slot}"}])
+                counts["homework"] += 1
+                for sid in student_ids:
+                    if rng.random() < diligence[sid]:
+                        progress.append({"homework_id": homework_id, "student_id": sid,
+                                         "marks": str(rng.randint(4, 10)), "progress": rng.choice(["done", "partial", "started"])})
+                    if rng.random() < 0.02:
+                        asked = datetime.combine(day, datetime.min.time()) + timedelta(hours=rng.randint(15, 21))
+                        answered = rng.random() < 0.5
+                        doubts.append({"homework_id": homework_id, "student_id": sid, "question": "How do I approach part 2?",
+                                       "answer": "Start from the worked example." if answered else None,
+                                       "created_at": asked.strftime("%Y-%m-%d %H:%M:%S"),
+                                       "answered_at": (asked + timedelta(hours=12)).strftime("%Y-%m-%d %H:%M:%S") if answered else None})
+        if len(attendance) >= BATCH:
+            _insert(AttendanceRecord.__table__, attendance)
+            counts["attendance"] += len(attendance)
+            attendance = []
+    _insert(AttendanceRecord.__table__, attendance)
+    _insert(HomeworkProgress.__table__, progress)
+    _insert(HomeworkDoubt.__table__, doubts)
+    counts["attendance"] += len(attendance)
+    counts["progress"] = len(progress)
+    counts["doubts"] = len(doubts)
+    db.session.commit()
+    rebuild_attendance_summary()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="SQLite file to fill (sets DATABASE_URL)")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--days", type=int, default=180, help="calendar days of history, weekends skipped")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.db:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.abspath(args.db)
+
+    from attendance_app import app
+    started = time.perf_counter()
+    with app.app_context():
+        counts = generate_school(args.students, args.courses, args.days, seed=args.seed)
+    print(", ".join(f"{n} {what}" for what, n in counts.items()) + f" in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""Latency percentile helpers shared by the route benchmark and the load scenario."""
+import math
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(seconds):
+    """p50/p95/p99/max in milliseconds for a list of durations in seconds."""
+    values = sorted(seconds)
+    return {f"p{pct}": round(percentile(values, pct) * 1000, 2) for pct in (50, 95, 99)} | {
+        "max": round(values[-1] * 1000, 2) if values else float("nan"),
+        "n": len(values),
+    }
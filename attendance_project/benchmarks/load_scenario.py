@@ -0,0 +1,191 @@
+"""Concurrent load scenario: teachers marking attendance while students browse.
+
+Each virtual user is a thread with its own cookie session that logs in and
+then picks weighted tasks with a short think time between them, in the style
+of a locust user class. Without --url, a scratch school is generated and the
+app is served in-process on a threaded local server with PROFILING=1, so
+queries per request are read from the Server-Timing header. Prints
+p50/p95/p99 latency, throughput and errors per task.
+
+    python benchmarks/load_scenario.py --teachers 4 --students 40 --duration 30
+    python benchmarks/load_scenario.py --url http://127.0.0.1:5000 --duration 60
+"""
+import argparse
+import http.cookiejar
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from latency import summarize  # noqa: E402
+
+STUDENT = ("aravind@example.com", "student123", "Aravind")
+TEACHER = ("teacher@example.com", "teacher123")
+QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+
+class VirtualUser:
+    def __init__(self, base_url, results, rng):
+        self.base_url = base_url
+        self.results = results
+        self.rng = rng
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, task, path, form=None, headers=None):
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers or {})
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req) as response:
+                body = response.read()
+                status, header = response.status, response.headers.get("Server-Timing", "")
+                etag = response.headers.get("ETag")
+        except urllib.error.HTTPError as error:
+            body, status, header, etag = b"", error.code, error.headers.get("Server-Timing", ""), error.headers.get("ETag")
+        except OSError:
+            body, status, header, etag = b"", None, "", None
+        elapsed = time.perf_counter() - started
+        match = QUERIES.search(header)
+        self.results.record(task, elapsed, status, int(match.group(1)) if match else None)
+        return status, body, etag
+
+    def login(self, role, email, password):
+        self.request("login", "/login", {"role": role, "email": email, "password": password})
+
+    def run(self, deadline, think):
+        self.start()
+        tasks, weights = zip(*self.tasks)
+        while time.perf_counter() < deadline:
+            self.rng.choices(tasks, weights)[0](self)
+            time.sleep(self.rng.uniform(0, think * 2))
+
+
+class Teacher(VirtualUser):
+    def start(self):
+        self.login("Teacher", *TEACHER)
+        _, body, _ = self.request("GET /mark", "/mark")
+        page = body.decode()
+        self.names = re.findall(r'name="status_([^"]+)"', page)
+        course_select = re.search(r'<select id="course" name="course".*?</select>', page, re.S)
+        self.courses = re.findall(r'<option value="([^"]+)"', course_select.group(0)) if course_select else ["Maths"]
+
+    def mark(self):
+        day = date.today() - timedelta(days=self.rng.randrange(30))
+        form = {"date": day.isoformat(), "course": self.rng.choice(self.courses)}
+        for name in self.names:
+            form[f"status_{name}"] = "P" if self.rng.random() < 0.9 else "A"
+            form[f"info_{name}"] = "informed"
+        self.request("POST /mark", "/mark", form)
+
+    def records(self):
+        day = date.today() - timedelta(days=self.rng.randrange(30))
+        query = urllib.parse.urlencode({"date": day.isoformat(), "course": self.rng.choice(self.courses), "range": "week"})
+        self.request("GET /attendance-records", f"/attendance-records?{query}")
+
+    def report(self):
+        query = urllib.parse.urlencode({"subject": self.rng.choice(self.courses), "student": STUDENT[2]})
+        self.request("GET /report", f"/report?{query}")
+
+    tasks = [
+        (lambda self: self.request("GET /mark", "/mark"), 1),
+        (mark, 3),
+        (records, 1),
+        (report, 1),
+    ]
+
+
+class Student(VirtualUser):
+    def start(self):
+        self.login("Student", *STUDENT[:2])
+        self.etag = None
+
+    def detail(self):
+        self.request("GET /student", f"/student/{urllib.parse.quote(STUDENT[2])}")
+
+    def homework(self):
+        self.request("GET /student-homework", "/student-homework")
+
+    def api(self):
+        # Browsers revalidate with the last ETag; most of these should be 304s
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        _, _, etag = self.request("GET /api/v1 attendance", f"/api/v1/students/{urllib.parse.quote(STUDENT[2])}/attendance", headers=headers)
+        self.etag = etag or self.etag
+
+    tasks = [(detail, 3), (homework, 2), (api, 2)]
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, task, elapsed, status, queries):
+        with self.lock:
+            self.samples.setdefault(task, []).append((elapsed, status, queries))
+
+    def report(self, duration):
+        print(f"\n{'task':<26} {'reqs':>6} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7} {'queries':>8}")
+        for task, samples in sorted(self.samples.items()):
+            stats = summarize([elapsed for elapsed, _, _ in samples])
+            errors = sum(1 for _, status, _ in samples if status is None or status >= 400)
+            counted = [q for _, _, q in samples if q is not None]
+            queries = f"{sum(counted) / len(counted):.1f}" if counted else "-"
+            print(f"{task:<26} {stats['n']:>6} {stats['n'] / duration:>7.1f} {stats['p50']:>8.2f} "
+                  f"{stats['p95']:>8.2f} {stats['p99']:>8.2f} {errors:>7} {queries:>8}")
+
+
+def start_local_server(args):
+    """Generate a school in a scratch database and serve the app on a free local port."""
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "load.db"))
+    os.environ.setdefault("PROFILING", "1")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from werkzeug.serving import make_server
+    from attendance_app import app
+    from generate_school import generate_school
+    with app.app_context():
+        counts = generate_school(args.school_students, args.courses, args.days)
+    print(f"Generated {counts}")
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no per-request access log
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="running server to load; default starts one in-process")
+    parser.add_argument("--teachers", type=int, default=4)
+    parser.add_argument("--students", type=int, default=20, help="concurrent student users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--think", type=float, default=0.2, help="mean think time between tasks, seconds")
+    parser.add_argument("--school-students", type=int, default=300, help="students in the generated school")
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/") if args.url else start_local_server(args)
+    results = Results()
+    deadline = time.perf_counter() + args.duration
+    users = [Teacher(base_url, results, random.Random(args.seed + i)) for i in range(args.teachers)]
+    users += [Student(base_url, results, random.Random(args.seed + 1000 + i)) for i in range(args.students)]
+    threads = [threading.Thread(target=user.run, args=(deadline, args.think)) for user in users]
+    print(f"{args.teachers} teachers and {args.students} students against {base_url} for {args.duration:g}s")
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.report(args.duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Count the SQL statements issued against an engine, for query-budget checks."""
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine):
+    """Yield a QueryCounter that sees every statement executed inside the block."""
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._record)
+
+
+@contextmanager
+def assert_max_queries(engine, limit):
+    """Fail if the block issues more than limit statements, listing what ran."""
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > limit:
+        listing = "\n".join(f"  {s.splitlines()[0][:120]}" for s in counter.statements)
+        raise AssertionError(f"expected at most {limit} queries, got {counter.count}:\n{listing}")
@@ -0,0 +1,101 @@
+"""Fixtures shared by the tests: the app on a scratch database, logged-in clients and a query counter.
+
+The app module configures itself from the environment when imported, so the
+scratch database, shard directory and settings are set before the import.
+Jobs run in the test's own thread through run_jobs() (JOB_THREADS=0).
+
+    cd attendance_project && python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+SCRATCH = tempfile.mkdtemp(prefix="attendance-tests-")
+os.environ.update({
+    "DATABASE_URL": "sqlite:///" + os.path.join(SCRATCH, "attendance.db"),
+    "SHARDS_DIR": os.path.join(SCRATCH, "shards"),
+    "JOB_THREADS": "0",
+    "PASSWORD_HASH": "pbkdf2:sha256:1000",  # logins in every test; the work factor isn't under test
+})
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+import attendance_app  # noqa: E402
+from attendance_app import app, db, claim_job, run_job, school_context  # noqa: E402
+import querycount  # noqa: E402
+
+app.config["TESTING"] = True
+app.instance_path = SCRATCH  # upload spools and job exports
+
+
+def login(client, role, email, password):
+    response = client.post("/login", data={"role": role, "email": email, "password": password})
+    assert response.status_code == 302, (email, response.status_code)
+    return client
+
+
+@pytest.fixture
+def admin():
+    return login(app.test_client(), "Admin", "admin@example.com", "admin123")
+
+
+@pytest.fixture
+def teacher():
+    return login(app.test_client(), "Teacher", "teacher@example.com", "teacher123")
+
+
+@pytest.fixture
+def student():
+    return login(app.test_client(), "Student", "aravind@example.com", "student123")
+
+
+@pytest.fixture
+def cli():
+    return app.test_cli_runner()
+
+
+@pytest.fixture
+def run_jobs():
+    """run_jobs(school=None) runs the school's queued jobs to completion and returns how many ran."""
+    def run(school=None):
+        ran = 0
+        with school_context(school):
+            while (job_id := claim_job()) is not None:
+                run_job(job_id)
+                ran += 1
+        return ran
+    return run
+
+
+@pytest.fixture
+def count_queries():
+    """count_queries(school=None) counts the statements sent to that school's database inside a with block."""
+    def counting(school=None):
+        with school_context(school):
+            engine = attendance_app.shards.get(school).engine or db.engine
+        return querycount.count_queries(engine)
+    return counting
+
+
+@pytest.fixture
+def make_school(cli):
+    """make_school(key) registers a school shard with a teacher and an admin login (password "pw")."""
+    def make(key):
+        result = cli.invoke(args=["shards", "create", key, "--name", key.title()])
+        assert result.exit_code == 0, result.output
+        for role in ("Teacher", "Admin"):
+            result = cli.invoke(args=["create-user", f"{role.lower()}@{key}.example", "--role", role,
+                                      "--school", key, "--password", "pw"])
+            assert result.exit_code == 0, result.output
+        return key
+    return make
+
+
+@pytest.fixture
+def school_login():
+    """school_login(key, role="Teacher") is a client logged in to a make_school() school."""
+    def log_in(key, role="Teacher"):
+        return login(app.test_client(), role, f"{role.lower()}@{key}.example", "pw")
+    return log_in
@@ -0,0 +1,105 @@
+from datetime import date, timedelta
+
+import pytest
+
+import attendance_app
+from attendance_app import (app, db, bump_cache_version, get_courses, get_roster, rebuild_attendance_summary,
+                            school_context, AttendanceRecord, AttendanceSummary, Student)
+
+
+def mark(client, day, course, statuses):
+    form = {"date": day.isoformat(), "course": course}
+    for name, status in statuses.items():
+        form[f"status_{name}"] = status
+        form[f"info_{name}"] = "informed"
+    response = client.post("/mark", data=form)
+    assert response.status_code == 200 and b"Attendance saved" in response.data
+    return response
+
+
+def summary_rows():
+    return {(row.student_id, row.course_id, row.period): (row.present, row.absent)
+            for row in AttendanceSummary.query.filter(AttendanceSummary.present + AttendanceSummary.absent > 0)}
+
+
+def test_summary_deltas_match_a_rebuild(teacher):
+    day = date(2024, 4, 1)
+    mark(teacher, day, "Hindhi", {"Aravind": "P", "Aswin": "A"})
+    mark(teacher, day, "Hindhi", {"Aravind": "A", "Aswin": "A"})  # P -> A moves a count, A -> A doesn't
+    mark(teacher, day + timedelta(days=1), "Hindhi", {"Aravind": "P", "Aswin": "P"})
+    with app.app_context():
+        aravind = get_roster().ids_by_name["Aravind"]
+        hindhi = get_courses().ids_by_name["Hindhi"]
+        assert db.session.get(AttendanceSummary, (aravind, hindhi, "2024-04")).present == 1
+        incremental = summary_rows()
+        rebuild_attendance_summary()
+        assert summary_rows() == incremental
+
+
+def test_student_pages_follow_keyset_cursors(teacher, admin):
+    admin.post("/students", data={"add_student": "Keyset Kid"})
+    days = [date(2024, 5, 1) + timedelta(days=i) for i in range(7)]
+    for day in days:
+        mark(teacher, day, "Maths", {"Keyset Kid": "P"})
+
+    seen, pages, params = [], 0, {"course": "Maths", "per_page": 3}
+    while True:
+        body = teacher.get("/api/v1/students/Keyset Kid/attendance", query_string=params).json
+        seen += [record["date"] for record in body["records"]]
+        pages += 1
+        if not body["page"]["next"]:
+            break
+        params["after"] = body["page"]["next"]
+    assert pages == 3 and seen == [day.isoformat() for day in reversed(days)]
+
+    back = teacher.get("/api/v1/students/Keyset Kid/attendance",
+                       query_string={"course": "Maths", "per_page": 3, "before": body["page"]["prev"]}).json
+    assert [record["date"] for record in back["records"]] == seen[3:6]
+    bad = teacher.get("/api/v1/students/Keyset Kid/attendance", query_string={"course": "Maths", "after": "garbage"})
+    assert bad.json["records"][0]["date"] == seen[0]
+
+
+QUERY_COUNT_DAY = date(2025, 9, 1)
+
+
+def grow_school(n_students, n_days):
+    """Top the current school up to n_students, each marked for n_days in Maths."""
+    existing = Student.query.count()
+    db.session.add_all(Student(name=f"Student {i:05d}") for i in range(existing, n_students))
+    bump_cache_version("roster")
+    db.session.commit()
+    course_id = get_courses().ids_by_name["Maths"]
+    AttendanceRecord.query.delete()
+    db.session.add_all(
+        AttendanceRecord(student_id=s.id, date=QUERY_COUNT_DAY + timedelta(days=d), course_id=course_id,
+                         status="P", info="informed")
+        for s in Student.query.all() for d in range(n_days)
+    )
+    db.session.commit()
+
+
+@pytest.mark.parametrize("key, method, url", [
+    ("qc-mark", "GET", "/mark"),
+    ("qc-save", "POST", "/mark"),
+    ("qc-day", "GET", f"/attendance/{QUERY_COUNT_DAY.isoformat()}"),
+    ("qc-records", "GET", f"/attendance-records?date={QUERY_COUNT_DAY.isoformat()}&course=Maths&range=month"),
+    ("qc-report", "GET", "/report?subject=Maths"),
+    ("qc-api", "GET", f"/api/v1/attendance-records?date={QUERY_COUNT_DAY.isoformat()}&course=Maths&range=month"),
+])
+def test_query_count_does_not_grow_with_the_school(key, method, url, make_school, school_login, count_queries,
+                                                   monkeypatch):
+    # A school of its own, so growing it leaves the other tests' data alone
+    make_school(key)
+    client = school_login(key)
+    monkeypatch.setattr(attendance_app, "page_cache", None)  # measure the queries, not the page cache
+    data = {"date": QUERY_COUNT_DAY.isoformat(), "course": "Maths"} if method == "POST" else None
+    counts = []
+    for n_students, n_days in [(20, 3), (200, 20)]:
+        with school_context(key):
+            grow_school(n_students, n_days)
+        client.open(url, method=method, data=data)  # warm the process-level caches
+        with count_queries(key) as counter:
+            response = client.open(url, method=method, data=data)
+        assert response.status_code == 200, response.status_code
+        counts.append(counter.count)
+    assert 0 < counts[0] == counts[1], counts
@@ -0,0 +1,35 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+import attendance_app
+from attendance_app import app, hash_password, needs_rehash, User
+
+
+@pytest.mark.parametrize("method", ["scrypt", "scrypt:16384:8:1", "pbkdf2:sha256", "pbkdf2:sha256:1000"])
+def test_shorthand_methods_are_not_rehashed_every_login(method, monkeypatch):
+    expanded = generate_password_hash("x", method=method).split("$", 1)[0]
+    monkeypatch.setattr(attendance_app, "PASSWORD_HASH", method)
+    monkeypatch.setattr(attendance_app, "_hash_method", expanded)
+    assert not needs_rehash(hash_password("secret"))
+    assert needs_rehash(generate_password_hash("secret", method="pbkdf2:sha256:2000"))
+
+
+def test_login_upgrades_a_stale_hash():
+    with app.app_context():
+        user = User.query.filter_by(email="gokul@example.com").one()
+        user.password_hash = generate_password_hash("student123", method="pbkdf2:sha256:2000")
+        attendance_app.db.session.commit()
+    response = app.test_client().post("/login", data={"role": "Student", "email": "gokul@example.com",
+                                                      "password": "student123"})
+    assert response.status_code == 302
+    with app.app_context():
+        assert not needs_rehash(User.query.filter_by(email="gokul@example.com").one().password_hash)
+
+
+def test_wrong_role_or_password_is_refused():
+    client = app.test_client()
+    for role, email, password in [("Student", "aravind@example.com", "wrong"),
+                                  ("Teacher", "aravind@example.com", "student123"),
+                                  ("Student", "nobody@example.com", "student123")]:
+        response = client.post("/login", data={"role": role, "email": email, "password": password})
+        assert b"Invalid" in response.data
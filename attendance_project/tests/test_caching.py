@@ -0,0 +1,70 @@
+import time
+from datetime import date
+
+import attendance_app
+from attendance_app import app, get_courses, get_matrix_cache, get_roster, load_attendance_matrix
+
+from .test_attendance import mark
+
+API = "/api/v1/students/Aswin/attendance"
+
+
+def test_etag_revalidates_until_the_records_change(teacher, student):
+    first = teacher.get(API, query_string={"course": "Information Security"})
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "no-cache"
+    assert teacher.get(API, query_string={"course": "Information Security"},
+                       headers={"If-None-Match": etag}).status_code == 304
+
+    mark(teacher, date(2024, 6, 3), "Information Security", {"Aswin": "P"})
+    changed = teacher.get(API, query_string={"course": "Information Security"}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    # Another student's counters are out of scope
+    assert student.get("/api/v1/students/Aravind/attendance?course=Information Security",
+                       headers={"If-None-Match": etag}).status_code == 200
+    assert student.get(API).status_code == 403
+
+
+def test_last_modified_waits_for_its_second_to_pass(teacher):
+    # Start early in a second, so both saves land in it
+    time.sleep(1 - time.time() % 1)
+    mark(teacher, date(2024, 6, 4), "Frontend Programming", {"Aswin": "P"})
+    url = f"{API}?course=Frontend Programming"
+    assert teacher.get(url).last_modified is None
+    mark(teacher, date(2024, 6, 4), "Frontend Programming", {"Aswin": "A"})
+    # A date-only revalidation in the same second must not get a 304
+    stamp = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())
+    assert teacher.get(url, headers={"If-Modified-Since": stamp}).status_code == 200
+
+    time.sleep(1.1)
+    settled = teacher.get(url)
+    assert settled.last_modified is not None
+    assert teacher.get(url, headers={"If-Modified-Since": settled.headers["Last-Modified"]}).status_code == 304
+
+
+def test_saving_drops_the_cached_records_page(teacher):
+    url = "/attendance-records?date=2024-06-05&course=Mobile Application&range=day"
+    mark(teacher, date(2024, 6, 5), "Mobile Application", {"Gokul": "P"})
+    teacher.get(url)
+    hits = attendance_app.page_cache.hits
+    assert "✅ Present" in teacher.get(url).get_data(as_text=True)  # only Gokul was marked present
+    assert attendance_app.page_cache.hits == hits + 1
+
+    mark(teacher, date(2024, 6, 5), "Mobile Application", {"Gokul": "A"})
+    assert "✅ Present" not in teacher.get(url).get_data(as_text=True)
+    assert attendance_app.page_cache.hits == hits + 1
+
+
+def test_matrix_applies_saves_without_reloading(teacher):
+    mark(teacher, date(2024, 6, 6), "Data Structure", {"Hariharan": "P"})
+    with app.app_context():
+        cache = get_matrix_cache()
+        matrix = cache.get()
+    mark(teacher, date(2024, 6, 7), "Data Structure", {"Hariharan": "A", "Meenatchi": "P"})
+    with app.app_context():
+        assert cache.get() is matrix  # updated in place, not reloaded
+        course_id = get_courses().ids_by_name["Data Structure"]
+        assert matrix.student_totals(course_id) == load_attendance_matrix().student_totals(course_id)
+        students = len(get_roster().students)
+    body = teacher.get("/api/attendance-matrix?course=Data Structure&range=day&date=2024-06-07").json
+    assert [(row["date"], row["present"], row["total"]) for row in body["daily"]] == [("2024-06-07", 1, students)]
@@ -0,0 +1,63 @@
+import io
+
+from attendance_app import app, db, get_courses, get_roster, import_csv, AttendanceRecord, AttendanceSummary
+
+
+def run_import(text):
+    with app.app_context():
+        return import_csv(io.StringIO(text))
+
+
+def test_roster_import_adds_students_once():
+    result = run_import("name\nImport Roster A\nImport Roster B\nImport Roster A\n")
+    assert result["rows"] == 3 and result["students_added"] == 2 and result["error_count"] == 0
+    with app.app_context():
+        assert {"Import Roster A", "Import Roster B"} <= get_roster().ids_by_name.keys()
+
+
+def test_attendance_import_writes_marks_and_summary():
+    result = run_import(
+        "student,date,course,status,info\n"
+        "Import Marks,2024-02-05,Maths,P,informed\n"
+        "Import Marks,2024-02-06,Maths,A,informed\n"
+    )
+    assert result["imported"] == 2 and result["students_added"] == 1
+    with app.app_context():
+        student_id = get_roster().ids_by_name["Import Marks"]
+        course_id = get_courses().ids_by_name["Maths"]
+        assert AttendanceRecord.query.filter_by(student_id=student_id).count() == 2
+        summary = db.session.get(AttendanceSummary, (student_id, course_id, "2024-02"))
+        assert (summary.present, summary.absent) == (1, 1)
+
+
+def test_invalid_rows_are_reported_not_fatal():
+    result = run_import(
+        "date,course,student,status,info\n"
+        "2024-03-01,Maths,Import Errors,P,ok,EXTRA\n"
+        "2024-03-01,Maths,Import Errors,X,ok\n"
+        "not-a-date,Maths,Import Errors,P,ok\n"
+        "2024-03-01,Maths,Import Errors,P,ok\n"
+    )
+    assert result["rows"] == 4 and result["imported"] == 1
+    assert result["errors"] == [
+        "line 2: too many fields",
+        "line 3: status must be P or A, got 'X'",
+        "line 4: bad date 'not-a-date'",
+    ]
+
+
+def test_error_line_numbers_follow_multiline_fields():
+    result = run_import(
+        "student,date,course,status,info\n"
+        'Import Lines,2024-03-02,Maths,P,"spans\ntwo lines"\n'
+        "Import Lines,2024-03-02,Maths,?,informed\n"
+    )
+    assert result["errors"] == ["line 4: status must be P or A, got '?'"]
+
+
+def test_import_cli_reports_bad_rows(cli, tmp_path):
+    path = tmp_path / "marks.csv"
+    path.write_text("student,date,course,status\nImport Cli,2024-03-03,Maths,P,EXTRA\nImport Cli,2024-03-03,Maths,A\n")
+    result = cli.invoke(args=["import-csv", str(path)])
+    assert result.exit_code == 0, result.output
+    assert "Imported 1 of 2 rows" in result.output and "line 2: too many fields" in result.output
@@ -0,0 +1,101 @@
+import time
+from datetime import timedelta
+
+import pytest
+
+import attendance_app
+from attendance_app import app, db, claim_job, enqueue_job, get_roster, _utcnow, Job, JOB_STALE_AFTER, Student
+
+
+def latest_job(kind):
+    with app.app_context():
+        return Job.query.filter_by(kind=kind).order_by(Job.id.desc()).first()
+
+
+def test_admin_queues_a_job_that_runs_after_commit(admin, run_jobs):
+    assert admin.post("/admin/jobs", data={"kind": "rebuild_summary"}).status_code == 302
+    assert latest_job("rebuild_summary").status == "queued"
+    assert run_jobs() >= 1
+    job = latest_job("rebuild_summary")
+    assert job.status == "done" and job.progress == 100 and job.finished_at is not None
+    assert admin.get("/api/jobs").json["jobs"][0]["id"] == job.id
+    assert admin.post("/admin/jobs", data={"kind": "nope"}).status_code == 400
+
+
+def test_rolled_back_enqueue_leaves_no_job():
+    with app.app_context():
+        before = Job.query.count()
+        enqueue_job("rebuild_summary")
+        db.session.rollback()
+        assert Job.query.count() == before
+
+
+def test_failing_job_is_marked_failed(run_jobs):
+    with app.app_context():
+        job_id = enqueue_job("no_such_kind").id
+        db.session.commit()
+    run_jobs()
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        assert job.status == "failed" and "no handler" in job.message
+
+
+def test_stale_running_job_is_claimed_again():
+    with app.app_context():
+        job = enqueue_job("rebuild_summary")
+        job.status = "running"
+        job.heartbeat_at = _utcnow() - JOB_STALE_AFTER - timedelta(seconds=1)
+        db.session.commit()
+        assert claim_job() == job.id
+        assert claim_job() is None  # claimed once, and nothing else is waiting
+
+
+def test_delete_student_job_removes_their_records(admin, teacher, run_jobs):
+    admin.post("/students", data={"add_student": "Leaving Soon"})
+    teacher.post("/mark", data={"date": "2024-07-01", "course": "Maths", "status_Leaving Soon": "P"})
+    admin.post("/students", data={"delete_student": "Leaving Soon"})
+    run_jobs()
+    assert latest_job("delete_student").status == "done"
+    with app.app_context():
+        assert "Leaving Soon" not in get_roster().ids_by_name
+        assert Student.query.filter_by(name="Leaving Soon").first() is None
+
+
+def test_export_job_file_downloads(admin, run_jobs):
+    admin.post("/admin/jobs", data={"kind": "export_report", "subject": "Maths"})
+    run_jobs()
+    job = latest_job("export_report")
+    assert job.status == "done"
+    response = admin.get(f"/admin/jobs/{job.id}/download")
+    assert response.status_code == 200 and response.data.startswith(b"student,")
+    assert "report_Maths" in response.headers["Content-Disposition"]
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")  # the SystemExit below
+def test_job_threads_survive_poll_errors_and_are_replaced(monkeypatch):
+    polls, stop = [], attendance_app.threading.Event()
+
+    def broken_claim():
+        if stop.is_set():
+            raise SystemExit  # not an Exception, so it ends the test's threads
+        polls.append(1)
+        raise attendance_app.OperationalError("claim", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(attendance_app, "claim_job", broken_claim)
+    monkeypatch.setattr(attendance_app, "JOB_POLL_SECONDS", 0.01)
+    monkeypatch.setattr(attendance_app, "_job_threads", [])
+    attendance_app.start_job_threads(1)
+    thread = attendance_app._job_threads[0]
+    while len(polls) < 3:
+        time.sleep(0.01)
+    assert thread.is_alive()
+
+    stop.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    stop.clear()
+    attendance_app.start_job_threads(1)
+    replacement = attendance_app._job_threads[0]
+    assert replacement is not thread and replacement.is_alive()
+    stop.set()
+    replacement.join(5)
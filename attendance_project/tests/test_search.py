@@ -0,0 +1,57 @@
+from datetime import date
+
+import pytest
+
+from attendance_app import app, db, get_courses, get_roster, search_fts, shard_state, Homework, HomeworkDoubt
+
+
+@pytest.fixture(scope="module")
+def doubts():
+    """Photosynthesis homework with a doubt each from Aravind and Aswin (indexed by the FTS triggers)."""
+    with app.app_context():
+        homework = Homework(date=date(2024, 9, 2), course_id=get_courses().ids_by_name["Maths"],
+                            description="Photosynthesis worksheet")
+        db.session.add(homework)
+        db.session.flush()
+        students = get_roster().ids_by_name
+        db.session.add_all([
+            HomeworkDoubt(homework_id=homework.id, student_id=students["Aravind"],
+                          question="photosynthesis needs light?", created_at="2024-09-02 10:00"),
+            HomeworkDoubt(homework_id=homework.id, student_id=students["Aswin"],
+                          question="photosynthesis in plants at night?", created_at="2024-09-02 11:00"),
+        ])
+        db.session.commit()
+
+
+def test_teachers_see_every_doubt(doubts, teacher):
+    body = teacher.get("/api/v1/search?q=photosynthesis").json
+    assert {d["student"] for d in body["doubts"]} >= {"Aravind", "Aswin"}
+    assert "<mark>Photosynthesis</mark>" in body["homework"][0]["description"]
+
+
+def test_students_see_only_their_own_doubts(doubts, student):
+    body = student.get("/api/v1/search?q=photosynthesis").json
+    assert {d["student"] for d in body["doubts"]} == {"Aravind"}
+
+
+def test_student_without_a_profile_gets_nothing(doubts, student):
+    with student.session_transaction() as sess:
+        sess.pop("student_id")
+        sess["student_name"] = "Nobody"
+    response = student.get("/api/v1/search?q=photosynthesis")
+    assert response.status_code == 404 and "doubts" not in response.json
+    assert student.get("/search?q=photosynthesis").status_code == 302
+
+
+def test_like_fallback_finds_the_same_rows(doubts, teacher):
+    with app.app_context():
+        assert search_fts()
+    fts = teacher.get("/api/v1/search?q=photosynthesis").json
+    with app.app_context():
+        shard_state()["search_fts"] = False
+    try:
+        like = teacher.get("/api/v1/search?q=photosynthesis").json
+    finally:
+        with app.app_context():
+            shard_state().pop("search_fts")
+    assert sorted(d["id"] for d in like["doubts"]) == sorted(d["id"] for d in fts["doubts"])
@@ -0,0 +1,99 @@
+import os
+import sqlite3
+import time
+
+import attendance_app
+from attendance_app import app, db, get_courses, school_context, shards, SHARDS_DIR, AttendanceRecord
+
+
+def shard_count(key, sql):
+    with sqlite3.connect(os.path.join(SHARDS_DIR, f"{key}.db")) as conn:
+        return conn.execute(sql).fetchone()[0]
+
+
+def close_shards():
+    for key in shards.open_keys():
+        shards._open.pop(key).engine.dispose()
+
+
+def test_school_logins_read_and_write_their_own_shard(make_school, school_login, teacher):
+    make_school("north")
+    north_admin, north_teacher = school_login("north", "Admin"), school_login("north")
+    north_admin.post("/students", data={"add_student": "Nora"})
+    page = north_teacher.get("/mark").get_data(as_text=True)
+    assert "Nora" in page and "Aravind" not in page
+    assert "Maths" in page  # new schools start with the default subjects
+    assert "Nora" not in teacher.get("/mark").get_data(as_text=True)
+
+    north_teacher.post("/mark", data={"date": "2024-08-01", "course": "Maths", "status_Nora": "P"})
+    assert shard_count("north", "SELECT count(*) FROM attendance_record") == 1
+    assert shard_count("north", "SELECT count(*) FROM sqlite_master WHERE name = 'user'") == 0
+    with app.app_context():
+        assert AttendanceRecord.query.filter_by(date=attendance_app.date_type(2024, 8, 1)).count() == 0
+
+
+def test_cli_commands_take_a_school(make_school, cli, tmp_path):
+    make_school("east")
+    path = tmp_path / "east.csv"
+    path.write_text("student,date,course,status\nEve,2024-08-02,Maths,P\n")
+    assert cli.invoke(args=["import-csv", str(path), "--school", "east"]).exit_code == 0
+    assert shard_count("east", "SELECT count(*) FROM student WHERE name = 'Eve'") == 1
+    assert cli.invoke(args=["rebuild-summary", "--school", "east"]).exit_code == 0
+    result = cli.invoke(args=["early-warning", "--school", "east"])
+    assert result.exit_code == 0 and "done" in result.output, result.output
+    assert cli.invoke(args=["import-csv", str(path), "--school", "nowhere"]).exit_code != 0
+    with school_context("east"):
+        assert "Maths" in get_courses().ids_by_name
+
+
+def test_least_recently_used_shard_is_closed(make_school, school_login, monkeypatch):
+    make_school("lru-a")
+    make_school("lru-b")
+    close_shards()
+    monkeypatch.setattr(shards, "max_open", 1)
+    evicted = shards.evicted
+    school_login("lru-a").get("/mark")
+    school_login("lru-b").get("/mark")
+    assert shards.open_keys() == ["lru-b"] and shards.evicted == evicted + 1
+    assert "Maths" in school_login("lru-a").get("/mark").get_data(as_text=True)  # reopened on demand
+
+
+def test_job_check_leaves_idle_schools_closed(make_school):
+    make_school("sweep-idle")
+    make_school("sweep-busy")
+    with school_context("sweep-busy"):
+        attendance_app.enqueue_job("rebuild_summary")
+        db.session.commit()
+    close_shards()
+    assert not attendance_app.school_has_jobs("sweep-idle")
+    assert attendance_app.school_has_jobs("sweep-busy")
+    assert shards.open_keys() == []
+
+
+def test_board_relay_skips_schools_without_a_cursor(monkeypatch):
+    monkeypatch.setattr(attendance_app, "LIVE_BOARD_POLL_SECONDS", 0.01)
+    with app.app_context():
+        q = attendance_app.board.subscribe((None, "2024-08-03", None))
+    relay = attendance_app._board_relay[0]
+    # Subscribed but not yet given a last event id, as in the race the ordering in subscribe() prevents
+    stray = ("not-ready", "2024-08-03", None)
+    with attendance_app.board._lock:
+        attendance_app.board._subscribers[stray] = {attendance_app.queue.Queue()}
+    try:
+        time.sleep(0.1)
+        assert relay.is_alive()
+        with app.app_context():
+            db.session.execute(db.insert(attendance_app.AttendanceEvent).values(
+                date=attendance_app.date_type(2024, 8, 3), course_id=1, origin="another-process",
+                payload={"date": "2024-08-03", "course": "Maths", "rows": []}, created_at=attendance_app._utcnow()))
+            db.session.commit()
+        assert q.get(timeout=5)[1]["course"] == "Maths"
+    finally:
+        with attendance_app.board._lock:
+            attendance_app.board._subscribers.pop(stray)
+        attendance_app.board.unsubscribe((None, "2024-08-03", None), q)
+
+
+def test_unknown_school_is_rejected(cli):
+    result = cli.invoke(args=["create-user", "x@y.example", "--role", "Admin", "--school", "nope", "--password", "pw"])
+    assert result.exit_code != 0 and "no school 'nope'" in result.output